@@ -0,0 +1,60 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import time
+from typing import Any, Callable, List
+
+from frontend.program import Program
+from frontend.runtime import get_runtime
+
+# Helpers the benchmarks in this directory share. Each benchmark is a module
+# run from src/, for example:
+#
+#     $ cd src && python3 -m bench.emitbench 16
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+# our largest proof, which several benchmarks copy to make longer programs
+ETM = os.path.join(ROOT, "proofs", "etm.sbl")
+
+
+# The programs to run a benchmark on: the given paths, or else the test
+# proofs and proofs/etm.sbl
+def corpus(paths: List[str]) -> List[str]:
+    return paths or sorted(glob.glob(os.path.join(ROOT, "tests", "proofs", "*.sbl"))) + [ETM]
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+# Whether the backend skips a program (it has a "// SKIP: <backend>" line)
+def skipped(src: str, backend: str) -> bool:
+    return any(l.strip() == "// SKIP: {}".format(backend) for l in src.splitlines())
+
+# Whether the backend's binaries can be found
+def installed(backend: str) -> bool:
+    try:
+        get_runtime(backend)(Program("")).command("")
+    except Exception:
+        return False
+    return True
+
+# The best of runs times to call f, in seconds
+def best_of(f: Callable[[], Any], runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
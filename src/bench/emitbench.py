@@ -0,0 +1,106 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+from frontend.program import Program
+
+from .common import ETM, read
+
+# Measure how emission time grows with the length of a proof, by emitting the
+# obligations of programs made of more and more copies of proofs/etm.sbl.
+# Each obligation's context is everything before it, so if serializing one
+# obligation took time proportional to its context, the time per obligation
+# would grow with the number of copies. "serialize" is the time spent turning
+# each obligation's context, lhs and rhs into backend code; "emit" is the
+# time for the whole obligation. "peak KB" is the most memory allocated at
+# once while emitting the whole program to a file, which should be about the
+# size of the largest obligation rather than of the whole program.
+#
+#     $ cd src && python3 -m bench.emitbench [max copies]
+
+
+def _emitters() -> Dict[str, Tuple[type, str]]:
+    from frontend.dafny.emitter import DafnyEmitter
+    from frontend.rosette.emitter import RosetteEmitter
+    return {"dafny": (DafnyEmitter, "to_dafny"), "rosette": (RosetteEmitter, "to_sexp")}
+
+
+# Return the seconds taken to serialize the terms of each obligation of the
+# program, in the order the emitter would
+def serialize_times(prog: str, method: str) -> List[float]:
+    times = []  # type: List[float]
+    for prf in Program(prog).generate_proof_obligations():
+        terms = [getattr(prf, a) for a in ("context", "lhs", "rhs", "program", "condition") if hasattr(prf, a)]
+        start = time.perf_counter()
+        for t in terms:
+            getattr(t, method)()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# Return the seconds taken to emit each obligation of the program
+def emit_times(prog: str, emitter_cls: type) -> List[float]:
+    proofs = Program(prog).generate_proof_obligations()
+    emitter = emitter_cls()
+    times = []  # type: List[float]
+    for prf in proofs:
+        start = time.perf_counter()
+        try:
+            emitter.emit_proof(prf)
+        except NotImplementedError:
+            pass  # e.g., invariants the Dafny backend doesn't support
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# Return the peak number of bytes allocated while emitting the obligations of
+# the program to a file
+def emit_peak_memory(prog: str, emitter_cls: type) -> int:
+    proofs = Program(prog).generate_proof_obligations()
+    with open(os.devnull, "w") as f:
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            emitter = emitter_cls(out=f)
+            for prf in proofs:
+                try:
+                    emitter.emit_proof(prf)
+                except NotImplementedError:
+                    pass
+            emitter.finish()
+            return tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+
+def print_emit_bench(max_copies: int = 16) -> None:
+    etm = read(ETM)
+    copies = 1
+    print("{:>7} {:>12} {:>10} {:>13} {:>10} {:>10}".format("copies", "obligations", "backend", "serialize ms", "emit ms", "peak KB"))
+    while copies <= max_copies:
+        for name, (cls, method) in sorted(_emitters().items()):
+            ser = serialize_times(etm * copies, method)
+            emit = emit_times(etm * copies, cls)
+            peak = emit_peak_memory(etm * copies, cls)
+            print("{:>7} {:>12} {:>10} {:>13.3f} {:>10.3f} {:>10.0f}".format(
+                copies, len(emit), name, 1000 * sum(ser) / len(ser), 1000 * sum(emit) / len(emit), peak / 1024.0))
+        copies *= 2
+
+
+if __name__ == "__main__":
+    print_emit_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 16)
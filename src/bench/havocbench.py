@@ -0,0 +1,127 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+from typing import Dict, List, Set, Tuple
+
+from frontend.analysis import AnnotateImmutableLocals, FindMutatedLocals
+from frontend.ast import *
+from frontend.parser import string_to_ast
+
+from .common import ROOT, corpus, read
+
+# Compare how many fields the Rosette backend's HavocContext replaces with
+# symbolic values (see value.rkt), and roughly how many symbolic variables
+# that takes, when fields are annotated as immutable by FindMutatedLocals and
+# by the analysis it replaced, which made every compound assignment (x[i] = e
+# as well as o.x = e) mutate its field on every object, on the proofs in
+# tests/proofs and proofs/etm.sbl (or the given files):
+#
+#     $ cd src && python3 -m bench.havocbench [file ...]
+#
+# The symbolic variables are counted by a model of ??Value rather than by
+# running Racket: each havoced field is counted once, as if its object were
+# at address MAX_ADDR.
+
+# as in value.rkt
+MAX_VALUE_SIZE = 3
+MAX_ADDR = 4
+
+
+# FindMutatedLocals as it was before x[i] = e was resolved to its object: a
+# plain assignment mutates the field of the innermost enclosing object, and
+# any compound one the field of every object
+class _SyntacticFind(FindMutatedLocals):
+    def visit_AssignNode(self, node: AssignNode) -> AST:
+        news = [n for n in self.state if isinstance(n, NewNode)]
+        if isinstance(node.lhs, VarNode) and news:
+            self.must_mutate.setdefault(news[-1], set()).add(node.lhs.name)
+        elif isinstance(node.lhs, CompoundVarNode):
+            self.may_mutate.add(node.lhs.name)
+        return node
+
+class _SyntacticAnnotate(AnnotateImmutableLocals):
+    def __init__(self) -> None:
+        super().__init__()
+        self.find = _SyntacticFind()
+
+
+# The number of symbolic variables ??Value creates for a value that may
+# refer to objects below max_addr, with a current value to keep
+def symbolic_variables(max_addr: int, tuple_depth: int = 2, maps: bool = True, current: bool = True) -> int:
+    count = 1  # the integer
+    options = max_addr + 2  # the refs, an error, and the integer
+    if tuple_depth > 0:
+        count += MAX_VALUE_SIZE * symbolic_variables(max_addr, tuple_depth - 1, False, False)
+        options += MAX_VALUE_SIZE
+    if maps:
+        count += 2 * MAX_VALUE_SIZE * symbolic_variables(max_addr, tuple_depth, False, False)
+        options += 1
+    if current:
+        options += 1
+    # choose* picks among its options with a boolean for all but one
+    return count + options - 1
+
+
+# The fields of each distinct object in an annotated AST, with whether each
+# is immutable
+def _fields(ast: AST) -> List[Tuple[str, bool]]:
+    fields = []  # type: List[Tuple[str, bool]]
+    seen = set()  # type: Set[AST]
+    class Gather(ASTTransformer):
+        def visit_NewNode(self, node: NewNode) -> AST:
+            if node not in seen:
+                seen.add(node)
+                fields.extend((l.name, l.immutable) for l in node.locals)
+            return node
+    Gather().visit(ast)
+    return fields
+
+
+# Return the number of fields in a program, and the number of them havoced
+# and the symbolic variables that takes with each analysis
+def havoc_counts(src: str) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    ast = string_to_ast(src)
+    per_field = symbolic_variables(MAX_ADDR)
+    result = {}  # type: Dict[str, Tuple[int, int]]
+    total = 0
+    for name, cls in (("before", _SyntacticAnnotate), ("after", AnnotateImmutableLocals)):
+        fields = _fields(cls().visit(ast))
+        total = len(fields)
+        havoced = sum(1 for _, immutable in fields if not immutable)
+        result[name] = (havoced, havoced * per_field)
+    return total, result
+
+
+def print_havoc_bench(paths: List[str]) -> None:
+    print("{:<48} {:>7} {:>16} {:>16}".format("program", "fields", "havoced before", "havoced after"))
+    print("{:<48} {:>7} {:>16} {:>16}".format("", "", "(symbolics)", "(symbolics)"))
+    totals = [0, 0, 0, 0, 0]
+    for path in paths:
+        name = os.path.relpath(path, ROOT)
+        try:
+            total, counts = havoc_counts(read(path))
+        except Exception as e:
+            print("{:<48} error: {}".format(name, e))
+            continue
+        row = [total, counts["before"][0], counts["before"][1], counts["after"][0], counts["after"][1]]
+        totals = [t + r for t, r in zip(totals, row)]
+        print("{:<48} {:>7} {:>16} {:>16}".format(name, row[0], "{} ({})".format(row[1], row[2]),
+                                                 "{} ({})".format(row[3], row[4])))
+    print("{:<48} {:>7} {:>16} {:>16}".format("total", totals[0], "{} ({})".format(totals[1], totals[2]),
+                                             "{} ({})".format(totals[3], totals[4])))
+
+
+if __name__ == "__main__":
+    print_havoc_bench(corpus(sys.argv[1:]))
@@ -0,0 +1,72 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from frontend.analysis import ObjectIndex
+from frontend.ast import AST
+from frontend.dafny.emitter import DafnyEmitter
+from frontend.program import Program
+from frontend.proof import Proof
+
+from .common import ETM, read
+
+# Compare looking up the objects each proof obligation's context defines in
+# the program's ObjectIndex, which is updated as statements are added, with
+# walking the whole context for every obligation, as we used to. Programs are
+# made of more and more copies of proofs/etm.sbl, so each obligation's
+# context grows with the number of copies. The times are milliseconds per
+# obligation spent generating the obligations and emitting them for Dafny,
+# both of which look up objects.
+#
+#     $ cd src && python3 -m bench.indexbench [max copies]
+
+
+# A program whose obligations each index their own context from scratch
+class _WalkingProgram(Program):
+    def _construct_proof_obligation(self, program: AST, lhs: AST, rhs: AST, hint: AST, verb: str, assumptions: List[Tuple[AST, AST]], objects: Optional[ObjectIndex]=None) -> Proof:
+        return super()._construct_proof_obligation(program, lhs, rhs, hint, verb, assumptions)
+
+
+# Return the seconds taken to generate the obligations of the program (after
+# parsing, which both ways share) and to emit them with the Dafny emitter
+def generate_and_emit_times(prog: str, cls: type) -> Tuple[int, float, float]:
+    p = cls(prog)
+    p.ast
+    start = time.perf_counter()
+    proofs = p.generate_proof_obligations()
+    generated = time.perf_counter()
+    emitter = DafnyEmitter()
+    for prf in proofs:
+        try:
+            emitter.emit_proof(prf)
+        except NotImplementedError:
+            pass  # e.g., invariants the Dafny backend doesn't support
+    return len(proofs), generated - start, time.perf_counter() - generated
+
+
+def print_index_bench(max_copies: int = 10) -> None:
+    etm = read(ETM)
+    print("{:>7} {:>12} {:>8} {:>13} {:>13}".format("copies", "obligations", "objects", "generate ms", "dafny emit ms"))
+    for copies in sorted(set([1, 2, 5, max_copies])):
+        if copies > max_copies:
+            continue
+        for name, cls in (("index", Program), ("walk", _WalkingProgram)):
+            n, generate, emit = generate_and_emit_times(etm * copies, cls)
+            print("{:>7} {:>12} {:>8} {:>13.3f} {:>13.3f}".format(copies, n, name, 1000 * generate / n, 1000 * emit / n))
+
+
+if __name__ == "__main__":
+    print_index_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,110 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from frontend.program import Program
+from frontend.runtime import get_runtime
+
+from .common import ROOT, corpus, installed, read, skipped
+
+# Compare the wall-clock time to check the proofs in tests/proofs and
+# proofs/etm.sbl (or the given files) in one backend run, as prove.py does by
+# default, and with each obligation in a run of its own, on up to N runs at a
+# time, as `prove.py -j N` does:
+#
+#     $ cd src && python3 -m bench.jobsbench [--backend rosette] [-j N] [--runs N] [file ...]
+#
+# For each program it reports the number of obligations, the best of --runs
+# times either way (from parsing to the last verdict), and the speedup, and
+# then the totals over all the programs. N defaults to the number of CPUs.
+# Files the backend skips are left out.
+
+
+# Return the time to check src in one backend run (if jobs is 0) or in a run
+# per obligation on up to jobs runs at a time, and whether it succeeded
+def check_time(src: str, backend: str, jobs: int) -> Tuple[float, bool]:
+    start = time.perf_counter()
+    runtime = get_runtime(backend)(Program(src))
+    if jobs == 0:
+        runtime.compile(False)
+        success, _, fname = runtime.run()
+        fnames = [fname]
+    else:
+        runtime.compile(False, split=True)
+        results = list(runtime.run_units(jobs))
+        success = all(r[1] for r in results)
+        fnames = [r[3] for r in results]
+    elapsed = time.perf_counter() - start
+    for fname in fnames:
+        os.remove(fname)
+    return elapsed, success
+
+
+# Return the best of runs times to check src either way, or None if the
+# backend isn't installed
+def best_times(src: str, backend: str, jobs: int, runs: int) -> Optional[List[Tuple[float, bool]]]:
+    if not installed(backend):
+        return None
+    best = []  # type: List[Tuple[float, bool]]
+    for j in (0, jobs):
+        timings = [check_time(src, backend, j) for _ in range(runs)]
+        best.append(min(timings))
+    return best
+
+
+def print_jobs_bench(paths: List[str], backend: str, jobs: int, runs: int) -> None:
+    print("{:<48} {:>11} {:>10} {:>10} {:>8}".format("program", "obligations", "1 run (s)", "-j {} (s)".format(jobs), "speedup"))
+    totals = [0.0, 0.0]
+    for path in paths:
+        src = read(path)
+        if skipped(src, backend):
+            continue
+        name = os.path.relpath(path, ROOT)
+        try:
+            count = len(Program(src).generate_proof_obligations())
+            timings = best_times(src, backend, jobs, runs)
+        except Exception as e:
+            print("{:<48} error: {}".format(name, e))
+            continue
+        if timings is None:
+            print("({} is not installed)".format(backend))
+            return
+        (serial, ok1), (parallel, ok2) = timings
+        totals[0] += serial
+        totals[1] += parallel
+        flags = "" if ok1 and ok2 else " (F)"
+        print("{:<48} {:>11} {:>10.2f} {:>10.2f} {:>7.1f}x{}".format(name, count, serial, parallel, serial / parallel, flags))
+    if totals[1] > 0:
+        print("{:<48} {:>11} {:>10.2f} {:>10.2f} {:>7.1f}x".format("total", "", totals[0], totals[1], totals[0] / totals[1]))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    backend = "rosette"
+    jobs = os.cpu_count() or 1
+    runs = 1
+    while args and args[0].startswith("-"):
+        if args[0] == "--backend":
+            backend = args[1]
+        elif args[0] == "-j":
+            jobs = int(args[1])
+        elif args[0] == "--runs":
+            runs = int(args[1])
+        else:
+            raise Exception("unknown option {}".format(args[0]))
+        args = args[2:]
+    print_jobs_bench(corpus(args), backend, jobs, runs)
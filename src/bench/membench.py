@@ -0,0 +1,118 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, Iterator, Set
+
+from frontend.ast import AST
+
+# Measure the memory used by the frontend to parse and annotate a large
+# synthetic program. Each measurement runs in a fresh interpreter, so that
+# peak RSS reflects only this program:
+#
+#     $ cd src && python3 -m bench.membench [copies]
+
+SRC_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_COPY = """
+Enc{i}(e) {{
+    new (e, d=0) {{
+        enc(m) {{ c = e.enc(m) & !d[c] & d[c] = m & c }}
+        dec(c) {{ e.dec(c) }}
+    }}
+}}
+EncI{i}(e) {{
+    new (e, d=0) {{
+        enc(m) {{ c = e.enc(m) & d[c] = m & c }}
+        dec(c) {{ if (d[c]) {{ d[c] }} else {{ 0 }} }}
+    }}
+}}
+Wrap{i}(e) {{ new (e, n=0, h=0) {{ enc(m) {{ n = n + 1 h[n] = e.enc(<m, n>) }} dec(c) {{ e.dec(c) }} }} }}
+Enc{i}(k{i}) ~ [Equal(_lhs.d, _rhs.d) & Equal(_lhs.e, _rhs.e)] EncI{i}(k{i}) ~ Wrap{i}(EncI{i}(k{i}))
+"""
+
+# A program of copies of a small encryption-scheme definition and proof
+def synthetic_program(copies: int) -> str:
+    return "".join(_COPY.format(i=i) for i in range(copies))
+
+
+# Iterate over every distinct AST node reachable from node (including itself)
+def iter_nodes(node: AST) -> Iterator[AST]:
+    stack = [node]
+    seen = set()  # type: Set[int]
+    while stack:
+        n = stack.pop()
+        if id(n) in seen:
+            continue
+        seen.add(id(n))
+        yield n
+        for cls in type(n).__mro__:
+            for f in getattr(cls, "__slots__", ()):
+                v = getattr(n, f, None)
+                if isinstance(v, AST):
+                    stack.append(v)
+                elif isinstance(v, list):
+                    stack.extend(c for c in v if isinstance(c, AST))
+
+
+_SAMPLE = """
+import json, resource, sys, tracemalloc
+sys.path.insert(0, sys.argv[1])
+from bench.membench import iter_nodes, synthetic_program
+from frontend.program import Program
+src = synthetic_program(int(sys.argv[2]))
+traced = sys.argv[3] == "traced"
+if traced:
+    tracemalloc.start()
+prog = Program(src)
+ast = prog.ast
+result = {"statements": len(ast.children), "nodes": sum(1 for _ in iter_nodes(ast))}
+if traced:
+    current, peak = tracemalloc.get_traced_memory()
+    result["ast bytes"] = current
+    result["peak traced bytes"] = peak
+else:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak rss bytes"] = rss if sys.platform == "darwin" else rss * 1024
+print(json.dumps(result))
+"""
+
+
+def _sample(copies: int, mode: str) -> Dict[str, int]:
+    proc = subprocess.run([sys.executable, "-c", _SAMPLE, SRC_ROOT, str(copies), mode],
+                          stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def memory_bench(copies: int) -> Dict[str, int]:
+    result = _sample(copies, "traced")
+    result.update(_sample(copies, "rss"))
+    return result
+
+
+def print_memory_bench(copies: int) -> None:
+    result = memory_bench(copies)
+    mb = 1024.0 * 1024.0
+    print("memory use to parse and annotate {} copies ({} statements, {} nodes):".format(
+        copies, result["statements"], result["nodes"]))
+    print("  live after annotation: {:8.1f} MB  ({:.0f} bytes/node)".format(
+        result["ast bytes"] / mb, result["ast bytes"] / result["nodes"]))
+    print("  peak traced:           {:8.1f} MB".format(result["peak traced bytes"] / mb))
+    print("  peak RSS:              {:8.1f} MB".format(result["peak rss bytes"] / mb))
+
+
+if __name__ == "__main__":
+    print_memory_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,120 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+from frontend.analysis import AnnotateImmutableLocals, FindMutatedLocals, GatherObjectInfo
+from frontend.ast import *
+from frontend.program import Program
+
+from .common import best_of
+from .membench import synthetic_program
+
+# Compare ASTTransformer's iterative walk with the recursive one it replaced,
+# which looked up each node's visit_C method through its MRO on every visit
+# and recursed into each child, by running the analysis passes over a large
+# synthetic program with both:
+#
+#     $ cd src && python3 -m bench.visitbench [copies]
+
+
+# ASTTransformer.visit as it was before the walk was made iterative
+class _Recursive(object):
+    def _visit(self, node: AST) -> AST:
+        for cls in type(node).mro():
+            meth = getattr(self, 'visit_' + cls.__name__, None)
+            if meth is not None:
+                return meth(node)
+        return node
+    def visit(self, node: AST) -> AST:
+        old_state = len(self.state)
+        new_node = self._visit(node)
+        children = []  # type: List[Any]
+        for f in type(new_node)._children:
+            c = getattr(new_node, f)
+            if type(c) is list:
+                children.extend(self.visit(x) if x is not None else None for x in c)
+            else:
+                children.append(self.visit(c))
+        new_node = new_node._rebuild(children)
+        if len(self.state) > old_state:
+            self.state = self.state[:old_state]
+        return new_node
+
+class _RecursiveGather(_Recursive, GatherObjectInfo):
+    pass
+
+class _RecursiveFind(_Recursive, FindMutatedLocals):
+    pass
+
+class _RecursiveAnnotate(_Recursive, AnnotateImmutableLocals):
+    pass
+
+
+# The passes to time: each is a function from an AST to a function that runs
+# the pass over it with the iterative or recursive walk
+def _passes(ast: AST) -> Dict[str, Tuple[Callable[[], Any], Callable[[], Any]]]:
+    find = FindMutatedLocals()
+    find.visit(ast)
+    def annotate(cls: type) -> Callable[[], Any]:
+        def run() -> Any:
+            v = cls()
+            v.find = find
+            return v.annotate(ast) if cls is AnnotateImmutableLocals else _Recursive.visit(v, ast)
+        return run
+    return {
+        "GatherObjectInfo": (lambda: GatherObjectInfo().visit(ast), lambda: _RecursiveGather().visit(ast)),
+        "FindMutatedLocals": (lambda: FindMutatedLocals().visit(ast), lambda: _RecursiveFind().visit(ast)),
+        "AnnotateImmutableLocals": (annotate(AnnotateImmutableLocals), annotate(_RecursiveAnnotate)),
+    }
+
+
+# Return the best time of each pass over the program with each walk, and
+# check that both walks give the same result
+def visit_bench(prog: str, runs: int = 5) -> Dict[str, Tuple[float, float]]:
+    ast = Program(prog).ast
+    result = {}  # type: Dict[str, Tuple[float, float]]
+    for name, (iterative, recursive) in _passes(ast).items():
+        assert iterative() is recursive()
+        result[name] = (best_of(iterative, runs), best_of(recursive, runs))
+    return result
+
+
+# Return whether each walk can visit a SeqNode chain of the given length
+def visits_chain(length: int) -> Tuple[bool, bool]:
+    chain = VarNode("x")  # type: AST
+    for i in range(length):
+        chain = SeqNode(chain, VarNode("x"))
+    result = []  # type: List[bool]
+    for v in (FindMutatedLocals(), _RecursiveFind()):
+        try:
+            result.append(v.visit(chain) is chain)
+        except RecursionError:
+            result.append(False)
+    return result[0], result[1]
+
+
+def print_visit_bench(copies: int) -> None:
+    result = visit_bench(synthetic_program(copies))
+    print("analysis passes over {} copies (best of 5, ms):".format(copies))
+    print("  {:<24} {:>10} {:>10} {:>8}".format("pass", "iterative", "recursive", "speedup"))
+    for name, (iterative, recursive) in result.items():
+        print("  {:<24} {:>10.1f} {:>10.1f} {:>7.2f}x".format(name, iterative * 1000, recursive * 1000, recursive / iterative))
+    for length in (100, 1000, 10000, 100000):
+        ok = ["ok" if v else "RecursionError" for v in visits_chain(length)]
+        print("  SeqNode chain of {:>6}: iterative {}, recursive {}".format(length, *ok))
+
+
+if __name__ == "__main__":
+    print_visit_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
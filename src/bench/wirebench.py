@@ -0,0 +1,79 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from frontend import wire
+from frontend.program import Program
+
+from .common import ETM, best_of, read
+
+# Compare the size and encode/decode throughput of frontend.wire with pickle,
+# on the AST and the proof obligations of programs made of more and more
+# copies of proofs/etm.sbl, our largest proof. "mmap" decodes the wire
+# encoding in place from a memory-mapped file.
+#
+#     $ cd src && python3 -m bench.wirebench [max copies]
+
+
+def _mmap_loads(path: str) -> Any:
+    with open(path, "rb") as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return wire.loads(m)
+        finally:
+            m.close()
+
+
+# Return, for each format, the size in bytes of the encoding of value and the
+# best seconds taken to encode and to decode it
+def wire_bench(value: Any, runs: int = 5) -> Dict[str, Tuple[int, float, float]]:
+    data = wire.dumps(value)
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    result = {
+        "wire": (len(data), best_of(lambda: wire.dumps(value), runs), best_of(lambda: wire.loads(data), runs)),
+        "pickle": (len(pickled), best_of(lambda: pickle.dumps(value, pickle.HIGHEST_PROTOCOL), runs),
+                   best_of(lambda: pickle.loads(pickled), runs)),
+    }  # type: Dict[str, Tuple[int, float, float]]
+    fd, path = tempfile.mkstemp(suffix=".qvlb")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        result["wire (mmap)"] = (len(data), result["wire"][1], best_of(lambda: _mmap_loads(path), runs))
+    finally:
+        os.remove(path)
+    return result
+
+
+def print_wire_bench(max_copies: int = 32) -> None:
+    etm = read(ETM)
+    print("{:>7} {:>12} {:>12} {:>10} {:>10} {:>10}".format(
+        "copies", "value", "format", "bytes", "enc ms", "dec ms"))
+    copies = 1
+    while copies <= max_copies:
+        prog = Program(etm * copies)
+        values = [("ast", prog.ast), ("obligations", prog.generate_proof_obligations())]  # type: List[Tuple[str, Any]]
+        for name, value in values:
+            for fmt, (size, enc, dec) in wire_bench(value).items():
+                print("{:>7} {:>12} {:>12} {:>10} {:>10.2f} {:>10.2f}".format(
+                    copies, name, fmt, size, enc * 1000, dec * 1000))
+        copies *= 4
+
+
+if __name__ == "__main__":
+    print_wire_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 32)
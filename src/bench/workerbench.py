@@ -0,0 +1,95 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+from frontend.program import Program
+from frontend.rosette.runtime import RosetteRuntime
+
+from .common import installed
+
+# Compare the latency of checking a single small obligation with Rosette in a
+# new `racket` process (cold), as prove.py does by default, and on a worker
+# that already has the backend loaded (warm), as `prove.py --workers` does:
+#
+#     $ cd src && python3 -m bench.workerbench [--runs N] [file]
+#
+# It reports the median and best of --runs times (default 10) for a cold
+# check, for starting a worker (until it has checked its first program), and
+# for a warm check. The obligation is the first of the given file, or else a
+# small equivalence.
+
+SMALL = """
+A() { new (x=0) { get() { x } set(v) { x = v } } }
+B() { new (x=0) { get() { x + 0 } set(v) { x = v + 0 } } }
+A() ~ B()
+"""
+
+
+def _times(label: str, times: List[float]) -> None:
+    print("{:<28} {:>10.3f} {:>10.3f}".format(label, statistics.median(times), min(times)))
+
+def print_worker_bench(src: str, runs: int) -> None:
+    if not installed("rosette"):
+        print("(racket is not installed)")
+        return
+    runtime = RosetteRuntime(Program(src))
+    prf = next(Program(src).iter_proof_obligations())
+    fname = runtime.write_unit(prf)
+    with open(fname) as f:
+        text = f.read()
+
+    cold = []  # type: List[float]
+    for _ in range(runs):
+        start = time.perf_counter()
+        success, _ = runtime.finish(runtime.start(fname))
+        cold.append(time.perf_counter() - start)
+
+    first = []  # type: List[float]
+    warm = []  # type: List[float]
+    for _ in range(runs):
+        start = time.perf_counter()
+        pool = runtime.new_workers(1)
+        ok, out = pool.check(text)
+        first.append(time.perf_counter() - start)
+        if not ok:
+            print(out)
+        for _ in range(runs):
+            start = time.perf_counter()
+            pool.check(text)
+            warm.append(time.perf_counter() - start)
+        pool.close()
+    os.remove(fname)
+
+    print("{:<28} {:>10} {:>10}".format("check ({})".format("ok" if success else "FAILED"), "median (s)", "best (s)"))
+    _times("cold: new racket process", cold)
+    _times("starting a worker", first)
+    _times("warm: on a worker", warm)
+    print("{:<28} {:>10.1f}x".format("speedup", statistics.median(cold) / statistics.median(warm)))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = 10
+    if args[:1] == ["--runs"]:
+        runs = int(args[1])
+        args = args[2:]
+    src = SMALL
+    if args:
+        with open(args[0]) as f:
+            src = f.read()
+    print_worker_bench(src, runs)
@@ -11,8 +11,9 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
+import weakref
 from collections import defaultdict
-from typing import Dict, Optional, Set, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 from .ast import *
 
@@ -26,6 +27,7 @@ class GatherObjectInfo(ASTTransformer):
         def __init__(self) -> None:
             self.methods = {}  # type: Dict[str, MethodNode]
             self.fields = []  # type: List[str]
+            self.new = None  # type: Optional[NewNode]
     def __init__(self) -> None:
         super().__init__()
         # We track two types of objects: named (which are methods
@@ -52,8 +54,10 @@ class GatherObjectInfo(ASTTransformer):
         k = self._get_key_for_method(node)
         if isinstance(k, AST):
             self.anon[k].fields = [l.name for l in node.locals]
+            self.anon[k].new = node
         elif isinstance(k, str):
             self.ctors[k].fields = [l.name for l in node.locals]
+            self.ctors[k].new = node
         return node
     def visit_MethodNode(self, node: MethodNode) -> AST:
         k = self._get_key_for_method(node)
@@ -77,11 +81,38 @@ class GatherObjectInfo(ASTTransformer):
         return self.state[-1]
 
 
+# The object `this` refers to while running code inside the given enclosing
+# NewNodes, MethodNodes, and InitNodes (innermost last): the innermost
+# NewNode, except that an object's initializers run outside it; None at the
+# top level, where `this` is the globals; or, inside a function defined
+# outside any object, the innermost such MethodNode, which runs with the
+# `this` of whoever calls it.
+def _this_object(frames: List[AST]) -> Optional[AST]:
+    function = None  # type: Optional[AST]
+    i = len(frames) - 1
+    while i >= 0:
+        f = frames[i]
+        if isinstance(f, InitNode):
+            # skip the initializer and its object
+            i -= 2
+            continue
+        if isinstance(f, NewNode):
+            return f
+        if function is None:
+            function = f
+        i -= 1
+    return function
+
+
 # Find the set of fields mutated by each object in the program.
 # We consider a field mutated if it ever appears on the left-hand side
-# of an assignment.
+# of an assignment. An assignment to a name (x = e or x[i] = e) in an
+# object's methods mutates that object's field.
 # If we cannot precisely determine which object a mutation belongs to,
-# we conservatively assume that field is mutable on *every* object.
+# we conservatively assume that field is mutable on *every* object: this is
+# the case for an assignment through another object (o.x = e), and for one
+# in a function defined outside any object, which runs with the `this` of
+# whichever object calls it.
 class FindMutatedLocals(ASTTransformer):
     def __init__(self) -> None:
         super().__init__()
@@ -93,16 +124,31 @@ class FindMutatedLocals(ASTTransformer):
     def visit_NewNode(self, node: NewNode) -> AST:
         self.state.append(node)
         return node
+    def visit_InitNode(self, node: InitNode) -> AST:
+        self.state.append(node)
+        return node
+    def visit_MethodNode(self, node: MethodNode) -> AST:
+        self.state.append(node)
+        return node
     def visit_AssignNode(self, node: AssignNode) -> AST:
-        if isinstance(node.lhs, VarNode) and self.state:
-            new = self.state[-1]
-            if new not in self.must_mutate:
-                self.must_mutate[new] = set()
-            self.must_mutate[new].add(node.lhs.name)
-        elif isinstance(node.lhs, CompoundVarNode):
-            self.may_mutate.add(node.lhs.name)
+        lhs = node.lhs
+        if isinstance(lhs, CompoundVarNode) and lhs.obj is not ConstNil:
+            self.may_mutate.add(lhs.name)
+            return node
+        this = _this_object(self.state)
+        if isinstance(this, NewNode):
+            if this not in self.must_mutate:
+                self.must_mutate[this] = set()
+            self.must_mutate[this].add(lhs.name)
+        elif this is not None:
+            self.may_mutate.add(lhs.name)
         return node
 
+    # Whether the field name of the objects a NewNode creates may be
+    # assigned after they are initialized
+    def mutable(self, new: NewNode, name: str) -> bool:
+        return name in self.may_mutate or name in self.must_mutate.get(new, ())
+
 
 # Transform InitNodes to annotate their mutability.
 # Uses the FindMutatedLocals visitor above to determine mutability.
@@ -112,17 +158,392 @@ class AnnotateImmutableLocals(ASTTransformer):
         self.find = FindMutatedLocals()
     def visit(self, ast: AST) -> AST:
         self.find.visit(ast)
+        return self.annotate(ast)
+    # annotate using only the mutations already found by self.find
+    # (which must have visited the whole program before the result is used)
+    def annotate(self, ast: AST) -> AST:
         return super().visit(ast)
     def visit_NewNode(self, node: NewNode) -> NewNode:
         self.state.append(node)
         return node
     def visit_InitNode(self, node: InitNode) -> InitNode:
-        immutable = True
-        if self.state and self.state[-1] in self.find.must_mutate:
-            muts = self.find.must_mutate[self.state[-1]]
-            if node.name in muts:
-                immutable = False
-        if node.name in self.find.may_mutate:
-            immutable = False
-        new = InitNode(node.name, node.val, immutable)
+        immutable = not self.find.mutable(self.state[-1], node.name)
+        return InitNode(node.name, node.val, immutable)
+
+
+# Find the names a method body cannot safely treat as its own locals: any
+# name assigned outside the methods of an object (which may be a global,
+# since assignments at the top level and in top-level functions create
+# globals), and any name assigned through a compound lvalue (which may be a
+# field of any object). Also count the definitions of each method name, so
+# that callers can tell whether a constructor's name is ambiguous, and collect
+# those of functions (methods not defined directly in an object's body).
+class FindGlobalNames(ASTTransformer):
+    def __init__(self) -> None:
+        super().__init__()
+        self.names = set()  # type: Set[str]
+        self.definitions = defaultdict(int)  # type: Dict[str, int]
+        self.functions = defaultdict(list)  # type: Dict[str, List[MethodNode]]
+    def visit_NewNode(self, node: NewNode) -> AST:
+        self.state.append(node)
+        return node
+    def visit_MethodNode(self, node: MethodNode) -> AST:
+        self.definitions[node.name] += 1
+        if not self.state or not isinstance(self.state[-1], NewNode):
+            self.functions[node.name].append(node)
+        self.state.append(node)
+        return node
+    def visit_AssignNode(self, node: AssignNode) -> AST:
+        if isinstance(node.lhs, CompoundVarNode) or not self._in_object_method():
+            self.names.add(node.lhs.name)
+        return node
+    def _in_object_method(self) -> bool:
+        new = False
+        for n in self.state:
+            if isinstance(n, NewNode):
+                new = True
+            elif new and isinstance(n, MethodNode):
+                return True
+        return False
+
+
+# The builtin operators whose result depends only on their arguments, with
+# their arities
+PURE_BUILTINS = {"+": 2, "-": 2, "*": 2, "/": 2, "<": 2, ">": 2, "==": 2, "&": 2, "|": 2, "||": 2, "!": 1}
+
+
+# Return whether calling the method with the same arguments on two objects
+# whose fields `equal` hold equal values returns equal values and leaves those
+# fields equal, given the names of the fields of either object and which
+# names may not be the method's own locals (see FindGlobalNames). If not
+# `writable`, the method must not write any field at all, so that it leaves
+# both contexts as they were.
+def same_behavior(method: MethodNode, fields: Set[str], equal: Set[str], is_global: Callable[[str], bool], writable: bool) -> bool:
+    args = set(a.name for a in method.args)
+    def name_ok(name: str, write: bool) -> bool:
+        if name in args:
+            return True
+        elif name in fields:
+            return name in equal and (writable or not write)
+        else:
+            return not is_global(name)
+    stack = [method.body]  # type: List[AST]
+    while stack:
+        node = stack.pop()
+        t = type(node)
+        if t is VarNode:
+            if not name_ok(node.name, False):
+                return False
+            continue
+        elif t is AssignNode:
+            lhs = node.lhs
+            if not name_ok(lhs.name, True):
+                return False
+            if isinstance(lhs, CompoundVarNode):
+                if lhs.obj is not ConstNil:
+                    return False
+                stack.append(lhs.idx)
+            stack.append(node.rhs)
+            continue
+        elif t is CompoundVarNode:
+            # only indexing into a name of this object
+            if node.obj is not ConstNil or not name_ok(node.name, False):
+                return False
+        elif t is CallNode:
+            if node.obj is not ConstNil or PURE_BUILTINS.get(node.name) != len(node.args):
+                return False
+        elif t not in (ConstNode, TupleNode, SeqNode, BlockNode, ITENode, NopNode):
+            # e.g., object creation, method definitions, and calls
+            return False
+        for f in t._children:
+            c = getattr(node, f)
+            if type(c) is list:
+                stack.extend(c)
+            else:
+                stack.append(c)
+    return True
+
+
+# Return the fields of an object that calling one of its methods may read or
+# write, given the object's methods and fields, and a function that looks up
+# the definitions of a function (which runs with its caller's `this`). Return
+# None if we can't tell: the method (or a method or function it calls)
+# creates objects, defines methods, or calls a function defined more than
+# once. Calling a function that isn't defined is an error. Other objects can't
+# refer to this one, so calls through them touch none of its fields, but as
+# the object called may be nil, which calls a method of this one or a
+# function, such calls count as calls to those, too.
+def method_footprint(method: MethodNode, methods: Dict[str, MethodNode], fields: Set[str], functions: Callable[[str], List[MethodNode]]) -> Optional[Set[str]]:
+    footprint = set()  # type: Set[str]
+    seen = set()  # type: Set[MethodNode]
+    pending = [method]
+    while pending:
+        m = pending.pop()
+        if m in seen:
+            continue
+        seen.add(m)
+        stack = [m.body]  # type: List[AST]
+        while stack:
+            node = stack.pop()
+            t = type(node)
+            if t is VarNode or t is CompoundVarNode:
+                if node.name in fields:
+                    footprint.add(node.name)
+            elif t is AssignNode:
+                if node.lhs.name in fields:
+                    footprint.add(node.lhs.name)
+            elif t is CallNode:
+                # builtins first, then this object's methods, then functions
+                if node.name in methods:
+                    pending.append(methods[node.name])
+                elif node.name not in PURE_BUILTINS and node.name != "adversary":
+                    defs = functions(node.name)
+                    if len(defs) > 1:
+                        return None
+                    pending.extend(defs)
+            elif t not in (ConstNode, TupleNode, SeqNode, BlockNode, ITENode, NopNode):
+                return None
+            for f in t._children:
+                c = getattr(node, f)
+                if type(c) is list:
+                    stack.extend(c)
+                else:
+                    stack.append(c)
+    return footprint
+
+
+# The objects, globals, and mutated fields of a sequence of top-level
+# statements, kept up to date as each statement is added, so that a proof
+# obligation can look up the objects its context defines without walking the
+# whole context. Entries are merged as GatherObjectInfo merges them over the
+# whole sequence, but never changed in place once added, so that a snapshot
+# can share them. A layer over an index adds statements (such as an
+# obligation's lhs and rhs) without changing the index below.
+class ObjectIndex(object):
+    def __init__(self, below: Optional['ObjectIndex'] = None) -> None:
+        self.below = below
+        self.ctors = {}  # type: Dict[str, GatherObjectInfo.ObjectInfo]
+        self.anon = {}  # type: Dict[AST, GatherObjectInfo.ObjectInfo]
+        self.must_mutate = {}  # type: Dict[NewNode, Set[str]]
+        self.may_mutate = set()  # type: Set[str]
+        self.global_names = set()  # type: Set[str]
+        self.definitions = {}  # type: Dict[str, int]
+        self.functions = {}  # type: Dict[str, List[MethodNode]]
+
+    def add(self, stmt: AST) -> None:
+        objs = GatherObjectInfo()
+        objs.visit(stmt)
+        for key, info in objs.ctors.items():
+            self.ctors[key] = self._merge(self._ctor(key), info)
+        for node, info in objs.anon.items():
+            self.anon[node] = self._merge(self._anon(node), info)
+        muts = FindMutatedLocals()
+        muts.visit(stmt)
+        for new, names in muts.must_mutate.items():
+            self.must_mutate[new] = self._mutated(new) | names
+        self.may_mutate |= muts.may_mutate
+        globs = FindGlobalNames()
+        globs.visit(stmt)
+        self.global_names |= globs.names
+        for name, count in globs.definitions.items():
+            self.definitions[name] = self.definition_count(name) + count
+        for name, defs in globs.functions.items():
+            self.functions[name] = self.function_definitions(name) + defs
+
+    # Return a new layer over this index with the given terms added
+    def layer(self, *terms: AST) -> 'ObjectIndex':
+        index = ObjectIndex(self)
+        for t in terms:
+            index.add(t)
+        return index
+
+    # Return a copy of this index that later additions to it won't change
+    def snapshot(self) -> 'ObjectIndex':
+        index = ObjectIndex(self.below)
+        index.ctors = dict(self.ctors)
+        index.anon = dict(self.anon)
+        index.must_mutate = dict(self.must_mutate)
+        index.may_mutate = set(self.may_mutate)
+        index.global_names = set(self.global_names)
+        index.definitions = dict(self.definitions)
+        index.functions = dict(self.functions)
+        return index
+
+    def _merge(self, old: Optional[GatherObjectInfo.ObjectInfo], new: GatherObjectInfo.ObjectInfo) -> GatherObjectInfo.ObjectInfo:
+        if old is not None:
+            methods = dict(old.methods)
+            methods.update(new.methods)
+            new.methods = methods
         return new
+
+    def _ctor(self, name: str) -> Optional[GatherObjectInfo.ObjectInfo]:
+        if name in self.ctors:
+            return self.ctors[name]
+        return self.below._ctor(name) if self.below is not None else None
+
+    def _anon(self, node: AST) -> Optional[GatherObjectInfo.ObjectInfo]:
+        if node in self.anon:
+            return self.anon[node]
+        return self.below._anon(node) if self.below is not None else None
+
+    def _mutated(self, new: NewNode) -> Set[str]:
+        if new in self.must_mutate:
+            return self.must_mutate[new]
+        return self.below._mutated(new) if self.below is not None else set()
+
+    # the object created by a NewNode or a call to a named constructor
+    def _info(self, node: AST) -> Optional[GatherObjectInfo.ObjectInfo]:
+        if isinstance(node, NewNode):
+            return self._anon(node)
+        elif isinstance(node, CallNode) and node.obj is ConstNil:
+            return self._ctor(node.name)
+        else:
+            return None
+
+    def get_methods(self, node: AST) -> Optional[Dict[str, MethodNode]]:
+        info = self._info(node)
+        return info.methods if info is not None else None
+
+    def get_fields(self, node: AST) -> List[str]:
+        info = self._info(node)
+        return info.fields if info is not None else []
+
+    # The fields of the object that some statement assigns, which are those
+    # AnnotateImmutableLocals would consider mutable
+    def get_mutable_fields(self, node: AST) -> List[str]:
+        info = self._info(node)
+        if info is None:
+            return []
+        must = self._mutated(info.new) if info.new is not None else set()
+        return [f for f in info.fields if f in must or self._may_mutate(f)]
+
+    def _may_mutate(self, name: str) -> bool:
+        return name in self.may_mutate or (self.below is not None and self.below._may_mutate(name))
+
+    # Whether a method body may find a global, rather than a local of its
+    # own, under this name (see FindGlobalNames)
+    def is_global(self, name: str) -> bool:
+        return name in self.global_names or (self.below is not None and self.below.is_global(name))
+
+    def definition_count(self, name: str) -> int:
+        if name in self.definitions:
+            return self.definitions[name]
+        return self.below.definition_count(name) if self.below is not None else 0
+
+    # The definitions of a function (see FindGlobalNames)
+    def function_definitions(self, name: str) -> List[MethodNode]:
+        if name in self.functions:
+            return self.functions[name]
+        return self.below.function_definitions(name) if self.below is not None else []
+
+
+# The names a node mentions: the variables it reads or assigns, and the
+# functions and methods it calls or defines
+def mentioned_names(node: AST) -> Set[str]:
+    names = set()  # type: Set[str]
+    stack = [node]  # type: List[Any]
+    while stack:
+        n = stack.pop()
+        if n is None:
+            continue
+        name = getattr(n, "name", None)
+        if type(name) is str:
+            names.add(name)
+        for f in type(n)._children:
+            c = getattr(n, f)
+            if type(c) is list:
+                stack.extend(c)
+            else:
+                stack.append(c)
+    return names
+
+
+# Whether evaluating an expression changes nothing at all: it assigns
+# nothing, calls no functions or methods but pure builtins, and creates no
+# objects. A new object (or adversary) takes an address, and so shifts the
+# address of every later object, and is reachable without being named, as
+# havoced fields and method arguments may refer to any object created before
+# the proof's.
+def _effect_free(node: AST) -> bool:
+    stack = [node]  # type: List[AST]
+    while stack:
+        n = stack.pop()
+        t = type(n)
+        if t is CallNode:
+            if n.obj is not ConstNil or PURE_BUILTINS.get(n.name) != len(n.args):
+                return False
+            stack.extend(n.args)
+            continue
+        elif t not in (VarNode, ConstNode, TupleNode, SeqNode, BlockNode, ITENode, NopNode):
+            return False
+        for f in t._children:
+            c = getattr(n, f)
+            if type(c) is list:
+                stack.extend(c)
+            else:
+                stack.append(c)
+    return True
+
+
+# What a top-level statement binds, if it does nothing else (so that a
+# context needs it only if that name is needed), and the names it mentions.
+# Computed once per (hash-consed) statement.
+_summaries = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+def _summary(stmt: AST) -> Tuple[Optional[str], Set[str]]:
+    summary = _summaries.get(stmt)
+    if summary is None:
+        binds = None  # type: Optional[str]
+        if isinstance(stmt, MethodNode):
+            binds = stmt.name
+        elif isinstance(stmt, AssignNode) and isinstance(stmt.lhs, VarNode) and _effect_free(stmt.rhs):
+            binds = stmt.lhs.name
+        summary = _summaries[stmt] = (binds, mentioned_names(stmt))
+    return summary
+
+# The function or global a top-level statement defines, if that is all it does
+def defined_name(stmt: AST) -> Optional[str]:
+    return _summary(stmt)[0]
+
+
+# Slices a context (the top-level statements before a proof) down to the
+# statements that the terms of a proof can reach: the definitions of the
+# functions and globals they mention, and of those that these mention, and
+# so on. A statement that could do anything but define a function or assign
+# a global a value computed without side effects (such as a call, which may
+# assign globals or objects the proof uses, or anything creating an object,
+# which the proof's objects may refer to) is always kept, as are all the definitions of a name that is
+# needed, since each may be the one in effect when some statement runs.
+class ContextSlicer(object):
+    def __init__(self, statements: List[AST]) -> None:
+        self.statements = statements
+        # the statements always kept, and those binding each name
+        self.always = []  # type: List[int]
+        self.binders = defaultdict(list)  # type: Dict[str, List[int]]
+        for i, s in enumerate(statements):
+            binds, _ = _summary(s)
+            if binds is None:
+                self.always.append(i)
+            else:
+                self.binders[binds].append(i)
+
+    # The statements the given terms (such as a proof's sides and hints)
+    # may depend on, in order
+    def slice(self, terms: List[AST]) -> List[AST]:
+        kept = set(self.always)
+        names = set()  # type: Set[str]
+        pending = []  # type: List[str]
+        def need(more: Set[str]) -> None:
+            for n in more - names:
+                names.add(n)
+                pending.append(n)
+        for t in terms:
+            need(mentioned_names(t))
+        for i in self.always:
+            need(_summary(self.statements[i])[1])
+        while pending:
+            for i in self.binders.get(pending.pop(), ()):
+                if i not in kept:
+                    kept.add(i)
+                    need(_summary(self.statements[i])[1])
+        return [s for i, s in enumerate(self.statements) if i in kept]
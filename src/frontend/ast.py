@@ -11,85 +11,292 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
-from typing import List, Any, Optional, Union
+import sys
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 def list_to_dafny_list(lst):
-    if len(lst) == 0:
-        return "LNil"
-    else:
-        return "Cons({}, {})".format(lst[0], list_to_dafny_list(lst[1:]))
+    return "".join("Cons({}, ".format(x) for x in lst) + "LNil" + ")" * len(lst)
 def var_list_to_dafny_list(lst):
-    if len(lst) == 0:
-        return "LNil"
-    else:
-        return 'Cons("{}", {})'.format(lst[0], var_list_to_dafny_list(lst[1:]))
+    return "".join('Cons("{}", '.format(x) for x in lst) + "LNil" + ")" * len(lst)
 
-class AST(object):
+# The pieces of a Dafny list of the serializations of nodes
+def _dafny_list_parts(nodes: List['AST']) -> List[Any]:
+    parts = []  # type: List[Any]
+    for n in nodes:
+        parts.append("Cons(")
+        parts.append(n)
+        parts.append(", ")
+    parts.append("LNil" + ")" * len(nodes))
+    return parts
+
+# The pieces of the serializations of nodes separated by spaces
+def _sexp_list_parts(nodes: List['AST']) -> List[Any]:
+    parts = []  # type: List[Any]
+    for n in nodes:
+        if parts:
+            parts.append(" ")
+        parts.append(n)
+    return parts
+
+## Serialization ##############################################################
+
+# Each node describes its serialization for a backend as a sequence of pieces,
+# each either a string or a child node, which _serialize writes out with an
+# explicit stack rather than recursion. A node that has already been
+# serialized to a string (and cached it) is written as that string.
+def _serialize(root: 'AST', write: Any, cache: str, parts: str) -> None:
+    stack = [root]  # type: List[Any]
+    while stack:
+        p = stack.pop()
+        if type(p) is str:
+            write(p)
+            continue
+        text = getattr(p, cache, None)
+        if text is not None:
+            write(text)
+        else:
+            stack.extend(reversed(getattr(p, parts)()))
+
+# Write root's serialization to write without building it as one string.
+# Sequences are written piece by piece, and only the nodes they sequence are
+# serialized to (cached) strings, so that writing the growing context of each
+# proof obligation doesn't cache a string for every prefix of the program.
+def _write_streamed(root: 'AST', write: Any, cache: str, parts: str, serialize: str) -> None:
+    stack = [root]  # type: List[Any]
+    while stack:
+        p = stack.pop()
+        if type(p) is str:
+            write(p)
+        elif p._streamed and getattr(p, cache, None) is None:
+            stack.extend(reversed(getattr(p, parts)()))
+        else:
+            write(getattr(p, serialize)())
+
+## Hash-consing ###############################################################
+
+# AST nodes are hash-consed: constructing a node that is structurally equal to
+# a live node returns that node instead, so equal subtrees are one shared
+# object, equality is identity, and each node's structural hash is computed
+# once when it is built. Shared nodes must never be modified in place;
+# ASTTransformer builds new nodes for any subtree it changes.
+#
+# AST nodes declare their fields in __slots__ (in constructor argument order)
+# rather than having a __dict__, which more than halves their size; every
+# subclass must declare __slots__ too.
+
+_interned = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary
+_interned_lock = threading.Lock()
+
+# Return the shared node structurally equal to node, making node the shared
+# one if there is none yet
+def _intern(node: 'AST') -> 'AST':
+    cls = type(node)
+    key = [cls]  # type: List[Any]
+    for f in cls.__slots__:
+        v = getattr(node, f)
+        key.append(tuple(v) if type(v) is list else v)
+    k = tuple(key)
+    with _interned_lock:
+        shared = _interned.get(k)
+        if shared is None:
+            node._hash = hash(k)
+            _interned[k] = node
+            shared = node
+    return shared
+
+class _HashConsed(type):
+    def __call__(cls, *args, **kwargs):
+        node = super().__call__(*args, **kwargs)
+        if isinstance(getattr(node, "name", None), str):
+            node.name = sys.intern(node.name)
+        return _intern(node)
+
+class AST(object, metaclass=_HashConsed):
+    __slots__ = ("_hash", "__weakref__", "_dafny", "_sexp")
+    # whether write_dafny/write_sexp write this node piece by piece rather
+    # than serializing it to a string
+    _streamed = False
+    # Serialize this node for the Dafny or Rosette backend. Nodes are never
+    # modified in place, so each node serializes itself once and caches it;
+    # a node rewritten by ASTTransformer is a new node with nothing cached.
     def to_dafny(self) -> str:
-        raise NotImplementedError()
+        try:
+            return self._dafny
+        except AttributeError:
+            pieces = []  # type: List[str]
+            _serialize(self, pieces.append, "_dafny", "_dafny_parts")
+            self._dafny = "".join(pieces)
+            return self._dafny
     def to_sexp(self) -> str:
+        try:
+            return self._sexp
+        except AttributeError:
+            pieces = []  # type: List[str]
+            _serialize(self, pieces.append, "_sexp", "_sexp_parts")
+            self._sexp = "".join(pieces)
+            return self._sexp
+    # Write the serialization of this node to out, a file-like object
+    def write_dafny(self, out: Any) -> None:
+        _write_streamed(self, out.write, "_dafny", "_dafny_parts", "to_dafny")
+    def write_sexp(self, out: Any) -> None:
+        _write_streamed(self, out.write, "_sexp", "_sexp_parts", "to_sexp")
+    # the pieces of this node's serialization: strings and child nodes
+    def _dafny_parts(self) -> Tuple[Any, ...]:
         raise NotImplementedError()
-    def visit(self, visitor: 'ASTTransformer') -> None:
+    def _sexp_parts(self) -> Tuple[Any, ...]:
         raise NotImplementedError()
+    # the fields holding this node's children (each a node, or a list of
+    # nodes and Nones), in the order ASTTransformer visits them
+    _children = ()  # type: Tuple[str, ...]
+    # raise if new can't replace a child in field
+    def _check_child(self, field: str, new: Any) -> None:
+        pass
+    def __hash__(self) -> int:
+        return self._hash
+    def __reduce__(self) -> Tuple[type, Tuple[Any, ...]]:
+        # rebuild through the constructor, so unpickled nodes are shared too
+        return type(self), tuple(getattr(self, f) for f in type(self).__slots__)
+    # Return this node if none of its children changed, or else a new node
+    # with the new children, given in the order of _children
+    def _rebuild(self, new_children: List[Any]) -> 'AST':
+        cls = type(self)
+        changed = {}  # type: Dict[str, Any]
+        pos = 0
+        for f in cls._children:
+            old = getattr(self, f)
+            if type(old) is list:
+                new = new_children[pos:pos + len(old)]
+                pos += len(old)
+                if any(a is not b for a, b in zip(old, new)):
+                    for c in new:
+                        if c is not None:
+                            self._check_child(f, c)
+                    changed[f] = new
+            else:
+                new = new_children[pos]
+                pos += 1
+                if new is not old:
+                    self._check_child(f, new)
+                    changed[f] = new
+        if not changed:
+            return self
+        copy = object.__new__(cls)
+        for f in cls.__slots__:
+            setattr(copy, f, changed[f] if f in changed else getattr(self, f))
+        return _intern(copy)
+
+
+# An ASTTransformer visits every node of an AST in depth-first order,
+# calling visit_C(node) for the most specific class C of the node that it
+# defines a method for. That method returns the node to use instead (often
+# the node itself), whose children are then visited in turn. Any entries a
+# visit_C method appends to self.state are removed once the node's children
+# have been visited, so self.state holds entries for the node's ancestors
+# (visit_C methods may append to self.state, but must not replace it).
+#
+# The walk uses an explicit stack rather than recursion, so arbitrarily deep
+# ASTs (such as long SeqNode chains) can be visited, and the visit_C method
+# for each class of node is looked up once per transformer class.
+_dispatch_tables = {}  # type: Dict[type, Dict[type, Optional[Callable[[Any, AST], AST]]]]
 
 class ASTTransformer(object):
     def __init__(self) -> None:
         self.state = []  # type: List[Any]
-    def _visit(self, node: AST) -> AST:
-        mro = type(node).mro()
-        for cls in mro:
-            meth = getattr(self, 'visit_' + cls.__name__, None)
+    # the visit_C method for a class of node, or None if there is none
+    def _dispatch(self, table: Dict[type, Any], cls: type) -> Optional[Callable[[Any, AST], AST]]:
+        meth = None
+        for c in cls.__mro__:
+            meth = getattr(type(self), 'visit_' + c.__name__, None)
             if meth is not None:
-                return meth(node)
-        return node
+                break
+        table[cls] = meth
+        return meth
     def visit(self, node: AST) -> AST:
-        old_state = len(self.state)
-        new_node = self._visit(node)
-        new_node.visit(self)
-        if len(self.state) > old_state:
-            self.state = self.state[:old_state]
-        return new_node
+        table = _dispatch_tables.get(type(self))
+        if table is None:
+            table = _dispatch_tables[type(self)] = {}
+        state = self.state
+        results = []  # type: List[Any]
+        stack = [node]  # type: List[Any]
+        while stack:
+            item = stack.pop()
+            if type(item) is tuple:
+                # all of n's children have been visited
+                n, old_state, children = item
+                count = len(children)
+                new_children = results[-count:]
+                del results[-count:]
+                results.append(n if new_children == children else n._rebuild(new_children))
+                del state[old_state:]
+                continue
+            if item is None:
+                results.append(None)
+                continue
+            old_state = len(state)
+            cls = type(item)
+            meth = table[cls] if cls in table else self._dispatch(table, cls)
+            n = meth(self, item) if meth is not None else item
+            fields = type(n)._children
+            if not fields:
+                results.append(n)
+                del state[old_state:]
+                continue
+            children = []  # type: List[Any]
+            for f in fields:
+                c = getattr(n, f)
+                if type(c) is list:
+                    children.extend(c)
+                else:
+                    children.append(c)
+            if not children:
+                results.append(n)
+                del state[old_state:]
+                continue
+            stack.append((n, old_state, children))
+            stack.extend(reversed(children))
+        return results[0]
 
 
 # surface-level nodes are not passed verbatim to Dafny; they must therefore have
 # some special handling in the AST->Dafny compiler
 class SurfaceAST(AST):
-    pass
+    __slots__ = ()
 
 class Value(AST):
-    pass
+    __slots__ = ()
 
 
 class TopLevelNode(SurfaceAST):
+    __slots__ = ("children",)
+    _children = ("children",)
     def __init__(self, children: List[AST]) -> None:
         self.children = children
     def __str__(self) -> str:
         return "<TopLevelNode [{}]>".format(", ".join(str(c) for c in self.children))
-    def visit(self, visitor):
-        self.children = [visitor.visit(c) for c in self.children]
-    # return a new TopLevelNode with consecutive non-proof terms collapsed into a single SeqNode
+    # return a new TopLevelNode with consecutive non-proof terms collapsed into a single BlockNode
     def collapsed(self) -> 'TopLevelNode':
         if len(self.children) > 1:
-            # flatten consecutive non-proof terms into a single SeqNote
-            curr = None  # type: Optional[AST]
             new_children = []  # type: List[AST]
-            for c in self.children[::-1]:
+            terms = []  # type: List[AST]
+            for c in self.children:
                 if isinstance(c, SurfaceAST):
-                    if curr is not None:
-                        new_children.append(curr)
-                        curr = None
+                    if terms:
+                        new_children.append(block(terms))
+                        terms = []
                     new_children.append(c)
-                elif curr is not None:
-                    curr = SeqNode(c, curr)
                 else:
-                    curr = c
-            if curr is not None:
-                new_children.append(curr)
-            return TopLevelNode(new_children[::-1])
+                    terms.append(c)
+            if terms:
+                new_children.append(block(terms))
+            return TopLevelNode(new_children)
         return self
 
 
 class ProofNode(SurfaceAST):
+    __slots__ = ("terms", "hints", "verbatims")
+    _children = ("terms", "hints")
     def __init__(self, terms: List[AST], hints: List[Optional[AST]], verbatims: List[str]) -> None:
         assert len(terms) > 1
         assert len(terms) == len(hints)
@@ -98,65 +305,64 @@ class ProofNode(SurfaceAST):
         self.verbatims = verbatims
     def __str__(self) -> str:
         return "<Proof {}>".format(" ~ ".join(str(x) for x in self.terms))
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.terms = [visitor.visit(c) for c in self.terms]
-        self.hints = [visitor.visit(c) if c is not None else c for c in self.hints]
 
 class AssertNode(SurfaceAST):
+    __slots__ = ("cond",)
+    _children = ("cond",)
     def __init__(self, cond: AST) -> None:
         self.cond = cond
     def __str__(self) -> str:
         return "<Assert {}>".format(self.cond)
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.cond = visitor.visit(self.cond)
 
 class AssumeNode(SurfaceAST):
+    __slots__ = ("proof",)
+    _children = ("proof",)
     def __init__(self, proof: ProofNode) -> None:
         assert len(proof.terms) == 2
         self.proof = proof
     def __str__(self) -> str:
         return "<Assume {}>".format(self.proof)
-    def visit(self, visitor: ASTTransformer) -> None:
-        new_proof = visitor.visit(self.proof)
-        if not isinstance(new_proof, ProofNode):
-            raise Exception("AssumeNode expects proof to be ProofNode, got instead {}".format(new_proof))
-        self.proof = new_proof
+    def _check_child(self, field: str, new: Any) -> None:
+        if not isinstance(new, ProofNode):
+            raise Exception("AssumeNode expects proof to be ProofNode, got instead {}".format(new))
 
 class IntNode(Value):
+    __slots__ = ("val",)
+    _children = ()
     def __init__(self, val: int) -> None:
         self.val = val
-    def to_dafny(self) -> str:
-        return 'Int({})'.format(self.val)
-    def to_sexp(self) -> str:
-        return '(Int {})'.format(self.val)
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('Int({})'.format(self.val),)
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(Int {})'.format(self.val),)
     def __str__(self) -> str:
         return "<IntNode {}>".format(self.val)
-    def visit(self, visitor: ASTTransformer) -> None:
-        pass
 
 class NilNode(Value):
+    __slots__ = ()
+    _children = ()
     def __init__(self) -> None:
         pass
-    def to_dafny(self) -> str:
-        return 'Nil()'
-    def to_sexp(self) -> str:
-        return '(Nil)'
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('Nil()',)
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(Nil)',)
     def __str__(self) -> str:
         return "<NilNode>"
-    def visit(self, visitor: ASTTransformer) -> None:
-        pass
 
 class VarNode(AST):
+    __slots__ = ("name", "type")
+    _children = ()
     def __init__(self, name: str, typ: Any=None) -> None:
         self.name = name
         self.type = typ
-    def to_dafny(self) -> str:
-        return 'EVar("{}")'.format(self.name)
-    def to_sexp(self) -> str:
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('EVar("{}")'.format(self.name),)
+    def _sexp_parts(self) -> Tuple[Any, ...]:
         if self.type is None:
-            return "(EVar '{})".format(self.name)
+            return ("(EVar '{})".format(self.name),)
         else:
-            return "(EVar '{} {})".format(self.name, self._type_to_sexp(self.type))
+            return ("(EVar '{} {})".format(self.name, self._type_to_sexp(self.type)),)
     def _type_to_sexp(self, typ: Any) -> str:
         if isinstance(typ, tuple):
             return "(list {})".format(" ".join(self._type_to_sexp(t) for t in typ))
@@ -164,185 +370,195 @@ class VarNode(AST):
             return "'value"
     def __str__(self) -> str:
         return "<VarNode '{}'>".format(self.name)
-    def visit(self, visitor: ASTTransformer) -> None:
-        pass
 
 class ConstNode(AST):
+    __slots__ = ("val",)
+    _children = ()
     def __init__(self, val: Value) -> None:
         self.val = val
-    def to_dafny(self) -> str:
-        return 'EConst({})'.format(self.val.to_dafny())
-    def to_sexp(self) -> str:
-        return '(EConst {})'.format(self.val.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('EConst(', self.val, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(EConst ', self.val, ')')
     def __str__(self) -> str:
         return "<ConstNode {}>".format(self.val)
-    def visit(self, visitor: ASTTransformer) -> None:
-        pass
 
 class TupleNode(AST):
+    __slots__ = ("args",)
+    _children = ("args",)
     def __init__(self, args: List[AST]) -> None:
         self.args = args
-    def to_dafny(self) -> str:
-        args = list_to_dafny_list([l.to_dafny() for l in self.args])
-        return 'ETuple({})'.format(args)
-    def to_sexp(self) -> str:
-        args = " ".join(l.to_sexp() for l in self.args)
-        return '(ETuple (list {}))'.format(args)
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ETuple(', *_dafny_list_parts(self.args), ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(ETuple (list ', *_sexp_list_parts(self.args), '))')
     def __str__(self) -> str:
         return "<TupleNode [{}]>".format(", ".join(str(l) for l in self.args))
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.args = [visitor.visit(c) for c in self.args]
 
 class SeqNode(AST):
+    __slots__ = ("e1", "e2")
+    _children = ("e1", "e2")
+    _streamed = True
     def __init__(self, e1: AST, e2: AST) -> None:
         self.e1 = e1
         self.e2 = e2
-    def to_dafny(self) -> str:
-        return 'ESeq({}, {})'.format(self.e1.to_dafny(), self.e2.to_dafny())
-    def to_sexp(self) -> str:
-        return '(ESeq {} {})'.format(self.e1.to_sexp(), self.e2.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ESeq(', self.e1, ', ', self.e2, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(ESeq ', self.e1, ' ', self.e2, ')')
     def __str__(self) -> str:
         return "<SeqNode {} {}>".format(self.e1, self.e2)
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.e1 = visitor.visit(self.e1)
-        self.e2 = visitor.visit(self.e2)
+
+# A sequence of expressions evaluated in order, whose value is the value of
+# the last. Unlike a chain of SeqNodes, a block of any length is one level
+# deep, so the backends evaluate it with a loop rather than by recursion.
+class BlockNode(AST):
+    __slots__ = ("exprs",)
+    _children = ("exprs",)
+    _streamed = True
+    def __init__(self, exprs: List[AST]) -> None:
+        self.exprs = exprs
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('EBlock(', *_dafny_list_parts(self.exprs), ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(EBlock (list ', *_sexp_list_parts(self.exprs), '))')
+    def __str__(self) -> str:
+        return "<BlockNode [{}]>".format(", ".join(str(e) for e in self.exprs))
+
+# The expressions in order as a single node: a NopNode if there are none,
+# the expression itself if there is one, and otherwise a BlockNode with the
+# expressions of any BlockNodes among them spliced in
+def block(exprs: List[AST]) -> AST:
+    if len(exprs) == 0:
+        return NopNode()
+    if len(exprs) == 1:
+        return exprs[0]
+    flat = []  # type: List[AST]
+    for e in exprs:
+        if isinstance(e, BlockNode):
+            flat.extend(e.exprs)
+        else:
+            flat.append(e)
+    return BlockNode(flat)
 
 class CompoundVarNode(AST):
+    __slots__ = ("obj", "name", "idx")
+    _children = ("obj", "idx")
     def __init__(self, obj: AST, name: str, idx: AST) -> None:
         self.obj = obj
         self.name = name
         self.idx = idx
-    def to_dafny(self) -> str:
-        return 'ECVar({}, "{}", {})'.format(self.obj.to_dafny(), self.name, self.idx.to_dafny())
-    def to_sexp(self) -> str:
-        return "(ECVar {} '{} {})".format(self.obj.to_sexp(), self.name, self.idx.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ECVar(', self.obj, ', "{}", '.format(self.name), self.idx, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(ECVar ', self.obj, " '{} ".format(self.name), self.idx, ')')
     def __str__(self) -> str:
         return "<CompoundVarNode {} '{}' {}>".format(self.obj, self.name, self.idx)
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.obj = visitor.visit(self.obj)
-        self.idx = visitor.visit(self.idx)
 
 class InitNode(AST):
+    __slots__ = ("name", "val", "immutable")
+    _children = ("val",)
     def __init__(self, name: str, val: AST, immutable: bool = False) -> None:
         self.name = name
         self.val = val
         self.immutable = immutable
-    def to_dafny(self) -> str:
-        return 'Init("{}", {})'.format(self.name, self.val.to_dafny())
-    def to_sexp(self) -> str:
-        return "(Init '{} {} {})".format(self.name, self.val.to_sexp(), "#t" if self.immutable else "#f")
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('Init("{}", '.format(self.name), self.val, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ("(Init '{} ".format(self.name), self.val, " #t)" if self.immutable else " #f)")
     def __str__(self) -> str:
         return "<Init '{}' {} ({})>".format(self.name, self.val, self.immutable)
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.val = visitor.visit(self.val)
 
 class NewNode(AST):
+    __slots__ = ("locals", "body")
+    _children = ("locals", "body")
     def __init__(self, locls: List[InitNode], body: AST) -> None:
         self.locals = locls
         self.body = body
-    def to_dafny(self) -> str:
-        locs = list_to_dafny_list([l.to_dafny() for l in self.locals])
-        return 'ENew({}, {})'.format(locs, self.body.to_dafny())
-    def to_sexp(self) -> str:
-        locs = " ".join(l.to_sexp() for l in self.locals)
-        return "(ENew (list {}) {})".format(locs, self.body.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ENew(', *_dafny_list_parts(self.locals), ', ', self.body, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(ENew (list ', *_sexp_list_parts(self.locals), ') ', self.body, ')')
     def __str__(self) -> str:
         return "<NewNode [{}] {}>".format(", ".join(str(l) for l in self.locals), self.body)
-    def visit(self, visitor: ASTTransformer) -> None:
-        new_locals = []  # type: List[InitNode]
-        for c in self.locals:
-            new = visitor.visit(c)
-            if not isinstance(new, InitNode):
-                raise Exception("NewNode expects locals to be InitNodes, got instead {}".format(new))
-            new_locals.append(new)
-        self.locals = new_locals
-        self.body = visitor.visit(self.body)
+    def _check_child(self, field: str, new: Any) -> None:
+        if field == "locals" and not isinstance(new, InitNode):
+            raise Exception("NewNode expects locals to be InitNodes, got instead {}".format(new))
 
 class MethodNode(AST):
+    __slots__ = ("name", "args", "body")
+    _children = ("args", "body")
     def __init__(self, name: str, args: List[VarNode], body: AST) -> None:
         self.name = name
         self.args = args
         self.body = body
-    def to_dafny(self) -> str:
+    def _dafny_parts(self) -> Tuple[Any, ...]:
         args = var_list_to_dafny_list([a.name for a in self.args])
-        return 'EMethod("{}", {}, {})'.format(self.name, args, self.body.to_dafny())
-    def to_sexp(self) -> str:
-        args = " ".join(a.to_sexp() for a in self.args)
-        return "(EMethod '{} (list {}) {})".format(self.name, args, self.body.to_sexp())
+        return ('EMethod("{}", {}, '.format(self.name, args), self.body, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ("(EMethod '{} (list ".format(self.name), *_sexp_list_parts(self.args), ') ', self.body, ')')
     def __str__(self) -> str:
         return "<MethodNode {} [{}] {}>".format(self.name, ", ".join("'{}'".format(a) for a in self.args), self.body)
-    def visit(self, visitor: ASTTransformer) -> None:
-        new_args = []  # type: List[VarNode]
-        for a in self.args:
-            new = visitor.visit(a)
-            if not isinstance(new, VarNode):
-                raise Exception("MethodNode expects args to be VarNodes, got instead {}".format(new))
-            new_args.append(new)
-        self.args = new_args
-        self.body = visitor.visit(self.body)
+    def _check_child(self, field: str, new: Any) -> None:
+        if field == "args" and not isinstance(new, VarNode):
+            raise Exception("MethodNode expects args to be VarNodes, got instead {}".format(new))
 
 class AssignNode(AST):
+    __slots__ = ("lhs", "rhs")
+    _children = ("lhs", "rhs")
     def __init__(self, lhs: Union[VarNode, CompoundVarNode], rhs: AST) -> None:
         self.lhs = lhs
         self.rhs = rhs
-    def to_dafny(self) -> str:
-        return 'EAssign({}, {})'.format(self.lhs.to_dafny(), self.rhs.to_dafny())
-    def to_sexp(self) -> str:
-        return "(EAssign {} {})".format(self.lhs.to_sexp(), self.rhs.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('EAssign(', self.lhs, ', ', self.rhs, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(EAssign ', self.lhs, ' ', self.rhs, ')')
     def __str__(self) -> str:
         return "<AssignNode {} {}>".format(self.lhs, self.rhs)
-    def visit(self, visitor: ASTTransformer) -> None:
-        new_lhs = visitor.visit(self.lhs)
-        if not isinstance(new_lhs, VarNode) and not isinstance(new_lhs, CompoundVarNode):
-            raise Exception("AssignNode expects LHS to be VarNode or CompoundVarNode, got instead {}".format(new_lhs))
-        self.lhs = new_lhs
-        self.rhs = visitor.visit(self.rhs)
+    def _check_child(self, field: str, new: Any) -> None:
+        if field == "lhs" and not isinstance(new, VarNode) and not isinstance(new, CompoundVarNode):
+            raise Exception("AssignNode expects LHS to be VarNode or CompoundVarNode, got instead {}".format(new))
 
 class CallNode(AST):
+    __slots__ = ("obj", "name", "args")
+    _children = ("obj", "args")
     def __init__(self, obj: AST, name: str, args: List[AST]) -> None:
         self.obj = obj
         self.name = name
         self.args = args
-    def to_dafny(self) -> str:
-        args = list_to_dafny_list([a.to_dafny() for a in self.args])
-        return 'ECall({}, "{}", {})'.format(self.obj.to_dafny(), self.name, args)
-    def to_sexp(self) -> str:
-        args = " ".join(a.to_sexp() for a in self.args)
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ECall(', self.obj, ', "{}", '.format(self.name), *_dafny_list_parts(self.args), ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
         name = self.name.replace("|", "||")  # hack for quoting |
-        return "(ECall {} '{} (list {}))".format(self.obj.to_sexp(), name, args)
+        return ('(ECall ', self.obj, " '{} (list ".format(name), *_sexp_list_parts(self.args), '))')
     def __str__(self) -> str:
         return "<CallNode {} {} [{}]>".format(self.obj, self.name, ", ".join(str(a) for a in self.args))
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.obj = visitor.visit(self.obj)
-        self.args = [visitor.visit(c) for c in self.args]
 
 class ITENode(AST):
+    __slots__ = ("cond", "then", "els")
+    _children = ("cond", "then", "els")
     def __init__(self, cond: AST, then: AST, els: AST) -> None:
         self.cond = cond
         self.then = then
         self.els = els
-    def to_dafny(self) -> str:
-        return 'EITE({}, {}, {})'.format(self.cond.to_dafny(), self.then.to_dafny(), self.els.to_dafny())
-    def to_sexp(self) -> str:
-        return "(EITE {} {} {})".format(self.cond.to_sexp(), self.then.to_sexp(), self.els.to_sexp())
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('EITE(', self.cond, ', ', self.then, ', ', self.els, ')')
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ('(EITE ', self.cond, ' ', self.then, ' ', self.els, ')')
     def __str__(self) -> str:
         return "<ITENode {} {} {}>".format(self.cond, self.then, self.els)
-    def visit(self, visitor: ASTTransformer) -> None:
-        self.cond = visitor.visit(self.cond)
-        self.then = visitor.visit(self.then)
-        self.els = visitor.visit(self.els)
 
 class NopNode(AST):
+    __slots__ = ()
+    _children = ()
     def __init__(self) -> None:
         pass
-    def to_dafny(self) -> str:
-        return 'ENop()'
-    def to_sexp(self) -> str:
-        return "(ENop)"
+    def _dafny_parts(self) -> Tuple[Any, ...]:
+        return ('ENop()',)
+    def _sexp_parts(self) -> Tuple[Any, ...]:
+        return ("(ENop)",)
     def __str__(self) -> str:
         return "<NopNode>"
-    def visit(self, visitor: ASTTransformer) -> None:
-        pass
 
 
 ConstNil = ConstNode(NilNode())
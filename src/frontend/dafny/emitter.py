@@ -12,11 +12,11 @@
 # permissions and limitations under the License.
 
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from ..ast import *
 from ..emitter import *
 from ..proof import *
-from ..analysis import GatherObjectInfo
 
 from . import template
 
@@ -26,9 +26,9 @@ DAFNY_BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..
 
 
 class DafnyEmitter(Emitter):
-    def __init__(self, includes: List[str]=[]) -> None:
+    def __init__(self, includes: List[str]=[], out: Optional[Any]=None) -> None:
+        super().__init__(out)
         self.includes = [os.path.join(DAFNY_BACKEND_ROOT, i) for i in DAFNY_INCLUDES]
-        self.bodies = []  # type: List[str]
         self.to_run = []  # type: List[str]
         self.id = IDGen()
         self.current_type = None  # type: Optional[str]
@@ -70,17 +70,16 @@ class DafnyEmitter(Emitter):
     
     def end(self, run=False) -> str:
         assert self.current_type is not None
-        body = "\n".join("  {}".format(l) for l in self.current_body.getLines())
-        annot = "\n".join("  {}".format(l) for l in self.current_annotation.getLines())
-        if annot != "":
-            annot += "\n"
         arglist = ", ".join("{}: {}".format(n, t) for n, t in self.current_args)
         ret = ": {}".format(self.current_ret) if self.current_ret is not None else ""
-        text = "{typ} {name}({args}){ret}\n{annot}{{\n{body}\n}}".format(
-            typ=self.current_type, name=self.current_name, args=arglist,
-            ret=ret, annot=annot, body=body
-        )
-        self.bodies.append(text)
+        self.write_definition("{typ} {name}({args}){ret}\n".format(
+            typ=self.current_type, name=self.current_name, args=arglist, ret=ret))
+        if self.current_annotation.getLines():
+            self.current_annotation.write(self, "  ")
+            self.write("\n")
+        self.write("{\n")
+        self.current_body.write(self, "  ")
+        self.write("\n}")
         if run:
             if self.current_args == []:
                 self.to_run.append(self.current_name)
@@ -98,21 +97,23 @@ class DafnyEmitter(Emitter):
         assert self.current_type is not None
         for l in lines:
             self.current_annotation.emit(l)
-    def emit_directly(self, text: str, name: Optional[str]=None) -> None:
-        self.bodies.append(text)
+    def emit_directly(self, text: Any, name: Optional[str]=None) -> None:
+        self.write_definition(text)
         if name is not None:
             self.to_run.append(name)
 
 
-    def to_program(self) -> str:
+    def prelude(self) -> str:
+        return "\n".join('include "{}"'.format(i.replace("\\", "\\\\")) for i in self.includes)
+
+    def write_trailer(self) -> None:
         self.start_method("Main", verbatim=True)
         for name in self.to_run:
             self.emit("{}();".format(name))
         self.end()
 
-        prelude = "\n".join('include "{}"'.format(i.replace("\\", "\\\\")) for i in self.includes)
-        program = "\n\n".join([prelude] + self.bodies)
-        return program
+    def write_term(self, node: AST) -> None:
+        node.write_dafny(self.out)
 
 
     def emit_AssertionProof(self, prf: AssertionProof) -> None:
@@ -122,28 +123,25 @@ class DafnyEmitter(Emitter):
         cond = self.id.fresh("cond")
         self.start_method("assertion")
         self.emit(
-            "var {} := {};".format(prog, prf.program.to_dafny()),
+            Code("var {} := {};", prog, prf.program),
             "var (_, {}) := Eval({}, EmptyContext(), FUEL);".format(ctx, prog),
-            "var {} := {};".format(cond, prf.condition.to_dafny()),
+            Code("var {} := {};", cond, prf.condition),
             "var {} := Eval({}, {}, FUEL).0;".format(ret, cond, ctx),
             "assert {} == Int(1);".format(ret))
         self.end(True)
     
     def emit_EquivalenceProof(self, prf: EquivalenceProof) -> None:
-        # first, gather the methods from the AST
-        v = GatherObjectInfo()
-        v.visit(prf.context)
-        v.visit(prf.lhs)
-        v.visit(prf.rhs)
+        # first, look up the methods of both sides
+        v = prf.objects
         lhs_methods = v.get_methods(prf.lhs)
         rhs_methods = v.get_methods(prf.rhs)
 
         proof_name = self.id.fresh("equivalent")
 
         # the common stuff
-        prefix = prf.context.to_dafny()
-        lhs = prf.lhs.to_dafny()
-        rhs = prf.rhs.to_dafny()
+        prefix = prf.context
+        lhs = prf.lhs
+        rhs = prf.rhs
         invs = self.emit_invariants(prf.invs)
 
         # build a single invariant that conjoins all invariants together
@@ -159,6 +157,9 @@ class DafnyEmitter(Emitter):
 
         # generate a new lemma for each method
         lemmas = []  # type: List[str]
+        # methods identical on both sides need no proof, so their lemmas
+        # are assumed rather than verified
+        unchanged = set(prf.unchanged_methods())
         if lhs_methods is not None and rhs_methods is not None:
             common_methods = {}  # type: Dict[str, MethodNode]
             for n, m in lhs_methods.items():
@@ -174,9 +175,11 @@ class DafnyEmitter(Emitter):
                 arg_bindings = list_to_dafny_list([v for v, _ in lemma_args])
                 # generate the lemma
                 tmpl = template.equivalence.get("method_proof")
-                text = tmpl.substitute(
+                text = template.substitute_pieces(tmpl,
                     proof=lemma_name, method=name, prefix=prefix, lhs=lhs, rhs=rhs, cons_args=arg_bindings,
-                    args=arg_list, invariant=inv, body=prf.verbatim)
+                    args=arg_list, invariant=inv, body=prf.verbatim,
+                    note=" (unchanged, not verified)" if name in unchanged else "",
+                    attrs="{:verify false} " if name in unchanged else "")
                 self.emit_directly(text)
 
                 # generate the lemma invocation
@@ -190,7 +193,7 @@ class DafnyEmitter(Emitter):
         # generate the final proof
         body = "\n".join(lemmas)
         tmpl = template.equivalence.get("equivalence_proof")
-        text = tmpl.substitute(
+        text = template.substitute_pieces(tmpl,
             proof=proof_name, prefix=prefix, lhs=lhs, rhs=rhs, invariant=inv, body=body
         )
         self.emit_directly(text, proof_name)
@@ -198,13 +201,13 @@ class DafnyEmitter(Emitter):
 
     def emit_AdmitProof(self, prf: AdmitProof) -> None:
         self.start_method("admitted")
-        lhs_prog = SeqNode(prf.context, prf.lhs)
-        rhs_prog = SeqNode(prf.context, prf.rhs)
+        lhs_prog = block([prf.context, prf.lhs])
+        rhs_prog = block([prf.context, prf.rhs])
         lhs = self.id.fresh("lhs")
         rhs = self.id.fresh("rhs")
         self.emit(
-            "var {} := {};".format(lhs, lhs_prog.to_dafny()),
-            "var {} := {};".format(rhs, rhs_prog.to_dafny()),
+            Code("var {} := {};", lhs, lhs_prog),
+            Code("var {} := {};", rhs, rhs_prog),
             "// this goal is admitted",
             "assert true;")
         self.end(True)
@@ -216,13 +219,16 @@ class DafnyEmitter(Emitter):
         rhs = self.id.fresh("rhs")
         assumptions = self.id.fresh("assumptions")
         all_assumptions = prf.assumptions + [(r,l) for l,r in prf.assumptions]
-        assumptions_list = "[" + ", ".join(["({}, {})".format(l.to_dafny(), r.to_dafny()) for l, r in all_assumptions]) + "]"
+        assumptions_list = ["["]  # type: List[Any]
+        for i, (l, r) in enumerate(all_assumptions):
+            assumptions_list.append(Code(", ({}, {})" if i > 0 else "({}, {})", l, r))
+        assumptions_list.append("]")
         self.emit(
-            "var {} := {};".format(ctx, prf.context.to_dafny()),
-            "var {} := {};".format(lhs, prf.lhs.to_dafny()),
-            "var {} := {};".format(rhs, prf.rhs.to_dafny()),
-            "var {} := {};".format(assumptions, assumptions_list),
-            "assert ValidRewrite({}, {}, {}, {}, {}, {});".format(ctx, lhs, rhs, prf.e1.to_dafny(), prf.e2.to_dafny(), assumptions))
+            Code("var {} := {};", ctx, prf.context),
+            Code("var {} := {};", lhs, prf.lhs),
+            Code("var {} := {};", rhs, prf.rhs),
+            Code("var {} := {};", assumptions, assumptions_list),
+            Code("assert ValidRewrite({}, {}, {}, {}, {}, {});", ctx, lhs, rhs, prf.e1, prf.e2, assumptions))
         self.end(True)
 
     def emit_RunProof(self, prf: RunProof) -> None:
@@ -243,7 +249,7 @@ class DafnyEmitter(Emitter):
             ret = self.id.fresh("ret")
             newctx = self.id.fresh("ctx")
             self.emit(
-                "var {} := {};".format(expr, t.to_dafny()),
+                Code("var {} := {};", expr, t),
                 "var ({}, {}) := Eval({}, {}, FUEL);".format(ret, newctx, expr, ctx),
                 'Reflect_Expr({}); print " ==> "; Reflect_Value({}); print "\\n";'.format(expr, ret))
             ctx = newctx
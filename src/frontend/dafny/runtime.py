@@ -14,55 +14,104 @@
 import hashlib
 import os
 import subprocess
-import sys
 import tempfile
-from typing import Tuple
+from typing import Any, Optional, Tuple
 
 from ..ast import *
+from ..diskcache import default_cache_dir
 from ..runtime import Runtime
 from ..program import Program
-from .emitter import DafnyEmitter
+from ..python.interpreter import DAFNY
+from .emitter import DAFNY_BACKEND_ROOT, DAFNY_INCLUDES, DafnyEmitter
 
 
+# Dafny only verifies the program it is given, not the files it includes
+# (unless asked to with /verifyAllModules), so the library every emitted
+# program includes can be verified on its own with verify_library. That
+# takes as long as a large proof, so it is done once per version of the
+# library and of Dafny, and recorded by a stamp file in stamp_dir (the cache
+# directory unless set).
 class DafnyRuntime(Runtime):
+    suffix = ".dfy"
+    library = DAFNY_BACKEND_ROOT
+    semantics = DAFNY
+    # as in Call.dfy
+    fuel = 10
+    stamp_dir = None  # type: Optional[str]
+
     def __init__(self, prog: Program) -> None:
         super(DafnyRuntime, self).__init__()
-        self.emitter = DafnyEmitter()
         self.prog = prog
 
-    def compile(self, evaluate=False) -> None:
+    # with split, emit each obligation into a program of its own (see
+    # run_units) rather than all of them into one
+    def compile(self, evaluate=False, split=False) -> None:
         if evaluate:
-            proofs = self.prog.generate_evaluate_obligations()
+            proofs = self.prog.iter_evaluate_obligations()
         else:
-            proofs = self.prog.generate_proof_obligations()
+            proofs = self.proof_obligations()
 
-        for p in proofs:
-            self.emitter.emit_proof(p)
+        if split:
+            self.emit_units(proofs)
+        else:
+            self.emit_program(proofs)
 
-    def run(self, verbose=False) -> Tuple[bool, str, str]:
-        tmpl = self.emitter.to_program()
+    def new_emitter(self, out: Optional[Any]=None) -> DafnyEmitter:
+        return DafnyEmitter(out=out)
 
-        if self.output_path is None:
-            f = tempfile.NamedTemporaryFile(mode="w", suffix=".dfy", delete=False)
-            fname = f.name
-        else:
-            fname = os.path.realpath("test-%s.dfy" % (hashlib.md5(tmpl.encode()).hexdigest()[:8]))
-            fname = os.path.join(self.output_path, fname)
-            f = open(fname, "w")
-        
-        f.write(tmpl)
-        f.close()
-
-        binary = self._find_executable("dafny")
-        stdout = None if verbose else subprocess.PIPE
-        stderr = None if verbose else subprocess.PIPE
-        proc = subprocess.Popen(binary + " /compile:3 /induction:1 " + fname,
-                    stdout=stdout, stderr=stderr, shell=True, universal_newlines=True)
-
-        out, err = proc.communicate()
-        success = proc.returncode == 0
-
-        if success and not verbose and "Running..." in out:
+    def executable(self) -> str:
+        return self._find_executable("dafny")
+
+    def version_command(self) -> str:
+        return self.executable() + " /version"
+
+    def command(self, fname: str) -> str:
+        return self.executable() + " /compile:3 /induction:1 " + fname
+
+    # the shell command to verify the library on its own
+    def library_command(self) -> str:
+        files = " ".join('"{}"'.format(os.path.join(self.library, i)) for i in DAFNY_INCLUDES)
+        return self.executable() + " /compile:0 /verifyAllModules " + files
+
+    # The stamp file recording that this version of the library was verified
+    # by this Dafny: named after the library's files, the command, and what
+    # Dafny reports as its version (as verdict_cache.backend_id does)
+    def library_stamp(self) -> str:
+        h = hashlib.sha256()
+        for name in sorted(os.listdir(self.library)):
+            h.update(name.encode())
+            with open(os.path.join(self.library, name), "rb") as f:
+                h.update(f.read())
+        h.update(self.library_command().encode())
+        version = subprocess.run(self.version_command(), shell=True, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, universal_newlines=True)
+        h.update(version.stdout.encode())
+        return os.path.join(self.stamp_dir or default_cache_dir(), "dafny-library-{}.ok".format(h.hexdigest()[:16]))
+
+    # Verify the library, unless its stamp says it was already, returning the
+    # success and output of doing so
+    def verify_library(self) -> Tuple[bool, str]:
+        stamp = self.library_stamp()
+        if os.path.exists(stamp):
+            return True, ""
+        proc = subprocess.run(self.library_command(), shell=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True)
+        if proc.returncode == 0:
+            # written whole, as another run may be checking it
+            os.makedirs(os.path.dirname(stamp), exist_ok=True)
+            with tempfile.NamedTemporaryFile(mode="w", dir=os.path.dirname(stamp), delete=False) as f:
+                f.write(self.library_command() + "\n")
+            os.replace(f.name, stamp)
+        return proc.returncode == 0, proc.stdout
+
+    def output(self, success: bool, out: str, err: str) -> str:
+        if success and "Running..." in out:
             out = out.split("Running...")[1].strip()
-        
-        return success, "" if verbose else (out + err), fname
+        return out + err
+
+    def run(self, verbose=False) -> Tuple[bool, str, str]:
+        fname = self.finish_program()
+        success, out = self.check_file(fname, verbose)
+        if success:
+            self.cache_verified()
+        return success, out, fname
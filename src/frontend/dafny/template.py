@@ -15,7 +15,7 @@ import collections
 import os
 import re
 from string import Template as Snippet
-from typing import Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set
 
 
 class Template(object):
@@ -57,4 +57,24 @@ class Template(object):
             raise Exception("unknown snippet {}".format(k))
         return self.snippets[k]
 
+
+# Substitute values into a snippet, returning the pieces of the result: the
+# snippet's text and the values themselves, which may be AST nodes to be
+# serialized straight into an emitter's output.
+def substitute_pieces(snip: Snippet, **values: Any) -> List[Any]:
+    pieces = []  # type: List[Any]
+    pos = 0
+    for m in snip.pattern.finditer(snip.template):
+        pieces.append(snip.template[pos:m.start()])
+        name = m.group("named") or m.group("braced")
+        if name is not None:
+            pieces.append(values[name])
+        elif m.group("escaped") is not None:
+            pieces.append(snip.delimiter)
+        else:
+            raise ValueError("invalid placeholder in snippet")
+        pos = m.end()
+    pieces.append(snip.template[pos:])
+    return pieces
+
 equivalence = Template("equivalence_template.dfy")
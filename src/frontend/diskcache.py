@@ -0,0 +1,105 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Where on-disk caches live unless the user says otherwise
+def default_cache_dir() -> str:
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "quivela")
+
+
+# A persistent key-value store of bytes with a cap on its total size (keys
+# included, so even empty values count).
+# When the cap is exceeded, the least recently used entries are evicted.
+# Entries live in a single SQLite database, so concurrent readers and writers
+# (in this or other processes) always see whole entries.
+class DiskCache(object):
+    def __init__(self, path: str, max_bytes: int) -> None:
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    # Look up several keys at once, marking the ones found as recently used
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        found = {}  # type: Dict[str, bytes]
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for k in keys:
+                    row = self.db.execute("SELECT value FROM entries WHERE key = ?", (k,)).fetchone()
+                    if row is not None:
+                        found[k] = bytes(row[0])
+                        self.db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, k))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return found
+
+    def put(self, key: str, value: bytes) -> None:
+        self.put_many([(key, value)])
+
+    # Store several entries at once, then evict entries until under the size cap
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for k, v in items:
+                    self.db.execute("INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)",
+                                    (k, sqlite3.Binary(v), len(k) + len(v), now))
+                self._trim()
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def _trim(self) -> None:
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []  # type: List[str]
+        for k, size in self.db.execute("SELECT key, size FROM entries ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            evict.append(k)
+            total -= size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in evict])
+
+    # Return the number of entries and their total size in bytes
+    def usage(self) -> Tuple[int, int]:
+        with self.lock:
+            row = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return row[0], row[1]
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -11,12 +11,70 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
+import io
+import string
 from collections import defaultdict
-from typing import List, Tuple
+from typing import Any, List, Optional, Tuple
 
+from .ast import AST
 from .proof import Proof, Invariant
 
+# Emitters write the program they generate straight to a sink (any object
+# with a write method, such as a buffered file), one top-level definition at a
+# time, rather than building it as a string. A definition is written as a
+# sequence of pieces: strings, AST nodes (which are serialized straight into
+# the sink), Code, or lists of pieces.
 class Emitter(object):
+    def __init__(self, out: Optional[Any]=None) -> None:
+        self.out = out if out is not None else io.StringIO()
+        self.started = False
+
+    # the text the program starts with
+    def prelude(self) -> str:
+        raise NotImplementedError()
+    # write the end of the program, after every definition
+    def write_trailer(self) -> None:
+        raise NotImplementedError()
+    # write the serialization of an AST node to the sink
+    def write_term(self, node: AST) -> None:
+        raise NotImplementedError()
+
+    def write(self, *pieces: Any) -> None:
+        for p in pieces:
+            if isinstance(p, str):
+                self.out.write(p)
+            elif isinstance(p, AST):
+                self.write_term(p)
+            elif isinstance(p, list):
+                self.write(*p)
+            elif isinstance(p, Code):
+                p.write(self)
+            else:
+                self.out.write(str(p))
+
+    # write a top-level definition, separated from the last by a blank line
+    def write_definition(self, *pieces: Any) -> None:
+        self.start()
+        self.write("\n\n", *pieces)
+
+    # write the prelude, if it hasn't been yet
+    def start(self) -> None:
+        if not self.started:
+            self.started = True
+            self.write(self.prelude())
+
+    # write the rest of the program to the sink
+    def finish(self) -> None:
+        self.start()
+        self.write_trailer()
+
+    # finish the program and return it, if the sink is the default one
+    def to_program(self) -> str:
+        if not isinstance(self.out, io.StringIO):
+            raise Exception("emitter is writing to {}, not a string".format(self.out))
+        self.finish()
+        return self.out.getvalue()
+
     def emit_proof(self, prf: Proof) -> None:
         mro = type(prf).mro()
         for cls in mro:
@@ -36,6 +94,21 @@ class Emitter(object):
                 return meth(inv)
         raise NotImplementedError("no matching emitter for {}".format(inv))
 
+# A piece of code formatted lazily: each {} in fmt is replaced by the next of
+# args, which may be an AST node to serialize straight into the sink.
+class Code(object):
+    _formatter = string.Formatter()
+    def __init__(self, fmt: str, *args: Any) -> None:
+        self.fmt = fmt
+        self.args = args
+    def write(self, emitter: Emitter) -> None:
+        args = iter(self.args)
+        for text, field, _, _ in self._formatter.parse(self.fmt):
+            emitter.write(text)
+            if field is not None:
+                emitter.write(next(args))
+
+# The lines of a definition, each a piece of code to write to the sink
 class LineEmitter(object):
     def __init__(self):
         self.lines = []
@@ -48,6 +121,10 @@ class LineEmitter(object):
         self.lines.append("*/")
     def getLines(self):
         return self.lines
+    # write the lines, each with the given indent, separated by newlines
+    def write(self, emitter: Emitter, indent: str) -> None:
+        for i, line in enumerate(self.lines):
+            emitter.write("\n" + indent if i > 0 else indent, line)
 
 class IDGen(object):
     def __init__(self):
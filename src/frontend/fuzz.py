@@ -0,0 +1,181 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ast import *
+from .proof import EquivalenceProof, Proof
+from .python.interpreter import FUEL, ROSETTE, Adversary, AdversaryReplay, Context, ErrorValue, Interpreter, MapValue, Ref, TupleValue, expr_to_string, value_to_string
+
+# Most failed proof steps are plainly not equivalent, and the backend takes
+# far longer to say so than it takes to find out by running both sides. So
+# before the backend checks an equivalence proof, the fuzzer builds the two
+# objects with the reference interpreter, and calls their common methods on
+# both, one call at a time, in short random sequences of calls with the same
+# random arguments. If a call returns different values on the two sides, the
+# sequence of calls up to it tells them apart, so the step is false whatever
+# the invariant, and the backend needn't check it. On tests/proofs and
+# proofs/etm.sbl, a budget of 1000 calls takes about 30 ms per step, and
+# each broken step there is found within the first millisecond or so.
+#
+# Arguments and adversaries' answers are drawn from the values the Rosette
+# backend's symbolic ones (??Value in value.rkt) can take, which are never
+# nil: integers, errors, and tuples of them, and the values earlier calls
+# returned. As in adversary.rkt, the RHS's adversaries replay the LHS's
+# answers for as long as the RHS makes the same calls to them. A call that
+# returns a reference is never counted as telling the sides apart, since the
+# two sides may allocate objects in different orders, and nor is anything
+# after it. Proofs whose context or sides the interpreter can't run aren't
+# fuzzed.
+#
+# The interpreter follows the semantics of the backend that would check the
+# proof (see python/interpreter.py), and evaluates with the same fuel, since a
+# step may hold in one backend and not the other: (x / 2) * 2 is x in
+# eval.rkt, which divides exactly, but not in Lang.dfy, and a call that runs
+# out of fuel in Dafny may return a value in Rosette.
+
+# the number of calls in each sequence
+SEQUENCE_LENGTH = 8
+# the values adversaries answer with (as ??Value 0 0 does), and the
+# arguments to draw from, besides values earlier calls returned
+_ANSWERS = [IntNode(i) for i in (-1, 0, 1, 2, 3)] + [ErrorValue("", False)]
+
+
+# Copies of the contexts of the two sides of a proof, with copies of the
+# LHS's adversaries, and the RHS's replaying those (copy-all-adversaries)
+def _copy_sides(lctx: Context, rctx: Context) -> Tuple[Context, Context]:
+    lctx, rctx = lctx.copy(), rctx.copy()
+    copies = {}  # type: Dict[int, Adversary]
+    for addr, methods in lctx.methods.items():
+        if isinstance(methods, Adversary):
+            lctx.methods[addr] = copies[id(methods)] = methods.copy()
+    for addr, methods in rctx.methods.items():
+        if isinstance(methods, AdversaryReplay):
+            rctx.methods[addr] = AdversaryReplay(copies[id(methods.adversary)], methods.idx)
+    return lctx, rctx
+
+
+# whether a value is or holds a reference (or, with nil, a nil)
+def _has_ref(v: Any, nil: bool = False) -> bool:
+    if isinstance(v, Ref) or (nil and isinstance(v, NilNode)):
+        return True
+    if isinstance(v, TupleValue):
+        return any(_has_ref(x, nil) for x in v.elts)
+    if isinstance(v, MapValue):
+        return any(_has_ref(k, nil) or _has_ref(x, nil) for k, x in v.vals.items())
+    return False
+
+
+# A sequence of method calls, the last of which returned different values
+# on the two sides of a proof
+class Counterexample(object):
+    def __init__(self, prf: EquivalenceProof, calls: List[Tuple[str, List[Any], Any]], lhs_ret: Any, rhs_ret: Any) -> None:
+        self.prf = prf
+        self.calls = calls
+        self.lhs_ret = lhs_ret
+        self.rhs_ret = rhs_ret
+    def __str__(self) -> str:
+        lines = ["FAILED (found by fuzzing):",
+                 "  " + expr_to_string(self.prf.lhs), "~", "  " + expr_to_string(self.prf.rhs),
+                 "these method calls tell the two sides apart:"]
+        for i, (name, args, ret) in enumerate(self.calls):
+            call = "{}({})".format(name, ", ".join(value_to_string(a) for a in args))
+            if i + 1 < len(self.calls):
+                lines.append("* {} returns {} on both sides".format(call, value_to_string(ret)))
+            else:
+                lines.append("* {}: LHS returns {}, RHS returns {}".format(
+                    call, value_to_string(self.lhs_ret), value_to_string(self.rhs_ret)))
+        return "\n".join(lines)
+
+
+class Fuzzer(object):
+    # budget is the number of method calls to try on each proof, and backend
+    # and fuel the semantics and fuel to run them with
+    def __init__(self, budget: int, seed: int = 0, backend: str = ROSETTE, fuel: int = FUEL) -> None:
+        self.budget = budget
+        self.seed = seed
+        self.backend = backend
+        self.fuel = fuel
+
+    # Return a Counterexample to prf, if it is an equivalence proof and the
+    # fuzzer finds one, or else None
+    def counterexample(self, prf: Proof) -> Optional[Counterexample]:
+        if not isinstance(prf, EquivalenceProof) or self.budget <= 0:
+            return None
+        try:
+            return self._fuzz(prf)
+        except Exception:
+            # something the interpreter can't run, which the backend can
+            return None
+
+    # the context and object address of each side of prf, and the methods
+    # common to both, or None if a side isn't an object
+    def _objects(self, prf: EquivalenceProof, rng: random.Random) -> Optional[Tuple[List[Tuple[Context, int]], List[str]]]:
+        choose = lambda: rng.choice(_ANSWERS)
+        interp = Interpreter(adversary=lambda: Adversary(choose), backend=self.backend)
+        interp.eval(prf.context, self.fuel)
+        lctx, rctx = interp.ctx.copy(), interp.ctx.copy()
+        for addr, methods in interp.ctx.methods.items():
+            if isinstance(methods, Adversary):
+                lctx.methods[addr] = methods.copy()
+                rctx.methods[addr] = AdversaryReplay(lctx.methods[addr], len(methods.history))
+        sides = []  # type: List[Tuple[Context, int]]
+        for side, ctx in ((prf.lhs, lctx), (prf.rhs, rctx)):
+            interp = Interpreter(ctx, adversary=lambda: Adversary(choose), backend=self.backend)
+            ret = interp.eval(side, self.fuel)
+            if not isinstance(ret, Ref) or not isinstance(ctx.methods.get(ret.addr), dict):
+                return None
+            sides.append((ctx, ret.addr))
+        lmethods, rmethods = lctx.methods[sides[0][1]], rctx.methods[sides[1][1]]
+        common = [n for n, m in lmethods.items() if n in rmethods and len(m.args) == len(rmethods[n].args)]
+        return sides, common
+
+    def _fuzz(self, prf: EquivalenceProof) -> Optional[Counterexample]:
+        rng = random.Random(self.seed)
+        objects = self._objects(prf, rng)
+        if objects is None or not objects[1]:
+            return None
+        sides, common = objects
+        (lctx, laddr), (rctx, raddr) = sides
+        arity = {n: len(lctx.methods[laddr][n].args) for n in common}
+        calls = 0
+        while calls < self.budget:
+            # a sequence of calls, from the objects as the sides built them
+            lcopy, rcopy = _copy_sides(lctx, rctx)
+            interps = [(Interpreter(lcopy, backend=self.backend), laddr), (Interpreter(rcopy, backend=self.backend), raddr)]
+            pool = list(_ANSWERS)
+            trace = []  # type: List[Tuple[str, List[Any], Any]]
+            for _ in range(min(SEQUENCE_LENGTH, self.budget - calls)):
+                calls += 1
+                name = rng.choice(common)
+                args = [self._argument(rng, pool) for _ in range(arity[name])]
+                rets = []
+                for interp, addr in interps:
+                    mtd = interp.ctx.methods[addr][name]
+                    scope = {a.name: v for a, v in zip(mtd.args, args)}  # type: Dict[str, Any]
+                    rets.append(interp.call_with_scope(mtd.body, scope, addr, self.fuel))
+                if _has_ref(rets[0]) or _has_ref(rets[1]):
+                    break
+                trace.append((name, args, rets[0]))
+                if rets[0] != rets[1]:
+                    return Counterexample(prf, trace, rets[0], rets[1])
+                if not _has_ref(rets[0], nil=True) and rets[0] not in pool:
+                    pool.append(rets[0])
+        return None
+
+    # a random argument: one of the pool's values, or now and then a pair of them
+    def _argument(self, rng: random.Random, pool: List[Any]) -> Any:
+        if rng.random() < 0.1:
+            return TupleValue([rng.choice(pool), rng.choice(pool)])
+        return rng.choice(pool)
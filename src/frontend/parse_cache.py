@@ -0,0 +1,121 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import hashlib
+import io
+import os
+import pickle
+from typing import Dict, Iterator, List, Optional
+
+from .ast import *
+from .diskcache import DiskCache, default_cache_dir
+from .parser import get_parser, string_to_ast
+from .statements import split_statements
+from . import parser_table
+
+
+DEFAULT_PARSE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+# Anything that changes how source text is turned into ASTs must invalidate
+# the cache: the grammar (in the generated parse tables), the parser actions
+# and lowering, and the AST classes themselves.
+def _frontend_version() -> str:
+    h = hashlib.sha256()
+    h.update(parser_table._lr_signature.encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ("parser_table.py", "parser.py", "ast.py"):
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+# ConstNil is compared by identity throughout the frontend,
+# so it must survive a round trip through the cache as the same object
+class _ASTPickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        return "ConstNil" if obj is ConstNil else None
+
+class _ASTUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid == "ConstNil":
+            return ConstNil
+        raise pickle.UnpicklingError("unknown persistent id {}".format(pid))
+
+
+# An on-disk cache of the parsed top-level statements of programs, keyed by
+# the hash of each statement's source text. Parsing a program through the
+# cache only parses statements that have not been seen before, and returns
+# exactly the same AST as parsing it from scratch.
+class ParseCache(object):
+    def __init__(self, path: Optional[str]=None, max_bytes: int=DEFAULT_PARSE_CACHE_BYTES) -> None:
+        if path is None:
+            path = default_cache_dir()
+        self.store = DiskCache(os.path.join(path, "parse.sqlite"), max_bytes)
+        self.version = _frontend_version()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, chunk: str) -> str:
+        h = hashlib.sha256(self.version.encode())
+        h.update(chunk.encode())
+        return h.hexdigest()
+
+    # Return an "AST" of type TopLevelNode
+    def string_to_ast(self, s: str) -> TopLevelNode:
+        chunks = split_statements(s)
+        if chunks is None:
+            return string_to_ast(s)
+        children = []  # type: List[AST]
+        try:
+            for stmts in self.parse_chunks(chunks):
+                children.extend(stmts)
+        except Exception:
+            # report errors (and their positions) exactly as a full parse would
+            return string_to_ast(s)
+        return TopLevelNode(children)
+
+    # Parse chunks of source text (from split_statements) one at a time,
+    # yielding the statements of each. Raises if a chunk does not parse.
+    def parse_chunks(self, chunks: List[str]) -> Iterator[List[AST]]:
+        keys = [self._key(c) for c in chunks]
+        cached = self.store.get_many(set(keys))
+        new_entries = {}  # type: Dict[str, bytes]
+        parser = get_parser()
+        try:
+            for chunk, key in zip(chunks, keys):
+                if key in cached:
+                    self.hits += 1
+                    yield _ASTUnpickler(io.BytesIO(cached[key])).load()
+                    continue
+                stmts = parser.string_to_ast(chunk).children
+                self.misses += 1
+                if key not in new_entries:
+                    data = self._dumps(stmts)
+                    if data is not None:
+                        new_entries[key] = data
+                yield stmts
+        finally:
+            if new_entries:
+                self.store.put_many(new_entries.items())
+
+    def _dumps(self, stmts: List[AST]) -> Optional[bytes]:
+        buf = io.BytesIO()
+        try:
+            _ASTPickler(buf, pickle.HIGHEST_PROTOCOL).dump(stmts)
+        except RecursionError:
+            return None  # too deep to pickle; just parse it every time
+        return buf.getvalue()
+
+    def close(self) -> None:
+        self.store.close()
@@ -12,6 +12,10 @@
 # permissions and limitations under the License.
 
 from collections import namedtuple
+import copy
+import sys
+import threading
+from typing import Any, List, Optional, Tuple
 
 import ply.lex as lex
 import ply.yacc as yacc
@@ -89,7 +93,7 @@ def t_newline(t):
 
 
 def find_column(token):
-    last_cr = lexer.lexdata.rfind("\n", 0, token.lexpos)
+    last_cr = token.lexer.lexdata.rfind("\n", 0, token.lexpos)
     if last_cr < 0:
         last_cr = 0
     column = token.lexpos - last_cr + 1
@@ -101,11 +105,9 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-lexer = lex.lex()
-
-
 # for testing only
 def lex_string(s):
+    lexer = get_parser().lexer
     lexer.input(s)
     tokens = []
     t = lexer.token()
@@ -128,8 +130,14 @@ precedence = [
 ]
 
 
+# List-building actions must append in place rather than concatenating, or
+# long files take quadratic time. Right-recursive rules reduce their last
+# element first, so they accumulate in reverse and are flipped once by the
+# rule that consumes them.
+
 def p_toplevel(p):
     """toplevel : toplevel_expression_list"""
+    p[1].reverse()
     p[0] = ('toplevel', p[1])
 
 def p_toplevel_expression_list(p):
@@ -138,10 +146,12 @@ def p_toplevel_expression_list(p):
                                 | """
     if len(p) == 3:
         assert isinstance(p[2], list)
-        p[0] = [p[1]] + p[2]
+        p[2].append(p[1])
+        p[0] = p[2]
     elif len(p) == 4:
         assert isinstance(p[3], list)
-        p[0] = [p[1]] + p[3]
+        p[3].append(p[1])
+        p[0] = p[3]
     else:
         p[0] = []
 
@@ -155,10 +165,12 @@ def p_expression_list(p):
                        | """
     if (len(p) == 3 and p[2] != ";") or (len(p) == 4 and p[3] == ";"):
         assert isinstance(p[1], list)
-        p[0] = p[1] + [p[2]]
+        p[1].append(p[2])
+        p[0] = p[1]
     elif (len(p) == 4 and p[3] != ";") or (len(p) == 5 and p[4] == ";"):
         assert isinstance(p[1], list)
-        p[0] = p[1] + [p[3]]
+        p[1].append(p[3])
+        p[0] = p[1]
     elif len(p) == 2 or (len(p) == 3 and p[2] == ";"):
         p[0] = [p[1]]
     else:
@@ -177,11 +189,16 @@ def p_proof(p):
              | proof_term '~' '[' proof_annotation ']' proof_rest
              | proof_term '~' '[' proof_annotation ']' VERBATIM proof_rest"""
     if len(p) == 4:
-        p[0] = ('proof', [(p[1], None, "")] + p[3])
+        steps = p[3]
+        steps.append((p[1], None, ""))
     elif len(p) == 7:
-        p[0] = ('proof', [(p[1], p[4], "")] + p[6])
+        steps = p[6]
+        steps.append((p[1], p[4], ""))
     else:
-        p[0] = ('proof', [(p[1], p[4], p[6])] + p[7])
+        steps = p[7]
+        steps.append((p[1], p[4], p[6]))
+    steps.reverse()
+    p[0] = ('proof', steps)
 
 def p_proof_term(p):
     "proof_term : expression"
@@ -193,11 +210,14 @@ def p_proof_rest(p):
                   | proof_term '~' '[' proof_annotation ']' VERBATIM proof_rest
                   | proof_term"""
     if len(p) == 4:
-        p[0] = [(p[1], None, "")] + p[3]
+        p[3].append((p[1], None, ""))
+        p[0] = p[3]
     elif len(p) == 7:
-        p[0] = [(p[1], p[4], "")] + p[6]
+        p[6].append((p[1], p[4], ""))
+        p[0] = p[6]
     elif len(p) == 10:
-        p[0] = [(p[1], p[4], p[6])] + p[7]
+        p[7].append((p[1], p[4], p[6]))
+        p[0] = p[7]
     else:
         p[0] = [(p[1], None, "")]
 
@@ -382,11 +402,63 @@ def p_error(p):
         raise Exception("Syntax error (line {}, column {}): {}".format(line, col, p))
 
 
-parser = yacc.yacc(tabmodule='parser_table')
+_prototypes = None  # type: Optional[Tuple[Any, Any]]
+_prototypes_lock = threading.Lock()
+
+# Return the prototype (lexer, parser) that QuivelaParsers are copied from,
+# building them on first use so that importing this module stays cheap.
+# The parse tables are loaded from parser_table.py but never written back:
+# if the grammar has changed since they were generated, PLY rebuilds them in
+# memory (run `python -m frontend.parser` from src/ to regenerate parser_table.py).
+def _get_prototypes() -> Tuple[Any, Any]:
+    global _prototypes
+    with _prototypes_lock:
+        if _prototypes is None:
+            module = sys.modules[__name__]
+            lexer = lex.lex(module=module)
+            parser = yacc.yacc(module=module, tabmodule='parser_table', debug=False, write_tables=False)
+            _prototypes = (lexer, parser)
+        return _prototypes
+
+
+# A parser with its own lexer and parser state. PLY keeps the state of an
+# in-progress parse on the lexer and parser objects, so a single instance
+# must not be used by two threads at once; use get_parser() to get one
+# owned by the calling thread.
+class QuivelaParser(object):
+    def __init__(self) -> None:
+        # the (read-only) lexer and parse tables are shared with the prototypes
+        lexer, parser = _get_prototypes()
+        self.lexer = lexer.clone()
+        self.parser = copy.copy(parser)
+
+    # Return the raw parse tree for a program
+    def parse(self, s: str) -> Any:
+        self.lexer.lineno = 1
+        self.lexer.begin('INITIAL')
+        return self.parser.parse(s, lexer=self.lexer)
+
+    # Return an "AST" of type TopLevelNode
+    def string_to_ast(self, s: str) -> TopLevelNode:
+        pt = self.parse(s)
+        assert isinstance(pt, tuple) and pt[0] == "toplevel"
+        return parse_tree_to_ast(pt)
+
+
+_thread_parsers = threading.local()
+
+# Return the QuivelaParser owned by the calling thread, creating it if needed
+def get_parser() -> QuivelaParser:
+    p = getattr(_thread_parsers, "parser", None)
+    if p is None:
+        p = QuivelaParser()
+        _thread_parsers.parser = p
+    return p
+
 
 # for testing
 def parse_string(s):
-    return parser.parse(s)
+    return get_parser().parse(s)
 
 
 ## ASTs #######################################################################
@@ -394,32 +466,89 @@ def parse_string(s):
 
 # Return an "AST" of type TopLevelNode
 def string_to_ast(s):
-    pt = parser.parse(s)
-    assert isinstance(pt, tuple) and pt[0] == "toplevel"
-    return parse_tree_to_ast(pt)
+    return get_parser().string_to_ast(s)
 
 
+# Lower a parse tree to an AST. Parse trees for long files and method bodies
+# can nest far deeper than the Python stack allows, so rather than recursing
+# we walk the tree with an explicit work stack: each node is first expanded
+# into its sub-trees, and then rebuilt once their ASTs are on the result stack.
 def parse_tree_to_ast(pt):
-    if isinstance(pt, list):  # flatten a list into an ESeq
-        if len(pt) == 0:
-            return NopNode()
-        exprs = list(map(parse_tree_to_ast, pt))
-        e = exprs.pop()
-        while exprs:
-            e = SeqNode(exprs.pop(), e)
-        return e
+    results = []  # type: List[AST]
+    work = [(pt, None)]  # type: List[Tuple[Any, Optional[List[Any]]]]
+    while work:
+        node, children = work.pop()
+        if children is None:
+            children = _parse_tree_children(node)
+            work.append((node, children))
+            work.extend((c, None) for c in reversed(children))
+        else:
+            start = len(results) - len(children)
+            args = results[start:]
+            del results[start:]
+            results.append(_parse_tree_build(node, args))
+    assert len(results) == 1
+    return results[0]
+
+
+# Return the sub-trees of a parse tree node that must be lowered before the
+# node itself, in the order _parse_tree_build expects to receive them.
+def _parse_tree_children(pt) -> List[Any]:
+    if isinstance(pt, list):
+        return pt
     elif pt[0] == 'toplevel':
-        return TopLevelNode(list(map(parse_tree_to_ast, pt[1])))
+        return pt[1]
     elif pt[0] == 'assign':
-        lhs = parse_tree_to_ast(pt[1])
-        rhs = parse_tree_to_ast(pt[2])
-        return AssignNode(lhs, rhs)
+        return [pt[1], pt[2]]
     elif pt[0] == 'binop':
-        lhs = parse_tree_to_ast(pt[2])
-        rhs = parse_tree_to_ast(pt[3])
-        return CallNode(ConstNil, pt[1], [lhs, rhs])
+        return [pt[2], pt[3]]
     elif pt[0] == 'unop':
-        arg = parse_tree_to_ast(pt[2])
+        return [pt[2]]
+    elif pt[0] == 'tuple':
+        return pt[1]
+    elif pt[0] in ('int', 'var', 'formal'):
+        return []
+    elif pt[0] == 'call' or pt[0] == 'proof-call':
+        return pt[2]
+    elif pt[0] == 'lvalue':
+        children = [pt[1]]
+        trailer = pt[2]
+        while trailer is not None:
+            if trailer[0] == 'idx':
+                children.append(trailer[1])
+            elif trailer[0] == 'call':
+                children.extend(trailer[1])
+            trailer = trailer[2]
+        return children
+    elif pt[0] == 'new':
+        return pt[1] + [pt[2]]
+    elif pt[0] == 'local':
+        return [] if pt[2] is None else [pt[2]]
+    elif pt[0] == 'method':
+        return [pt[3]] + pt[2]
+    elif pt[0] == 'ite':
+        return [pt[1], pt[2], pt[3]]
+    elif pt[0] == 'proof':
+        return [pr[0] for pr in pt[1]] + [pr[1] for pr in pt[1] if pr[1] is not None]
+    elif pt[0] == 'assert' or pt[0] == 'assume':
+        return [pt[1]]
+    else:
+        raise Exception("unexpected parse tree node: {}".format(pt))
+
+
+# Build the AST for a parse tree node, given the ASTs of the sub-trees
+# returned by _parse_tree_children.
+def _parse_tree_build(pt, args: List[AST]) -> AST:
+    if isinstance(pt, list):  # flatten a list into an EBlock
+        return block(args)
+    elif pt[0] == 'toplevel':
+        return TopLevelNode(args)
+    elif pt[0] == 'assign':
+        return AssignNode(args[0], args[1])
+    elif pt[0] == 'binop':
+        return CallNode(ConstNil, pt[1], args)
+    elif pt[0] == 'unop':
+        arg = args[0]
         isint = isinstance(arg, ConstNode) and isinstance(arg.val, IntNode)
         if isint and pt[1] == "-":
             return ConstNode(IntNode(-arg.val.val))
@@ -428,26 +557,27 @@ def parse_tree_to_ast(pt):
         else:
             return CallNode(ConstNil, pt[1], [arg])
     elif pt[0] == 'tuple':
-        return TupleNode(list(map(parse_tree_to_ast, pt[1])))
+        return TupleNode(args)
     elif pt[0] == 'int':
         return ConstNode(IntNode(pt[1]))
     elif pt[0] == 'var':
         return VarNode(pt[1])
     elif pt[0] == 'formal':
         return VarNode(pt[1], pt[2])
-    elif pt[0] == 'call':
-        return CallNode(ConstNil, pt[1], list(map(parse_tree_to_ast, pt[2])))
+    elif pt[0] == 'call' or pt[0] == 'proof-call':
+        return CallNode(ConstNil, pt[1], args)
     elif pt[0] == 'lvalue':  # lvalue : IDENT trailer
         # this case is tricky: we need to reverse the parsing precedence,
         # which binds the first trailer first, whereas we want the first
         # trailer deepest in the AST.
-        base = parse_tree_to_ast(pt[1])
+        rest = iter(args)
+        base = next(rest)
         trailer = pt[2]
         while trailer is not None:
             if trailer[0] == 'prop':
                 base = CompoundVarNode(base, trailer[1], ConstNil)
             elif trailer[0] == 'idx':
-                idx = parse_tree_to_ast(trailer[1])
+                idx = next(rest)
                 if isinstance(base, CompoundVarNode) and base.idx is ConstNil:
                     base = CompoundVarNode(base.obj, base.name, idx)
                 elif isinstance(base, CompoundVarNode):
@@ -455,46 +585,47 @@ def parse_tree_to_ast(pt):
                 else:
                     base = CompoundVarNode(ConstNil, base.name, idx)
             elif trailer[0] == 'call':
-                args = list(map(parse_tree_to_ast, trailer[1]))
+                call_args = [next(rest) for _ in trailer[1]]
                 if isinstance(base, CompoundVarNode) and base.idx is ConstNil:
-                    base = CallNode(base.obj, base.name, args)
+                    base = CallNode(base.obj, base.name, call_args)
                 elif isinstance(base, CompoundVarNode):
                     raise Exception("don't know how to call on a compound var")
                 else:
-                    base = CallNode(ConstNil, base.name, args)
+                    base = CallNode(ConstNil, base.name, call_args)
             trailer = trailer[2]
         return base
     elif pt[0] == 'new':
-        lcls = list(map(parse_tree_to_ast, pt[1]))
-        body = parse_tree_to_ast(pt[2])
-        return NewNode(lcls, body)
+        return NewNode(args[:-1], args[-1])
     elif pt[0] == 'local':
         if pt[2] is None:
             return InitNode(pt[1], ConstNil)
         else:
-            return InitNode(pt[1], parse_tree_to_ast(pt[2]))
+            return InitNode(pt[1], args[0])
     elif pt[0] == 'method':
-        body = parse_tree_to_ast(pt[3])
-        formals = list(map(parse_tree_to_ast, pt[2]))
+        body = args[0]
+        formals = args[1:]
         for a in formals:
             if not isinstance(a, VarNode):
                 raise Exception("invalid method argument declaration", a)
         return MethodNode(pt[1], formals, body)
     elif pt[0] == 'ite':
-        cnd = parse_tree_to_ast(pt[1])
-        thn = parse_tree_to_ast(pt[2])
-        els = parse_tree_to_ast(pt[3])
-        return ITENode(cnd, thn, els)
+        return ITENode(args[0], args[1], args[2])
     elif pt[0] == 'proof':
-        proof_terms = lambda pr: parse_tree_to_ast(pr[0])
-        proof_steps = lambda pr: parse_tree_to_ast(pr[1]) if pr[1] is not None else None
-        proof_verbatims = lambda pr: pr[2]
-        return ProofNode(list(map(proof_terms, pt[1])), list(map(proof_steps, pt[1])), list(map(proof_verbatims, pt[1])))
-    elif pt[0] == 'proof-call':
-        return CallNode(ConstNil, pt[1], list(map(parse_tree_to_ast, pt[2])))
+        terms = args[:len(pt[1])]
+        hint_asts = iter(args[len(pt[1]):])
+        hints = [next(hint_asts) if pr[1] is not None else None for pr in pt[1]]
+        verbatims = [pr[2] for pr in pt[1]]
+        return ProofNode(terms, hints, verbatims)
     elif pt[0] == 'assert':
-        return AssertNode(parse_tree_to_ast(pt[1]))
+        return AssertNode(args[0])
     elif pt[0] == 'assume':
-        return AssumeNode(parse_tree_to_ast(pt[1]))
+        return AssumeNode(args[0])
     else:
         raise Exception("unexpected parse tree node: {}".format(pt))
+
+
+if __name__ == "__main__":
+    # regenerate parser_table.py from the grammar above
+    import os
+    yacc.yacc(module=sys.modules[__name__], tabmodule='parser_table', debug=False,
+              outputdir=os.path.dirname(os.path.abspath(__file__)))
@@ -11,19 +11,33 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
-from typing import List, Tuple, Optional
+from collections import Counter
+from typing import Any, Iterator, List, Set, Tuple, Optional
 
 from .ast import *
 from .proof import *
 from .parser import string_to_ast
-from .analysis import AnnotateImmutableLocals
+from .analysis import AnnotateImmutableLocals, ContextSlicer, ObjectIndex
+from .statements import Chunk, parse_chunks, scan_statements
 
 class Program(object):
-    def __init__(self, prog: str) -> None:
-        self.ast = self.annotate_ast(string_to_ast(prog))  # type: TopLevelNode
+    # parse_cache, if given, is a ParseCache to parse the program through.
+    # The program is parsed lazily, as its statements or obligations are needed.
+    def __init__(self, prog: str, parse_cache: Optional[Any]=None) -> None:
+        self.source = prog
+        self.parse_cache = parse_cache
+        self._ast = None  # type: Optional[TopLevelNode]
         self.initial_context = None  # type: Optional[Tuple[str, str]]
         self.expected_return = None  # type: Optional[str]
-    
+
+    @property
+    def ast(self) -> TopLevelNode:
+        if self._ast is None:
+            for _ in self.iter_statements():
+                pass
+        assert self._ast is not None
+        return self._ast
+
     def annotate_ast(self, ast: TopLevelNode) -> TopLevelNode:
         v = AnnotateImmutableLocals()
         ret =  v.visit(ast)
@@ -31,44 +45,113 @@ class Program(object):
             raise Exception("TopLevelNode was lost while annotating; got instead {}".format(ret))
         return ret
 
+    # Yield the annotated top-level statements of the program, parsing it one
+    # statement at a time. AnnotateImmutableLocals considers a field mutable on
+    # every object if any statement assigns it through another object or in a
+    # function, so a statement is held back until no later statement can
+    # assign any of the names it mentions that way or outside any object's
+    # body.
+    def iter_statements(self) -> Iterator[AST]:
+        if self._ast is not None:
+            yield from self._ast.children
+            return
+        chunks = scan_statements(self.source)
+        if chunks is None:
+            self._ast = self.annotate_ast(string_to_ast(self.source))
+            yield from self._ast.children
+            return
+
+        # how many chunks not yet parsed may assign each name
+        unknown = sum(1 for c in chunks if c.assigned is None)
+        assigned = Counter()  # type: Counter
+        for c in chunks:
+            assigned.update(c.assigned or ())
+            assigned.update(c.bound)
+
+        v = AnnotateImmutableLocals()
+        held = []  # type: List[Tuple[List[AST], Set[str]]]
+        children = []  # type: List[AST]
+        for stmts, chunk in self._parse_chunks(chunks):
+            if chunk is None:
+                unknown, assigned = 0, Counter()
+            else:
+                if chunk.assigned is None:
+                    unknown -= 1
+                else:
+                    assigned.subtract(chunk.assigned)
+                assigned.subtract(chunk.bound)
+            for n in stmts:
+                v.find.visit(n)
+            held.append((stmts, chunk.names if chunk is not None else set()))
+            while held and unknown == 0 and not any(assigned[n] > 0 and n not in v.find.may_mutate for n in held[0][1]):
+                for n in held.pop(0)[0]:
+                    n = v.annotate(n)
+                    children.append(n)
+                    yield n
+        assert not held
+        self._ast = TopLevelNode(children)
+
+    # Yield the statements of each chunk along with the chunk. If a chunk does
+    # not parse, parse the whole program instead, so that errors (and their
+    # positions) are reported exactly as a full parse would, and yield
+    # whatever statements are left with no chunk.
+    def _parse_chunks(self, chunks: List[Chunk]) -> Iterator[Tuple[List[AST], Optional[Chunk]]]:
+        parse = self.parse_cache.parse_chunks if self.parse_cache is not None else parse_chunks
+        count = 0
+        try:
+            for stmts, chunk in zip(parse([c.text for c in chunks]), chunks):
+                count += len(stmts)
+                yield stmts, chunk
+        except Exception:
+            yield string_to_ast(self.source).children[count:], None
+
+    # given an AST, generate a list of proof obligations
+    # that AST requires to be discharged
+    def generate_proof_obligations(self) -> List[Proof]:
+        return list(self.iter_proof_obligations())
+
     def generate_evaluate_obligations(self) -> List[Proof]:
-        current_program = NopNode()  # type: AST
+        return list(self.iter_evaluate_obligations())
+
+    def iter_evaluate_obligations(self) -> Iterator[Proof]:
         current_terms = []  # type: List[AST]
-        proofs = []  # type: List[Proof]
 
-        for n in self.ast.children:
+        for n in self.iter_statements():
             if isinstance(n, AssertNode):
-                prf = AssertionProof(current_program, n.cond)
-                proofs.append(prf)
+                yield AssertionProof(block(current_terms), n.cond)
             elif not isinstance(n, SurfaceAST):
                 current_terms.append(n)
-                if isinstance(current_program, NopNode):
-                    current_program = n
-                else:
-                    current_program = SeqNode(current_program, n)
         
-        runprf = RunProof(current_terms, self.initial_context, self.expected_return)
-        proofs.append(runprf)
-
-        return proofs
+        yield RunProof(current_terms, self.initial_context, self.expected_return)
 
-    # given an AST, generate a list of proof obligations
-    # that AST requires to be discharged
-    def generate_proof_obligations(self) -> List[Proof]:
-        current_program = NopNode()  # type: AST
+    # given an AST, generate the proof obligations that AST requires
+    # to be discharged, each as soon as its context has been parsed
+    def iter_proof_obligations(self) -> Iterator[Proof]:
+        # the context of each obligation is a single block of every term so
+        # far, built only when the terms have changed since the last one, and
+        # likewise for the index of the objects the context defines and the
+        # slicer that trims it to each proof's needs
+        current_terms = []  # type: List[AST]
+        current_program = NopNode()  # type: Optional[AST]
         current_assumptions = []  # type: List[Tuple[AST, AST]]
-        proofs = []  # type: List[Proof]
+        objects = ObjectIndex()
+        current_objects = objects  # type: Optional[ObjectIndex]
+        current_slicer = ContextSlicer([])  # type: Optional[ContextSlicer]
 
-        for n in self.ast.children:
+        for n in self.iter_statements():
+            if current_program is None and isinstance(n, (ProofNode, AssertNode)):
+                current_program = block(current_terms)
+                current_objects = objects.snapshot()
+                current_slicer = ContextSlicer(list(current_terms))
             if isinstance(n, ProofNode):
                 # generate a new proof
+                assert current_objects is not None and current_slicer is not None
                 for (p1, p2), hint, verb in zip(zip(n.terms, n.terms[1:]), n.hints, n.verbatims):
-                    prf = self._construct_proof_obligation(current_program, p1, p2, hint, verb, current_assumptions)
-                    proofs.append(prf)
+                    context = self._slice_context(current_program, current_slicer, p1, p2, hint, verb, current_assumptions)
+                    yield self._construct_proof_obligation(context, p1, p2, hint, verb, list(current_assumptions), current_objects)
             elif isinstance(n, AssertNode):
                 # also generates a new proof
-                prf = AssertionProof(current_program, n.cond)
-                proofs.append(prf)
+                yield AssertionProof(current_program, n.cond)
             elif isinstance(n, AssumeNode):
                 # create a new assumption
                 assert isinstance(n.proof, ProofNode)
@@ -76,21 +159,30 @@ class Program(object):
                 current_assumptions.append((n.proof.terms[0], n.proof.terms[1]))
             elif not isinstance(n, SurfaceAST):
                 # append program to current_program
-                if isinstance(current_program, NopNode):
-                    current_program = n
-                else:
-                    current_program = SeqNode(current_program, n)
-        
-        return proofs
+                current_terms.append(n)
+                objects.add(n)
+                current_program = None
+                current_objects = None
+                current_slicer = None
+
+    # The part of the context a proof of lhs ~ rhs with the given hint needs.
+    # Verbatim proof text may refer to the whole context (such as to the
+    # addresses of its objects), so then it is kept whole.
+    def _slice_context(self, program: AST, slicer: ContextSlicer, lhs: AST, rhs: AST, hint: Optional[AST], verb: str, assumptions: List[Tuple[AST, AST]]) -> AST:
+        if verb:
+            return program
+        terms = [lhs, rhs] + ([hint] if hint is not None else []) + [t for a in assumptions for t in a]
+        kept = slicer.slice(terms)
+        return program if len(kept) == len(slicer.statements) else block(kept)
 
     # given a program (the context so far) and LHS and RHS,
     # and the hint on how to solve the proof,
     # construct a new Proof 
-    def _construct_proof_obligation(self, program: AST, lhs: AST, rhs: AST, hint: AST, verb: str, assumptions: List[Tuple[AST, AST]]) -> Proof:
+    def _construct_proof_obligation(self, program: AST, lhs: AST, rhs: AST, hint: AST, verb: str, assumptions: List[Tuple[AST, AST]], objects: Optional[ObjectIndex]=None) -> Proof:
         if isinstance(hint, CallNode):
             if hint.name == "Rewrite" and len(hint.args) == 2:
                 return RewriteProof(lhs, rhs, program, hint.args[0], hint.args[1], assumptions)
         elif isinstance(hint, VarNode):
             if hint.name == "Admit":
                 return AdmitProof(lhs, rhs, program)
-        return EquivalenceProof(lhs, rhs, program, hint, verb)
+        return EquivalenceProof(lhs, rhs, program, hint, verb, objects)
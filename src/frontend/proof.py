@@ -11,10 +11,10 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
-from typing import Optional, List, Tuple
+from typing import Any, Dict, Optional, List, Set, Tuple
 
 from .ast import *
-from .analysis import GatherObjectInfo
+from .analysis import ObjectIndex, method_footprint, same_behavior
 
 # A Proof obligation
 class Proof(object):
@@ -37,10 +37,27 @@ class AssertionProof(Proof):
 
 # prove the LHS and RHS equivalent
 class EquivalenceProof(IndistinguishabilityProof):
-    def __init__(self, lhs: AST, rhs: AST, context: AST, inv: Optional[AST], verb: str) -> None:
+    # objects, if given, is an ObjectIndex of the context
+    def __init__(self, lhs: AST, rhs: AST, context: AST, inv: Optional[AST], verb: str, objects: Optional[ObjectIndex] = None) -> None:
         super().__init__(lhs, rhs, context)
+        self._context_objects = objects
+        self._objects = None  # type: Optional[ObjectIndex]
         self.invs = self._compute_invariant(inv)
         self.verbatim = verb
+    # The objects defined by the context, lhs and rhs, indexed when first
+    # needed. The index isn't encoded (by frontend.wire) or pickled with the
+    # proof, so after decoding it is rebuilt from the context.
+    @property
+    def objects(self) -> ObjectIndex:
+        if getattr(self, "_objects", None) is None:
+            index = getattr(self, "_context_objects", None)
+            if index is None:
+                index = ObjectIndex()
+                index.add(self.context)
+            self._objects = index.layer(self.lhs, self.rhs)
+        return self._objects
+    def __getstate__(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
     def _compute_invariant(self, inv: Optional[AST]) -> List['Invariant']:
         if isinstance(inv, CallNode):
             if inv.name == "Equal" and len(inv.args) == 2:
@@ -49,7 +66,7 @@ class EquivalenceProof(IndistinguishabilityProof):
                 collapsed = self._collapse_conjuncts(inv)
                 return [i for c in collapsed for i in self._compute_invariant(c)]
             elif inv.name == "Default" and len(inv.args) == 0:
-                return self._compute_default_invariant(self.context, self.lhs, self.rhs)
+                return self._compute_default_invariant()
             elif inv.name == "Valid" and len(inv.args) == 2 and isinstance(inv.args[0], VarNode) and (inv.args[0].name == "_lhs" or inv.args[0].name == "_rhs"):
                 return [ValidInvariant(inv.args[1], inv.args[0])]
             elif inv.name == "Ref" and len(inv.args) == 2 and isinstance(inv.args[0], VarNode) and (inv.args[0].name == "_lhs" or inv.args[0].name == "_rhs"):
@@ -66,13 +83,10 @@ class EquivalenceProof(IndistinguishabilityProof):
                 return [UniversalInvariant(inv.args, inv.body)]
         if inv is not None:
             print("Unknown invariant: {}".format(inv))
-        return self._compute_default_invariant(self.context, self.lhs, self.rhs)
-    def _compute_default_invariant(self, ctx: AST, lhs: AST, rhs: AST) -> List['Invariant']:
-        v = GatherObjectInfo()
-        v.visit(ctx)
-        v.visit(lhs)
-        v.visit(rhs)
-        fields = sorted(set(v.get_fields(lhs)) & set(v.get_fields(rhs)))
+        return self._compute_default_invariant()
+    def _compute_default_invariant(self) -> List['Invariant']:
+        v = self.objects
+        fields = sorted(set(v.get_fields(self.lhs)) & set(v.get_fields(self.rhs)))
         lhs_call = lambda name: CompoundVarNode(VarNode("_lhs"), name, ConstNil)
         rhs_call = lambda name: CompoundVarNode(VarNode("_rhs"), name, ConstNil)
         return [EqualInvariant(lhs_call(n), rhs_call(n)) for n in fields]
@@ -81,6 +95,69 @@ class EquivalenceProof(IndistinguishabilityProof):
             return self._collapse_conjuncts(inv.args[0]) + self._collapse_conjuncts(inv.args[1])
         else:
             return [inv]
+    # The names of the methods common to both sides that need no proof,
+    # because they are the very same method on both sides and only touch
+    # arguments, locals, and fields the invariant keeps equal
+    def unchanged_methods(self) -> List[str]:
+        info = self.objects
+        lhs_methods = info.get_methods(self.lhs)
+        rhs_methods = info.get_methods(self.rhs)
+        if lhs_methods is None or rhs_methods is None:
+            return []
+        # a constructor defined more than once may not be the one we found
+        for side in (self.lhs, self.rhs):
+            if isinstance(side, CallNode) and info.definition_count(side.name) != 1:
+                return []
+        lhs_fields = set(info.get_fields(self.lhs))
+        rhs_fields = set(info.get_fields(self.rhs))
+        equal = set()  # type: Set[str]
+        writable = True
+        for inv in self.invs:
+            if isinstance(inv, EqualInvariant) and self._is_field(inv.lhs, "_lhs") and self._is_field(inv.rhs, "_rhs") \
+                    and inv.lhs.name == inv.rhs.name and inv.lhs.name in lhs_fields & rhs_fields:
+                equal.add(inv.lhs.name)
+            elif not isinstance(inv, TrueInvariant):
+                # we can't tell whether writing a field maintains this one
+                writable = False
+        return sorted(n for n, m in lhs_methods.items()
+                      if rhs_methods.get(n) is m
+                      and same_behavior(m, lhs_fields | rhs_fields, equal, info.is_global, writable))
+    # For each common method that needs proof, the indices into invs of the
+    # field equalities (_lhs.x == _rhs.y) on fields the method reads and
+    # writes on neither side. The method can neither break these nor need
+    # them to behave the same, so its proof may leave them out, as long as it
+    # checks that it leaves those fields as they were. Methods with none are
+    # left out.
+    def framed_invariants(self) -> Dict[str, List[int]]:
+        info = self.objects
+        lhs_methods = info.get_methods(self.lhs)
+        rhs_methods = info.get_methods(self.rhs)
+        if lhs_methods is None or rhs_methods is None:
+            return {}
+        for side in (self.lhs, self.rhs):
+            if isinstance(side, CallNode) and info.definition_count(side.name) != 1:
+                return {}
+        equalities = [(i, inv.lhs.name, inv.rhs.name) for i, inv in enumerate(self.invs)
+                      if isinstance(inv, EqualInvariant) and self._is_field(inv.lhs, "_lhs") and self._is_field(inv.rhs, "_rhs")]
+        if not equalities:
+            return {}
+        lhs_fields = set(info.get_fields(self.lhs))
+        rhs_fields = set(info.get_fields(self.rhs))
+        unchanged = set(self.unchanged_methods())
+        framed = {}  # type: Dict[str, List[int]]
+        for name, m in lhs_methods.items():
+            if name in unchanged or name not in rhs_methods or len(rhs_methods[name].args) != len(m.args):
+                continue
+            lhs_uses = method_footprint(m, lhs_methods, lhs_fields, info.function_definitions)
+            rhs_uses = method_footprint(rhs_methods[name], rhs_methods, rhs_fields, info.function_definitions)
+            if lhs_uses is None or rhs_uses is None:
+                continue
+            idxs = [i for i, l, r in equalities if l not in lhs_uses and r not in rhs_uses]
+            if idxs:
+                framed[name] = idxs
+        return framed
+    def _is_field(self, e: AST, side: str) -> bool:
+        return isinstance(e, CompoundVarNode) and e.obj is VarNode(side) and e.idx is ConstNil
 
 class AdmitProof(IndistinguishabilityProof):
     def __init__(self, lhs: AST, rhs: AST, context: AST) -> None:
@@ -0,0 +1,520 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+from fractions import Fraction
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..analysis import PURE_BUILTINS
+from ..ast import *
+
+# A reference interpreter for the language, following eval.rkt and Lang.dfy
+# directly on the frontend's AST, so that running a program doesn't need a
+# backend at all. Values are IntNodes, NilNodes, Refs, TupleValues, MapValues
+# and ErrorValues.
+#
+# Where the backends differ, it follows the backend it is given:
+# - ROSETTE (eval.rkt): a global function called from a method runs with the
+#   caller's `this`, and division is exact, so it may make a rational.
+# - DAFNY (Lang.dfy): a global function runs with the `this` of the object
+#   it was found on (the globals, unless the caller has a method of that
+#   name), division is Euclidean integer division, and an assignment to a
+#   field or global updates the object as it was before the rhs ran.
+# Either way, tuples may hold errors, and errors say what went wrong, as in
+# eval.rkt. adversary() is symbolic, so running a program that calls it is an
+# error, unless the interpreter is given a way to make concrete adversaries
+# (see Adversary).
+
+# as in indistinguishable.rkt
+FUEL = 30
+
+ROSETTE = "rosette"
+DAFNY = "dafny"
+
+_ARITY = dict(PURE_BUILTINS, adversary=0)
+_NIL = NilNode()
+_ZERO = IntNode(0)
+_ONE = IntNode(1)
+
+
+# A reference to the object at an address
+class Ref(object):
+    __slots__ = ("addr",)
+    def __init__(self, addr: int) -> None:
+        self.addr = addr
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Ref) and self.addr == other.addr
+    def __hash__(self) -> int:
+        return hash(self.addr)
+    def to_dafny(self) -> str:
+        return "Ref({})".format(self.addr)
+    def to_sexp(self) -> str:
+        return "(Ref {})".format(self.addr)
+
+# A tuple of values
+class TupleValue(object):
+    __slots__ = ("elts",)
+    def __init__(self, elts: List[Any]) -> None:
+        self.elts = elts
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, TupleValue) and self.elts == other.elts
+    def __hash__(self) -> int:
+        return hash(tuple(self.elts))
+    def to_dafny(self) -> str:
+        return "Tuple({})".format(list_to_dafny_list([e.to_dafny() for e in self.elts]))
+    def to_sexp(self) -> str:
+        return "(Tuple (list {}))".format(" ".join(e.to_sexp() for e in self.elts))
+
+
+# A map from values to values. Maps are values, so assigning to an index
+# makes a new map.
+class MapValue(object):
+    __slots__ = ("vals",)
+    def __init__(self, vals: Dict[Any, Any]) -> None:
+        self.vals = vals
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, MapValue) and self.vals == other.vals
+    def __hash__(self) -> int:
+        return hash(frozenset(self.vals.items()))
+
+# An error, with a message and the expression (or builtin name) it came from.
+# As in lang.rkt, all errors are equal.
+class ErrorValue(object):
+    __slots__ = ("msg", "expr")
+    def __init__(self, msg: str, expr: Any) -> None:
+        self.msg = msg
+        self.expr = expr
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ErrorValue)
+    def __hash__(self) -> int:
+        return 1024
+
+
+# A concrete stand-in for adversary.rkt's adversary: each call returns a
+# value choose() picks, and is recorded in the adversary's history
+class Adversary(object):
+    def __init__(self, choose: Any, history: Optional[List[Tuple[Tuple[str, List[Any]], Any]]] = None) -> None:
+        self.choose = choose
+        self.history = list(history) if history is not None else []
+    def __call__(self, name: str, args: List[Any]) -> Any:
+        ret = self.choose()
+        self.history.append(((name, args), ret))
+        return ret
+    def copy(self) -> 'Adversary':
+        return Adversary(self.choose, self.history)
+
+# An adversary that replays another's history from idx: while its calls are
+# the same as the other's, it returns the same values, and after that, new ones
+class AdversaryReplay(object):
+    def __init__(self, adversary: Adversary, idx: int) -> None:
+        self.adversary = adversary
+        self.idx = idx
+    def __call__(self, name: str, args: List[Any]) -> Any:
+        history = self.adversary.history
+        if 0 <= self.idx < len(history) and history[self.idx][0] == (name, args):
+            self.idx += 1
+            return history[self.idx - 1][1]
+        self.idx = -1
+        return self.adversary.choose()
+
+
+# eval.rkt's Context: objs and methods map each address to its fields and
+# methods (or to an adversary), and scope holds the locals of the current
+# method call
+class Context(object):
+    def __init__(self) -> None:
+        self.scope = {}  # type: Dict[str, Any]
+        self.objs = {0: {}}  # type: Dict[int, Dict[str, Any]]
+        self.methods = {0: {}}  # type: Dict[int, Any]
+        self.ths = 0
+        self.next_addr = 1
+    def valid_ref(self, addr: int) -> bool:
+        return addr in self.objs and addr in self.methods
+    # Add an object with the given fields and methods (or adversary),
+    # returning its address
+    def new_object(self, fields: Dict[str, Any], methods: Any) -> int:
+        addr = self.next_addr
+        self.objs[addr] = fields
+        self.methods[addr] = methods
+        self.next_addr += 1
+        return addr
+    # a copy that evaluation can change without changing this context
+    # (values themselves are never changed), except for its adversaries,
+    # which are shared
+    def copy(self) -> 'Context':
+        ctx = Context()
+        ctx.scope = dict(self.scope)
+        ctx.objs = {addr: dict(fields) for addr, fields in self.objs.items()}
+        ctx.methods = {addr: dict(methods) if isinstance(methods, dict) else methods
+                       for addr, methods in self.methods.items()}
+        ctx.ths = self.ths
+        ctx.next_addr = self.next_addr
+        return ctx
+
+
+def _is_error(v: Any) -> bool:
+    return isinstance(v, ErrorValue)
+
+def _quote(name: str) -> str:
+    return "'" + name
+
+# Lang.dfy's division, which rounds so that the remainder is never negative
+def _divide(a: Any, b: Any) -> Any:
+    return a // b if b > 0 else -(a // -b)
+
+# eval.rkt's division, which is exact
+def _exact_divide(a: Any, b: Any) -> Any:
+    q = Fraction(a, b)
+    return q.numerator if q.denominator == 1 else q
+
+_BINOPS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "<": lambda a, b: 1 if a < b else 0,
+    ">": lambda a, b: 1 if a > b else 0,
+}
+_DIVIDE = {ROSETTE: _exact_divide, DAFNY: _divide}
+
+
+class Interpreter(object):
+    # adversary, if given, returns a new adversary for each call to adversary();
+    # backend is ROSETTE or DAFNY (see above)
+    def __init__(self, ctx: Optional[Context] = None, adversary: Any = None, backend: str = ROSETTE) -> None:
+        if backend not in (ROSETTE, DAFNY):
+            raise Exception("unknown backend {}".format(backend))
+        self.ctx = ctx if ctx is not None else Context()
+        self.adversary = adversary
+        self.backend = backend
+        # the number of assignments to fields and globals so far
+        self.writes = 0
+
+    def eval(self, e: AST, fuel: int = FUEL) -> Any:
+        if fuel == 0:
+            return self.error("out of fuel", e)
+        visit = getattr(self, "eval_" + type(e).__name__, None)
+        if visit is None:
+            raise Exception("unknown expression {}".format(e))
+        return visit(e, fuel - 1)
+
+    # the result of an error
+    def error(self, msg: str, expr: Any) -> Any:
+        return ErrorValue(msg, expr)
+
+    # the object whose fields name refers to outside the current scope: this,
+    # or else the globals, or None if neither has the field
+    def _fields_with(self, name: str) -> Optional[Dict[str, Any]]:
+        ctx = self.ctx
+        if ctx.valid_ref(ctx.ths) and name in ctx.objs[ctx.ths]:
+            return ctx.objs[ctx.ths]
+        if ctx.valid_ref(0) and name in ctx.objs[0]:
+            return ctx.objs[0]
+        return None
+
+    def call_with_scope(self, body: AST, scope: Dict[str, Any], ths: int, fuel: int) -> Any:
+        ctx = self.ctx
+        old_scope, old_ths = ctx.scope, ctx.ths
+        ctx.scope, ctx.ths = scope, ths
+        ret = self.eval(body, fuel)
+        ctx.scope, ctx.ths = old_scope, old_ths
+        return ret
+
+    # call mtd with args evaluated in order, with this as ths
+    def call(self, e: CallNode, mtd: MethodNode, ths: int, fuel: int) -> Any:
+        if len(mtd.args) != len(e.args):
+            return self.error("wrong number of args for {} (got {}, expected {})".format(
+                _quote(e.name), len(e.args), len(mtd.args)), e)
+        scope = {}  # type: Dict[str, Any]
+        for name, arg in zip(mtd.args, e.args):
+            scope[name.name] = self.eval(arg, fuel)
+        return self.call_with_scope(mtd.body, scope, ths, fuel)
+
+    def eval_ConstNode(self, e: ConstNode, fuel: int) -> Any:
+        return e.val
+
+    def eval_VarNode(self, e: VarNode, fuel: int) -> Any:
+        if e.name in self.ctx.scope:
+            return self.ctx.scope[e.name]
+        fields = self._fields_with(e.name)
+        if fields is None:
+            return self.error("undefined variable", e)
+        return fields[e.name]
+
+    def eval_TupleNode(self, e: TupleNode, fuel: int) -> Any:
+        return TupleValue([self.eval(a, fuel) for a in e.args])
+
+    def eval_SeqNode(self, e: SeqNode, fuel: int) -> Any:
+        self.eval(e.e1, fuel)
+        return self.eval(e.e2, fuel)
+
+    def eval_BlockNode(self, e: BlockNode, fuel: int) -> Any:
+        ret = _NIL  # type: Any
+        for x in e.exprs:
+            ret = self.eval(x, fuel)
+        return ret
+
+    def eval_NopNode(self, e: NopNode, fuel: int) -> Any:
+        return _NIL
+
+    def eval_ITENode(self, e: ITENode, fuel: int) -> Any:
+        cond = self.eval(e.cond, fuel)
+        if _is_error(cond) or cond is _NIL or cond is _ZERO:
+            return self.eval(e.els, fuel)
+        return self.eval(e.then, fuel)
+
+    def eval_CompoundVarNode(self, e: CompoundVarNode, fuel: int) -> Any:
+        ctx = self.ctx
+        obj = self.eval(e.obj, fuel)
+        if isinstance(obj, TupleValue):
+            idx = self.eval(e.idx, fuel)
+            if isinstance(idx, IntNode) and isinstance(idx.val, int) and 0 <= idx.val < len(obj.elts):
+                return obj.elts[idx.val]
+            return self.error("tuple index {} out of range (got {} elts)".format(
+                value_to_string(idx), len(obj.elts)), e)
+        if isinstance(obj, Ref):
+            base = ctx.objs[obj.addr] if ctx.valid_ref(obj.addr) else {}
+        elif obj is _NIL:
+            base = ctx.scope if e.name in ctx.scope else (self._fields_with(e.name) or {})
+        else:
+            return self.error("invalid base object for CVar", e)
+        if e.name not in base:
+            return self.error("undefined variable", e)
+        ret = base[e.name]
+        idx = self.eval(e.idx, fuel)
+        if idx is _NIL:
+            return ret
+        if isinstance(ret, MapValue) and idx in ret.vals:
+            return ret.vals[idx]
+        return self.error("invalid idx", e)
+
+    def eval_NewNode(self, e: NewNode, fuel: int) -> Any:
+        ctx = self.ctx
+        fields = {}  # type: Dict[str, Any]
+        for l in e.locals:
+            old_scope = ctx.scope
+            ctx.scope = dict(old_scope)
+            ctx.scope.update(fields)
+            fields[l.name] = self.eval(VarNode(l.name) if l.val is ConstNil else l.val, fuel)
+            ctx.scope = old_scope
+        addr = ctx.new_object(fields, {})
+        self.call_with_scope(e.body, dict(ctx.scope), addr, fuel)
+        return Ref(addr)
+
+    def eval_MethodNode(self, e: MethodNode, fuel: int) -> Any:
+        ctx = self.ctx
+        if not ctx.valid_ref(ctx.ths) or not isinstance(ctx.methods[ctx.ths], dict):
+            return self.error("no valid `this` reference", e)
+        ctx.methods[ctx.ths][e.name] = e
+        return _NIL
+
+    def eval_AssignNode(self, e: AssignNode, fuel: int) -> Any:
+        ctx = self.ctx
+        lhs = e.lhs
+        # eval.rkt looks some things up in the context from before the rhs
+        local = lhs.name in ctx.scope if isinstance(lhs, (VarNode, CompoundVarNode)) else False
+        next_addr = ctx.next_addr
+        writes = self.writes
+        # Lang.dfy assigns a field or global on the object as it was before
+        # the rhs, undoing any assignments the rhs made to it
+        target = None  # type: Optional[Dict[str, Any]]
+        if self.backend == DAFNY and isinstance(lhs, VarNode) and not local:
+            target = self._fields_with(lhs.name)
+            if target is None and not (ctx.valid_ref(ctx.ths) and ctx.ths != 0) and ctx.valid_ref(0):
+                target = ctx.objs[0]
+            before = dict(target) if target is not None else None
+        rhs = self.eval(e.rhs, fuel)
+        if self.writes != writes and target is not None:
+            target.clear()
+            target.update(before)
+        if isinstance(lhs, VarNode):
+            fields = self._fields_with(lhs.name)
+            if local:
+                ctx.scope[lhs.name] = rhs
+            elif fields is not None:
+                fields[lhs.name] = rhs
+                self.writes += 1
+            elif ctx.valid_ref(ctx.ths) and ctx.ths != 0:
+                # inside a method call, so restrict the scope of a new decl
+                ctx.scope[lhs.name] = rhs
+            elif ctx.valid_ref(0):
+                # outside a method call, everything is a global
+                ctx.objs[0][lhs.name] = rhs
+                self.writes += 1
+            else:
+                return self.error("cannot assign in this scope", e)
+            return rhs
+        if not isinstance(lhs, CompoundVarNode):
+            return self.error("invalid LHS for assignment", e)
+        obj = self.eval(lhs.obj, fuel)
+        idx = self.eval(lhs.idx, fuel)
+        if _is_error(obj):
+            return obj
+        if _is_error(idx):
+            return idx
+        if isinstance(obj, Ref):
+            if (obj.addr >= next_addr and self.backend == ROSETTE) or not ctx.valid_ref(obj.addr):
+                return self.error("invalid base object for assignment", e)
+            base = ctx.objs[obj.addr]
+            self.writes += 1
+        elif obj is _NIL:
+            if local:
+                base = ctx.scope
+            else:
+                base = self._fields_with(lhs.name)  # type: ignore
+                if base is None:
+                    if idx is not _NIL or not ctx.valid_ref(ctx.ths):
+                        # the variable must already exist to assign to an index
+                        return self.error("cannot assign in this scope", e)
+                    base = ctx.scope
+                else:
+                    self.writes += 1
+        else:
+            return self.error("invalid base object {} for assignment".format(value_to_string(obj)), e)
+        if idx is _NIL:
+            base[lhs.name] = rhs
+        else:
+            # we might need to convert the current value to a map
+            old = base.get(lhs.name)
+            vals = dict(old.vals) if isinstance(old, MapValue) else {}
+            vals[idx] = rhs
+            base[lhs.name] = MapValue(vals)
+        return rhs
+
+    def eval_CallNode(self, e: CallNode, fuel: int) -> Any:
+        ctx = self.ctx
+        obj = self.eval(e.obj, fuel)
+        if isinstance(obj, Ref):
+            if not ctx.valid_ref(obj.addr):
+                return self.error("invalid base object for call", e)
+            methods = ctx.methods[obj.addr]
+            if not isinstance(methods, dict):
+                return methods(e.name, [self.eval(a, fuel) for a in e.args])
+            mtd = methods.get(e.name)
+            if mtd is None:
+                return self.error("no method named {}".format(_quote(e.name)), e)
+            return self.call(e, mtd, obj.addr, fuel)
+        if obj is not _NIL:
+            return self.error("invalid base object for call", e)
+        if e.name in _ARITY:
+            return self.call_builtin(e, fuel)
+        base = ctx.ths if ctx.valid_ref(ctx.ths) and e.name in ctx.methods[ctx.ths] else 0
+        if not isinstance(ctx.methods[base], dict):
+            return self.error("no method named {}".format(_quote(e.name)), e)
+        mtd = ctx.methods[base].get(e.name)
+        if mtd is None:
+            return self.error("no method named {}".format(_quote(e.name)), e)
+        # eval.rkt calls a global function with this, Lang.dfy with the
+        # globals
+        if base != ctx.ths and self.backend != ROSETTE:
+            return self.call(e, mtd, base, fuel)
+        return self.call(e, mtd, ctx.ths, fuel)
+
+    def call_builtin(self, e: CallNode, fuel: int) -> Any:
+        name, args = e.name, e.args
+        arity = _ARITY[name]
+        if arity != len(args):
+            return self.error("wrong number of args (got {}, expected {})".format(len(args), arity), name)
+        if name == "adversary":
+            if self.adversary is None:
+                raise Exception("adversary() is symbolic, so the program can't be run concretely (try --backend rosette)")
+            else:
+                methods = self.adversary()
+            return Ref(self.ctx.new_object({}, methods))
+        a = self.eval(args[0], fuel)
+        if name == "!":
+            return _ONE if _is_error(a) else ErrorValue("negated", name)
+        if name == "&":
+            return a if _is_error(a) else self.eval(args[1], fuel)
+        if name in ("|", "||"):
+            return a if not _is_error(a) else self.eval(args[1], fuel)
+        b = self.eval(args[1], fuel)
+        if name == "==":
+            return _ONE if a == b else ErrorValue("not equal", name)
+        if _is_error(a):
+            return a
+        if _is_error(b):
+            return b
+        if not (isinstance(a, IntNode) and isinstance(b, IntNode)):
+            return self.error("arguments to {} must be ints".format(_quote(name)), False)
+        if name == "/":
+            if b.val == 0:
+                return self.error("divide by zero", name)
+            return IntNode(_DIVIDE[self.backend](a.val, b.val))
+        return IntNode(_BINOPS[name](a.val, b.val))
+
+
+# Return how print.rkt displays a value
+def value_to_string(v: Any) -> str:
+    if isinstance(v, IntNode):
+        return str(v.val)
+    if isinstance(v, Ref):
+        return "Ref({})".format(v.addr)
+    if isinstance(v, TupleValue):
+        return "<{}>".format(", ".join(value_to_string(x) for x in v.elts))
+    if isinstance(v, MapValue):
+        return "{{{}}}".format(", ".join("{}: {}".format(value_to_string(k), value_to_string(x)) for k, x in v.vals.items()))
+    if isinstance(v, NilNode):
+        return "nil"
+    if isinstance(v, ErrorValue):
+        if isinstance(v.expr, AST):
+            where = expr_to_string(v.expr)
+        else:
+            where = "#f" if v.expr is False else str(v.expr)
+        return "<error: {} @ {}>".format(v.msg, where)
+    return str(v)
+
+
+# Return how print.rkt (and Refl.dfy) display an expression
+def expr_to_string(e: AST) -> str:
+    if isinstance(e, VarNode):
+        return e.name
+    if isinstance(e, ConstNode):
+        return value_to_string(e.val)
+    if isinstance(e, TupleNode):
+        return "<{}>".format(", ".join(expr_to_string(a) for a in e.args))
+    if isinstance(e, SeqNode):
+        return "{}; {}".format(expr_to_string(e.e1), expr_to_string(e.e2))
+    if isinstance(e, BlockNode):
+        return "; ".join(expr_to_string(x) for x in e.exprs)
+    if isinstance(e, CompoundVarNode):
+        s = e.name
+        if e.obj is not ConstNil:
+            s = expr_to_string(e.obj) + "." + s
+        if e.idx is not ConstNil:
+            s += "[{}]".format(expr_to_string(e.idx))
+        return s
+    if isinstance(e, NewNode):
+        inits = ", ".join(l.name if l.val is ConstNil else "{}={}".format(l.name, expr_to_string(l.val))
+                          for l in e.locals)
+        return "new ({}) {{ {} }}; ".format(inits, expr_to_string(e.body))
+    if isinstance(e, MethodNode):
+        return "{}({}) {{ {} }}; ".format(e.name, ", ".join(a.name for a in e.args), expr_to_string(e.body))
+    if isinstance(e, AssignNode):
+        return "{} = {}".format(expr_to_string(e.lhs), expr_to_string(e.rhs))
+    if isinstance(e, CallNode):
+        arity = _ARITY.get(e.name) if e.obj is ConstNil else None
+        if arity == 1 and len(e.args) > 0:
+            return e.name + expr_to_string(e.args[0])
+        if arity == 2 and len(e.args) > 1:
+            return "{} {} {}".format(expr_to_string(e.args[0]), e.name, expr_to_string(e.args[1]))
+        s = "{}({})".format(e.name, ", ".join(expr_to_string(a) for a in e.args))
+        if e.obj is not ConstNil:
+            s = expr_to_string(e.obj) + "." + s
+        return s
+    if isinstance(e, ITENode):
+        s = "if {} {{ {} }} ".format(expr_to_string(e.cond), expr_to_string(e.then))
+        if not isinstance(e.els, NopNode):
+            s += "else {{ {} }} ".format(expr_to_string(e.els))
+        return s
+    if isinstance(e, NopNode):
+        return ""
+    raise Exception("unknown expression {}".format(e))
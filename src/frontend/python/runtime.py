@@ -0,0 +1,78 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+from typing import Any, List, Optional, Tuple
+
+from ..ast import *
+from ..proof import AssertionProof, Proof, RunProof
+from ..runtime import Runtime
+from ..program import Program
+from .interpreter import FUEL, ROSETTE, Context, ErrorValue, Interpreter, MapValue, Ref, TupleValue, expr_to_string, value_to_string
+
+# the value classes an expectation like `// EXPECT: Map` can name
+_KINDS = {"Int": IntNode, "Nil": NilNode, "Ref": Ref, "Tuple": TupleValue, "Map": MapValue, "Error": ErrorValue}
+
+
+# Runs programs with the reference interpreter in interpreter.py, in this
+# process, printing the same output as the other backends' run programs.
+# It writes no backend program, so run() returns no file name, and it can
+# only run programs, not check proofs.
+class PythonRuntime(Runtime):
+    semantics = ROSETTE
+    fuel = FUEL
+
+    def __init__(self, prog: Program) -> None:
+        super(PythonRuntime, self).__init__()
+        self.prog = prog
+        self.proofs = []  # type: List[Proof]
+
+    def compile(self, evaluate=False) -> None:
+        if not evaluate:
+            raise Exception("the python backend can only run programs, not check proofs")
+        self.proofs = self.prog.generate_evaluate_obligations()
+
+    def run(self, verbose=False) -> Tuple[bool, str, Optional[str]]:
+        out = []  # type: List[str]
+        try:
+            for prf in self.proofs:
+                if not self.run_proof(prf, out):
+                    out.append("assert failed\n")
+                    return False, "".join(out), None
+        except Exception as e:
+            out.append("error: {}\n".format(e))
+            return False, "".join(out), None
+        return True, "".join(out), None
+
+    # run an AssertionProof or RunProof, appending its output to out and
+    # returning whether its assertion holds
+    def run_proof(self, prf: Proof, out: List[str]) -> bool:
+        if isinstance(prf, AssertionProof):
+            interp = Interpreter()
+            interp.eval(prf.program, FUEL)
+            return interp.eval(prf.condition, FUEL) is IntNode(1)
+        assert isinstance(prf, RunProof)
+        ctx = Context()
+        if prf.initctx is not None:
+            k, v = prf.initctx
+            ctx.objs[0][k] = IntNode(int(v))
+        interp = Interpreter(ctx)
+        ret = None  # type: Any
+        for t in prf.terms:
+            ret = interp.eval(t, FUEL)
+            out.append("{} ==> {}\n".format(expr_to_string(t), value_to_string(ret)))
+        if prf.expect is None or prf.expect == "None":
+            return True
+        try:
+            return ret is IntNode(int(prf.expect))
+        except ValueError:
+            return isinstance(ret, _KINDS[prf.expect])
@@ -12,8 +12,9 @@
 # permissions and limitations under the License.
 
 import os
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
+from ..ast import AST
 from ..emitter import *
 from ..proof import *
 
@@ -23,9 +24,9 @@ ROSETTE_BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "
 
 
 class RosetteEmitter(Emitter):
-    def __init__(self, includes: List[str]=[]) -> None:
+    def __init__(self, includes: List[str]=[], out: Optional[Any]=None) -> None:
+        super().__init__(out)
         self.includes = [os.path.join(ROSETTE_BACKEND_ROOT, i) for i in ROSETTE_INCLUDES]
-        self.bodies = []  # type: List[str]
         self.to_run = []  # type: List[str]
         self.id = IDGen()
         self.current_name = None  # type: Optional[str]
@@ -49,12 +50,12 @@ class RosetteEmitter(Emitter):
     def end(self, run=False) -> str:
         assert self.current_name is not None
         name = self.current_name
-        body = "\n".join("  {}".format(l) for l in self.current_body.getLines())
         args = " ".join(n for n in self.current_args)
         if args != "":
             args = " " + args
-        func = "(define ({name}{args})\n{body})".format(name=name, args=args, body=body)
-        self.bodies.append(func)
+        self.write_definition("(define ({name}{args})\n".format(name=name, args=args))
+        self.current_body.write(self, "  ")
+        self.write(")")
         if run:
             if self.current_args == []:
                 self.to_run.append(self.current_name)
@@ -64,7 +65,7 @@ class RosetteEmitter(Emitter):
         return name
 
     def emit_global(self, *lines: str) -> None:
-        self.bodies.append("\n".join(lines))
+        self.write_definition("\n".join(lines))
 
     def emit(self, *lines) -> None:
         assert self.current_name is not None
@@ -72,11 +73,15 @@ class RosetteEmitter(Emitter):
             self.current_body.emit(l)
 
 
-    def to_program(self) -> str:
-        body = ["({})".format(n) for n in self.to_run]
-        prelude = "#lang rosette\n\n" + "\n".join('(require (file "{}"))'.format(i.replace("\\", "\\\\")) for i in self.includes)
-        program = "\n\n".join([prelude] + self.bodies + body)
-        return program
+    def prelude(self) -> str:
+        return "#lang rosette\n\n" + "\n".join('(require (file "{}"))'.format(i.replace("\\", "\\\\")) for i in self.includes)
+
+    def write_trailer(self) -> None:
+        for n in self.to_run:
+            self.write_definition("({})".format(n))
+
+    def write_term(self, node: AST) -> None:
+        node.write_sexp(self.out)
 
 
     def emit_AssertionProof(self, prf: AssertionProof) -> None:
@@ -86,9 +91,9 @@ class RosetteEmitter(Emitter):
         cond = self.id.fresh("cond")
         self.start_method("assertion")
         self.emit(
-            "(define {} {})".format(prog, prf.program.to_sexp()),
+            Code("(define {} {})", prog, prf.program),
             "(match-define (cons _ {}) (Eval {} (EmptyContext) FUEL))".format(ctx, prog),
-            "(define {} {})".format(cond, prf.condition.to_sexp()),
+            Code("(define {} {})", cond, prf.condition),
             "(match-define (cons {} _) (Eval {} {} FUEL));".format(ret, cond, ctx),
             "(check-assert (equal? {} (Int 1)))".format(ret))
         self.end(True)
@@ -102,13 +107,24 @@ class RosetteEmitter(Emitter):
         ret2 = self.id.fresh("ret")
         ctx1 = self.id.fresh("ctx")
         ctx2 = self.id.fresh("ctx")
+        # methods identical on both sides are recorded, but not checked
+        unchanged = prf.unchanged_methods()
+        skip = " #:unchanged '({})".format(" ".join(unchanged)) if unchanged else ""
+        # and each method is checked only against the field equalities on
+        # fields it touches, and to leave the others' fields alone
+        framed = prf.framed_invariants()
+        if framed:
+            skip += " #:framed (list {})".format(" ".join(
+                "(list '{} {})".format(name, " ".join(
+                    "(list {} '{} '{})".format(invs[i], prf.invs[i].lhs.name, prf.invs[i].rhs.name) for i in framed[name]))
+                for name in sorted(framed)))
         self.start_method("equivalent")
         self.emit(
-            "(define {} {})".format(ctx, prf.context.to_sexp()),
-            "(define {} {})".format(lhs, prf.lhs.to_sexp()),
-            "(define {} {})".format(rhs, prf.rhs.to_sexp()),
+            Code("(define {} {})", ctx, prf.context),
+            Code("(define {} {})", lhs, prf.lhs),
+            Code("(define {} {})", rhs, prf.rhs),
             "(define invariants (list {}))".format(" ".join(i for i in invs)),
-            "(check-proof (Equivalent {} {} {} invariants))".format(ctx, lhs, rhs))
+            "(check-proof (Equivalent {} {} {} invariants{}))".format(ctx, lhs, rhs, skip))
         self.end(True)
     
     def emit_AdmitProof(self, prf: AdmitProof) -> None:
@@ -116,8 +132,8 @@ class RosetteEmitter(Emitter):
         lhs = self.id.fresh("lhs")
         rhs = self.id.fresh("rhs")
         self.emit(
-            "(define {} {})".format(lhs, prf.lhs.to_sexp()),
-            "(define {} {})".format(rhs, prf.rhs.to_sexp()),
+            Code("(define {} {})", lhs, prf.lhs),
+            Code("(define {} {})", rhs, prf.rhs),
             "; this goal is admitted",
             "(check-proof (AdmitProof {} {}))".format(lhs, rhs))
         self.end(True)
@@ -129,13 +145,16 @@ class RosetteEmitter(Emitter):
         rhs = self.id.fresh("rhs")
         assumptions = self.id.fresh("assumptions")
         all_assumptions = prf.assumptions + [(r,l) for l,r in prf.assumptions]
-        assumptions_list = "(list" + " ".join(["(cons {} {})".format(l.to_sexp(), r.to_sexp()) for l, r in all_assumptions]) + ")"
+        assumptions_list = ["(list"]  # type: List[Any]
+        for i, (l, r) in enumerate(all_assumptions):
+            assumptions_list.append(Code(" (cons {} {})" if i > 0 else "(cons {} {})", l, r))
+        assumptions_list.append(")")
         self.emit(
-            "(define {} {})".format(ctx, prf.context.to_sexp()),
-            "(define {} {})".format(lhs, prf.lhs.to_sexp()),
-            "(define {} {})".format(rhs, prf.rhs.to_sexp()),
-            "(define {} {})".format(assumptions, assumptions_list),
-            "(check-proof (ValidRewrite {} {} {} {} {} {}))".format(lhs, rhs, ctx, prf.e1.to_sexp(), prf.e2.to_sexp(), assumptions))
+            Code("(define {} {})", ctx, prf.context),
+            Code("(define {} {})", lhs, prf.lhs),
+            Code("(define {} {})", rhs, prf.rhs),
+            Code("(define {} {})", assumptions, assumptions_list),
+            Code("(check-proof (ValidRewrite {} {} {} {} {} {}))", lhs, rhs, ctx, prf.e1, prf.e2, assumptions))
         self.end(True)
     
     def emit_RunProof(self, prf: RunProof) -> None:
@@ -156,7 +175,7 @@ class RosetteEmitter(Emitter):
             ret = self.id.fresh("ret")
             newctx = self.id.fresh("ctx")
             self.emit(
-                "(define {} {})".format(expr, t.to_sexp()),
+                Code("(define {} {})", expr, t),
                 "(match-define (cons {} {}) (Eval {} {} FUEL))".format(ret, newctx, expr, ctx),
                 '(print-expr {}) (display " ==> ") (print-value {}) (display "\\n")'.format(expr, ret))
             ctx = newctx
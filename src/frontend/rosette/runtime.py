@@ -11,55 +11,55 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
-import hashlib
-import os
-import subprocess
-import sys
-import tempfile
-from typing import Tuple
+from typing import Any, Optional, Tuple
 
 from ..ast import *
 from ..runtime import Runtime
 from ..program import Program
-from .emitter import RosetteEmitter
+from ..python.interpreter import ROSETTE
+from .emitter import ROSETTE_BACKEND_ROOT, RosetteEmitter
 
 
 class RosetteRuntime(Runtime):
+    suffix = ".rkt"
+    library = ROSETTE_BACKEND_ROOT
+    semantics = ROSETTE
+    # as in indistinguishable.rkt
+    fuel = 30
+
     def __init__(self, prog: Program) -> None:
         super(RosetteRuntime, self).__init__()
-        self.emitter = RosetteEmitter()
         self.prog = prog
     
-    def compile(self, evaluate=False) -> None:
+    # with split, emit each obligation into a program of its own (see
+    # run_units) rather than all of them into one
+    def compile(self, evaluate=False, split=False) -> None:
         if evaluate:
-            proofs = self.prog.generate_evaluate_obligations()
+            proofs = self.prog.iter_evaluate_obligations()
         else:
-            proofs = self.prog.generate_proof_obligations()
+            proofs = self.proof_obligations()
 
-        for p in proofs:
-            self.emitter.emit_proof(p)
-    
-    def run(self, verbose=False) -> Tuple[bool, str, str]:
-        tmpl = self.emitter.to_program()
-        
-        if self.output_path is None:
-            f = tempfile.NamedTemporaryFile(mode="w", suffix=".rkt", delete=False)
-            fname = f.name
+        if split:
+            self.emit_units(proofs)
         else:
-            fname = os.path.realpath("test-%s.rkt" % (hashlib.md5(tmpl.encode()).hexdigest()[:8]))
-            fname = os.path.join(self.output_path, fname)
-            f = open(fname, "w")
-        
-        f.write(tmpl)
-        f.close()
+            self.emit_program(proofs)
+    
+    def new_emitter(self, out: Optional[Any]=None) -> RosetteEmitter:
+        return RosetteEmitter(out=out)
 
-        binary = self._find_executable("racket")
-        stdout = None if verbose else subprocess.PIPE
-        stderr = None if verbose else subprocess.PIPE
-        proc = subprocess.Popen(binary + " " + fname,
-                    stdout=stdout, stderr=stderr, shell=True, universal_newlines=True)
-        
-        out, err = proc.communicate()
-        success = proc.returncode == 0
+    def version_command(self) -> str:
+        return self._find_executable("racket") + " --version"
 
-        return success, "" if verbose else (out + err), fname
+    def command(self, fname: str) -> str:
+        return self._find_executable("racket") + " " + fname
+
+    def new_workers(self, size: int) -> Any:
+        from .worker import WORKER, WorkerPool
+        return WorkerPool(self.command('"{}"'.format(WORKER)), size)
+
+    def run(self, verbose=False) -> Tuple[bool, str, str]:
+        fname = self.finish_program()
+        success, out = self.check_file(fname, verbose)
+        if success:
+            self.cache_verified()
+        return success, out, fname
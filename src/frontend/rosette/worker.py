@@ -0,0 +1,166 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import queue
+import signal
+import subprocess
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+from .emitter import ROSETTE_BACKEND_ROOT
+
+# the program racket runs in each worker
+WORKER = os.path.join(ROSETTE_BACKEND_ROOT, "worker.rkt")
+
+
+# A persistent process checking programs sent to it, one at a time, over the
+# framed protocol of worker.rkt. What it writes to stderr goes to a temporary
+# file, which is only read if it dies, so that it can never block on a full
+# pipe. It runs in a process group of its own, so that killing it also kills
+# the racket process under the shell.
+class Worker(object):
+    def __init__(self, command: str) -> None:
+        self.stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=self.stderr, start_new_session=True)
+        # the programs checked so far, and the memory in use after the last
+        self.uses = 0
+        self.memory = 0
+        # whether the last check was stopped for taking too long
+        self.timed_out = False
+
+    # Check a program, returning whether it succeeded and its output. Raises
+    # if the worker has died, or if it takes longer than timeout seconds, in
+    # which case it is killed.
+    def check(self, text: str, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        data = text.encode()
+        timer = None  # type: Optional[threading.Timer]
+        if timeout is not None:
+            timer = threading.Timer(timeout, self._time_out)
+            timer.start()
+        try:
+            try:
+                self.proc.stdin.write(b"%d\n" % len(data) + data)
+                self.proc.stdin.flush()
+            except OSError:
+                pass  # the worker has died; see below
+            header = self.proc.stdout.readline().split()
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if len(header) != 3 or self.timed_out:
+            self.kill()
+            if self.timed_out:
+                raise Exception("backend worker timed out after {} s".format(timeout))
+            raise Exception("backend worker died: {}".format(self.errors()))
+        status, length, memory = (int(h) for h in header)
+        out = self.proc.stdout.read(length)
+        self.uses += 1
+        self.memory = memory
+        return status == 0, out.decode(errors="replace")
+
+    def _time_out(self) -> None:
+        self.timed_out = True
+        self.kill()
+
+    # the end of what the worker wrote to stderr
+    def errors(self, limit: int = 4096) -> str:
+        self.stderr.seek(0, os.SEEK_END)
+        self.stderr.seek(max(self.stderr.tell() - limit, 0))
+        return self.stderr.read().decode(errors="replace").strip()
+
+    # stop the worker once it's done with its current program
+    def close(self) -> None:
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+        self.proc.stdout.close()
+        self.stderr.close()
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass  # it has already exited
+        self.proc.wait()
+
+
+# A pool of up to size workers started with command, checking a program at a
+# time each, for any number of threads. The workers are started at once, so
+# that they load while the frontend is busy producing the first programs. A
+# worker that dies is replaced (and the program it was checking retried once
+# on the replacement), and one that has checked max_uses programs or uses
+# more than max_memory bytes is replaced once it's done, so a leak in the
+# backend can't build up. A program that takes more than timeout seconds
+# fails, and its worker is killed and replaced, so that a program that never
+# finishes can't hold on to a worker.
+class WorkerPool(object):
+    def __init__(self, command: str, size: int, max_uses=500, max_memory=2 * 1024 * 1024 * 1024,
+                 timeout: Optional[float] = 3600) -> None:
+        self.command = command
+        self.max_uses = max_uses
+        self.max_memory = max_memory
+        self.timeout = timeout
+        self.idle = queue.Queue()  # type: queue.Queue
+        self.lock = threading.Lock()
+        self.workers = []  # type: List[Worker]
+        self.restarts = 0
+        for _ in range(max(size, 1)):
+            self.idle.put(self._start())
+
+    def _start(self) -> Worker:
+        w = Worker(self.command)
+        with self.lock:
+            self.workers.append(w)
+        return w
+
+    # close a worker and start another in its place
+    def _replace(self, w: Worker) -> Worker:
+        with self.lock:
+            if w in self.workers:
+                self.workers.remove(w)
+            self.restarts += 1
+        w.close()
+        return self._start()
+
+    # Check a program on the next idle worker, returning whether it succeeded
+    # and its output
+    def check(self, text: str) -> Tuple[bool, str]:
+        w = self.idle.get()
+        try:
+            for _ in range(2):
+                try:
+                    result = w.check(text, self.timeout)
+                    break
+                except Exception as e:
+                    timed_out = w.timed_out
+                    w = self._replace(w)
+                    result = False, str(e)
+                    if timed_out:
+                        break  # it would only time out again
+            if w.uses >= self.max_uses or w.memory > self.max_memory:
+                w = self._replace(w)
+        finally:
+            self.idle.put(w)
+        return result
+
+    def close(self) -> None:
+        with self.lock:
+            workers = list(self.workers)
+            self.workers = []
+        for w in workers:
+            w.close()
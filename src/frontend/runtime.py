@@ -11,19 +11,275 @@
 # express or implied. See the License for the specific language governing 
 # permissions and limitations under the License.
 
+import hashlib
 import os
+import subprocess
 import sys
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Iterable, Iterator, List, Optional, Tuple
+
+# A backend program being written to a file by an emitter. If we're keeping
+# output files, the file is named after its contents once it's complete.
+class ProgramFile(object):
+    def __init__(self, suffix: str, output_path: Optional[str]) -> None:
+        self.suffix = suffix
+        self.output_path = output_path
+        self.digest = hashlib.md5() if output_path is not None else None
+        directory = os.path.realpath(".") if output_path is not None else None
+        self.file = tempfile.NamedTemporaryFile(mode="w", suffix=suffix, dir=directory, delete=False)
+    def write(self, text: str) -> None:
+        self.file.write(text)
+        if self.digest is not None:
+            self.digest.update(text.encode())
+    # close the file, returning its name
+    def close(self) -> str:
+        self.file.close()
+        if self.digest is None:
+            return self.file.name
+        fname = os.path.realpath("test-%s%s" % (self.digest.hexdigest()[:8], self.suffix))
+        fname = os.path.join(self.output_path, fname)
+        os.replace(self.file.name, fname)
+        return fname
+    # close and delete an incomplete file
+    def discard(self) -> None:
+        self.file.close()
+        os.remove(self.file.name)
+
 
 class Runtime(object):
+    # file extension for programs in the backend's language
+    suffix = None  # type: str
+    # directory of the library the backend's programs include
+    library = None  # type: str
+    # the backend whose semantics the reference interpreter follows for this
+    # backend's programs (see python/interpreter.py)
+    semantics = None  # type: str
+    # the fuel the backend evaluates proofs with
+    fuel = None  # type: int
+
     def __init__(self):
         self.output_path = None
         self.paths = []
+        self.emitter = None  # type: Any
+        self.program_file = None  # type: Optional[ProgramFile]
+        # the obligations compile(split=True) emitted, each with the name of
+        # the program of its own it was written to
+        self.units = []  # type: List[Tuple[Any, str]]
+        # a Fuzzer (see fuzz.py) to try each proof obligation with before the
+        # backend checks it, and the counterexamples it has found
+        self.fuzzer = None  # type: Any
+        self.fuzz_failures = []  # type: List[Any]
+        # a VerdictCache (see verdict_cache.py) of the obligations verified
+        # before, which aren't checked again; those found in it, with the
+        # output of checking them; and the keys of those compile() emitted,
+        # to record once the backend verifies them
+        self.cache = None  # type: Any
+        self.cache_hits = []  # type: List[Tuple[Any, str]]
+        self.cache_pending = []  # type: List[str]
+        # a pool of persistent backend processes (see new_workers) to check
+        # programs on, rather than starting a process for each
+        self.workers = None  # type: Any
     def compile(self):
         raise NotImplementedError()
     def expect(self, val):
         raise NotImplementedError()
     def run(self):
         raise NotImplementedError()
+    # return a new, empty emitter for this backend, writing to out
+    def new_emitter(self, out: Optional[Any]=None) -> Any:
+        raise NotImplementedError()
+    # return the shell command to check the program in the file fname
+    def command(self, fname: str) -> str:
+        raise NotImplementedError()
+    # return the shell command to print the backend's version
+    def version_command(self) -> str:
+        raise NotImplementedError()
+    # return a pool of size persistent backend processes, with the backend's
+    # library loaded, for check_file to use; the caller closes it
+    def new_workers(self, size: int) -> Any:
+        raise Exception("{} has no persistent workers".format(type(self).__name__))
+
+    # the fuzzer's counterexample to a proof obligation, if it finds one
+    def fuzz(self, prf: Any) -> Any:
+        if self.fuzzer is None:
+            return None
+        cex = self.fuzzer.counterexample(prf)
+        if cex is not None:
+            self.fuzz_failures.append(cex)
+        return cex
+
+    # the program's proof obligations for the backend to check: all of them,
+    # except those the fuzzer finds a counterexample to and those the cache
+    # says were verified before
+    def proof_obligations(self) -> Iterator[Any]:
+        for prf in self.prog.iter_proof_obligations():
+            if self.fuzz(prf) is not None:
+                continue
+            if self.cache is not None:
+                key = self.cache.key(self.unit_text(prf))
+                out = self.cache.get(key)
+                if out is not None:
+                    self.cache_hits.append((prf, out))
+                    continue
+                self.cache_pending.append(key)
+            yield prf
+
+    # record that the obligations compile() emitted into one program were
+    # verified, once the backend has checked it
+    def cache_verified(self) -> None:
+        if self.cache is not None:
+            self.cache.put_many((k, "") for k in self.cache_pending)
+            self.cache_pending = []
+
+    # Check each proof obligation in a program of its own, as soon as the
+    # frontend produces it, with up to jobs backend runs at a time, and yield
+    # (proof, success, output, filename) in order. The frontend produces the
+    # next obligations while the backend is checking earlier ones, so the
+    # first verdict arrives long before a large program has been fully
+    # parsed. An obligation the fuzzer finds a counterexample to fails, and
+    # one the cache says was verified before succeeds, without a backend run
+    # (or a filename).
+    def check_each(self, verbose=False, jobs=1) -> Iterator[Tuple[Any, bool, str, str]]:
+        return self.schedule(((prf,) + self.unit(prf) for prf in self.prog.iter_proof_obligations()), jobs, verbose)
+
+    # Write a proof obligation to a program of its own for schedule(),
+    # returning its filename and verdict, if known without a backend run:
+    # the fuzzer's counterexample, or the cache's record that it was verified
+    # before (with no filename either way)
+    def unit(self, prf: Any) -> Tuple[str, Optional[Tuple[bool, str]]]:
+        cex = self.fuzz(prf)
+        if cex is not None:
+            return "", (False, str(cex))
+        if self.cache is None:
+            return self.write_unit(prf), None
+        text = self.unit_text(prf)
+        out = self.cache.get(self.cache.key(text))
+        if out is not None:
+            return "", (True, out)
+        return self.write_program(text), None
+
+    # Check the programs compile(split=True) emitted, with up to jobs backend
+    # runs at a time, and yield (proof, success, output, filename) in order
+    def run_units(self, jobs=1, verbose=False) -> Iterator[Tuple[Any, bool, str, str]]:
+        return self.schedule(((prf, fname, None) for prf, fname in self.units), jobs, verbose)
+
+    # Run the backend on each (proof, filename, verdict), on a pool of at
+    # most jobs backend processes, and yield (proof, success, output,
+    # filename) in order, each as soon as it and those before it are known.
+    # A unit with a verdict already (success and output, such as a fuzzer's
+    # counterexample) gets it without a backend run. Programs the backend
+    # verifies are recorded in the cache, if any.
+    def schedule(self, units: Iterable[Tuple[Any, str, Optional[Tuple[bool, str]]]], jobs=1, verbose=False) -> Iterator[Tuple[Any, bool, str, str]]:
+        def check(fname: str) -> Tuple[bool, str]:
+            return self.check_file(fname, verbose)
+        def done(prf: Any, run: Optional[Future], verdict: Optional[Tuple[bool, str]], fname: str) -> Tuple[Any, bool, str, str]:
+            if run is None:
+                return prf, verdict[0], verdict[1], fname
+            success, out = run.result()
+            if success and self.cache is not None:
+                with open(fname) as f:
+                    self.cache.put_many([(self.cache.key(f.read()), out)])
+            return prf, success, out, fname
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            pending = deque()  # type: Deque[Tuple[Any, Optional[Future], Optional[Tuple[bool, str]], str]]
+            for prf, fname, verdict in units:
+                run = pool.submit(check, fname) if verdict is None else None
+                pending.append((prf, run, verdict, fname))
+                while pending and (pending[0][1] is None or pending[0][1].done()):
+                    yield done(*pending.popleft())
+            while pending:
+                yield done(*pending.popleft())
+
+    # open a file for a backend program: a temporary file,
+    # or one named after its contents if we're keeping output files
+    def open_program(self) -> ProgramFile:
+        return ProgramFile(self.suffix, self.output_path)
+
+    # write a backend program to a file, returning its name
+    def write_program(self, tmpl: str) -> str:
+        f = self.open_program()
+        f.write(tmpl)
+        return f.close()
+
+    # the backend program of a proof obligation on its own
+    def unit_text(self, prf: Any) -> str:
+        emitter = self.new_emitter()
+        emitter.emit_proof(prf)
+        return emitter.to_program()
+
+    # write a proof obligation to a backend program of its own, returning its
+    # file name
+    def write_unit(self, prf: Any) -> str:
+        f = self.open_program()
+        try:
+            emitter = self.new_emitter(f)
+            emitter.emit_proof(prf)
+            emitter.finish()
+        except Exception:
+            f.discard()
+            raise
+        return f.close()
+
+    # emit each proof into a program file of its own, for compile(split=True)
+    def emit_units(self, proofs: Iterable[Any]) -> None:
+        self.units = []
+        try:
+            for p in proofs:
+                self.units.append((p, self.write_unit(p)))
+        except Exception:
+            if self.output_path is None:
+                for _, fname in self.units:
+                    os.remove(fname)
+            raise
+
+    # emit proofs into a new program file, for compile()
+    def emit_program(self, proofs: Iterable[Any]) -> None:
+        self.program_file = self.open_program()
+        try:
+            self.emitter = self.new_emitter(self.program_file)
+            for p in proofs:
+                self.emitter.emit_proof(p)
+        except Exception:
+            self.program_file.discard()
+            raise
+
+    # finish the program compile() emitted, returning the name of its file
+    def finish_program(self) -> str:
+        self.emitter.finish()
+        return self.program_file.close()
+
+    # check the program in a file, on a worker if there are any, returning
+    # its success and output (or printing the output, if verbose)
+    def check_file(self, fname: str, verbose=False) -> Tuple[bool, str]:
+        if self.workers is None:
+            return self.finish(self.start(fname, verbose), verbose)
+        with open(fname) as f:
+            success, out = self.workers.check(f.read())
+        out = self.output(success, out, "")
+        if verbose:
+            sys.stdout.write(out)
+            return success, ""
+        return success, out
+
+    # start the backend on a program file without waiting for it
+    def start(self, fname: str, verbose=False) -> subprocess.Popen:
+        stdout = None if verbose else subprocess.PIPE
+        stderr = None if verbose else subprocess.PIPE
+        return subprocess.Popen(self.command(fname),
+                    stdout=stdout, stderr=stderr, shell=True, universal_newlines=True)
+
+    # wait for a backend started by start(), returning its success and output
+    def finish(self, proc: subprocess.Popen, verbose=False) -> Tuple[bool, str]:
+        out, err = proc.communicate()
+        success = proc.returncode == 0
+        return success, "" if verbose else self.output(success, out, err)
+
+    # the output to report for a backend run, given its stdout and stderr
+    def output(self, success: bool, out: str, err: str) -> str:
+        return out + err
+
     def add_path(self, path: str) -> None:
         self.paths.append(path)
     def _find_executable(self, name: str) -> str:
@@ -40,4 +296,23 @@ class Runtime(object):
                     return full_path
         error = """Couldn't find executable `{}` on your PATH.
 Try specifying an additional search path with the --path argument""".format(name)
-        raise Exception(error)
\ No newline at end of file
+        raise Exception(error)
+
+BACKENDS = ["dafny", "rosette"]
+# the backends run.py can use, which also include the reference interpreter
+RUN_BACKENDS = BACKENDS + ["python"]
+
+# Return the Runtime class for the named backend.
+# Backends are imported only when selected, to keep start-up fast.
+def get_runtime(backend: str) -> type:
+    if backend == "dafny":
+        from .dafny import DafnyRuntime
+        return DafnyRuntime
+    elif backend == "rosette":
+        from .rosette import RosetteRuntime
+        return RosetteRuntime
+    elif backend == "python":
+        from .python import PythonRuntime
+        return PythonRuntime
+    else:
+        raise Exception("unknown backend {}".format(backend))
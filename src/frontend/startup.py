@@ -0,0 +1,73 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# Measure the start-up latency of the frontend.
+# Each sample runs in a fresh interpreter, so that nothing is already imported
+# or constructed, and reports (in seconds) the time to import the frontend,
+# to import the selected backend, to produce the program's first proof
+# obligation (which the backend can start checking straight away),
+# and to produce the rest of them.
+
+SRC_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_SAMPLE = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from frontend.program import Program
+from frontend.runtime import get_runtime
+t1 = time.perf_counter()
+get_runtime(sys.argv[2])
+t2 = time.perf_counter()
+obligations = Program(sys.stdin.read()).iter_proof_obligations()
+next(obligations, None)
+t3 = time.perf_counter()
+for _ in obligations:
+    pass
+t4 = time.perf_counter()
+print(json.dumps({"import frontend": t1 - t0, "import backend": t2 - t1,
+                  "first obligation": t3 - t2, "remaining obligations": t4 - t3}))
+"""
+
+STAGES = ["interpreter", "import frontend", "import backend", "first obligation", "remaining obligations", "total"]
+
+
+def startup_sample(prog: str, backend: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _SAMPLE, SRC_ROOT, backend],
+                          input=prog, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    total = time.perf_counter() - start
+    sample = json.loads(proc.stdout)
+    sample["interpreter"] = total - sum(sample.values())
+    sample["total"] = total
+    return sample
+
+
+def startup_bench(prog: str, backend: str, runs: int = 10) -> Dict[str, float]:
+    samples = [startup_sample(prog, backend) for _ in range(runs)]
+    return {k: statistics.median(s[k] for s in samples) for k in STAGES}
+
+
+def print_startup_bench(prog: str, backend: str, runs: int = 10) -> None:
+    result = startup_bench(prog, backend, runs)
+    print("start-up latency (median of {} runs, backend {}):".format(runs, backend))
+    for k in STAGES:
+        print("  {:<22} {:8.1f} ms".format(k + ":", result[k] * 1000))
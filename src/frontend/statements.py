@@ -0,0 +1,176 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import re
+from typing import Iterator, List, Optional, Set, Tuple
+
+from .ast import *
+from .parser import get_parser, reserved
+
+# A cheap scanner that mirrors the lexer in parser.py closely enough to find
+# the boundaries between top-level statements without running the parser,
+# so that a program can be parsed (and cached) one statement at a time.
+
+_TOKEN = re.compile(r"""
+    (?P<ws>[ \t\n]+)
+  | (?P<comment>//.*)
+  | (?P<verbatim>\{\{\{)
+  | (?P<ident>[a-zA-Z_][a-zA-Z0-9]*)
+  | (?P<number>\d+)
+  | (?P<eq>==)
+  | (?P<literal>[-+*/=()<>;.\[\]{},~&!|:])
+""", re.VERBOSE)
+_BRACE = re.compile(r"[{}]")
+
+# A new statement must begin when a token that can end an expression is
+# directly followed, outside any brackets, by one that can only begin one.
+_ENDERS = {"ident", "number", ")", "}"}
+_STARTERS = {"ident", "number", "new", "if", "assert", "assume", "!"}
+_OPEN = {"(", "[", "{"}
+_CLOSE = {")", "]", "}"}
+
+
+# A chunk of source text holding one or more complete top-level statements.
+# assigned is the set of names the chunk assigns through another object
+# (x.f = e or x.f[i] = e), which FindMutatedLocals will consider mutable on
+# every object, or None if the scanner cannot tell.
+# bound is the set of other names the chunk assigns (x = e or x[i] = e)
+# outside the body of any object, which may be globals or, in a function,
+# the fields of whichever objects call it.
+# names is the set of all identifiers in the chunk.
+class Chunk(object):
+    def __init__(self, text: str, assigned: Optional[Set[str]], names: Set[str], bound: Set[str]) -> None:
+        self.text = text
+        self.assigned = assigned
+        self.names = names
+        self.bound = bound
+
+
+# Find the name assigned by the lvalue ending just before an '=', given the
+# kinds and text of the tokens before it, and whether it is assigned through
+# another object (x.f = e or x.f[i] = e). Returns None if the lvalue is not
+# one the scanner understands.
+def _lvalue_name(kinds: List[str], texts: List[str]) -> Optional[Tuple[str, bool]]:
+    i = len(kinds) - 1
+    if i >= 0 and kinds[i] == "ident":
+        return texts[i], i > 0 and kinds[i-1] == "."
+    if i >= 0 and kinds[i] == "]":
+        level = 0
+        while i >= 0:
+            if kinds[i] == "]":
+                level += 1
+            elif kinds[i] == "[":
+                level -= 1
+                if level == 0:
+                    break
+            i -= 1
+        if i > 0 and kinds[i-1] == "ident":
+            return texts[i-1], i > 1 and kinds[i-2] == "."
+    return None
+
+
+def _make_chunk(text: str, kinds: List[str], texts: List[str], assigned: Optional[Set[str]], bound: Set[str]) -> Chunk:
+    return Chunk(text, assigned, set(t for k, t in zip(kinds, texts) if k == "ident"), bound)
+
+
+# Split a program into chunks, each holding one or more complete top-level
+# statements, such that parsing each chunk separately and concatenating the
+# results is the same as parsing the whole program.
+# Returns None if the program contains anything the scanner does not
+# understand; callers should then just parse the whole program.
+def scan_statements(s: str) -> Optional[List[Chunk]]:
+    chunks = []  # type: List[Chunk]
+    start = None  # type: Optional[int]
+    kinds = []  # type: List[str]
+    texts = []  # type: List[str]
+    assigned = set()  # type: Optional[Set[str]]
+    bound = set()  # type: Set[str]
+    # the open brackets, each with whether it is the argument list of a
+    # `new` (for parentheses) or the body of an object (for braces)
+    brackets = []  # type: List[Tuple[str, bool]]
+    new_args = False  # whether the last bracket closed was a `new`'s
+    prev_end = 0
+    depth = 0
+    pos = 0
+    while pos < len(s):
+        m = _TOKEN.match(s, pos)
+        if m is None:
+            return None  # an illegal character; let the lexer report it
+        kind = m.lastgroup
+        end = m.end()
+        if kind == "ws" or kind == "comment":
+            pos = end
+            continue
+        if kind == "verbatim":
+            level = 3
+            for b in _BRACE.finditer(s, end):
+                level += 1 if b.group() == "{" else -1
+                if level == 0:
+                    end = b.end()
+                    break
+            else:
+                return None
+        elif kind == "ident":
+            kind = m.group() if m.group() in reserved else "ident"
+        elif kind == "eq" or kind == "literal":
+            kind = m.group()
+
+        if start is not None and depth == 0:
+            prev = kinds[-1]
+            if prev == ";" or (prev in _ENDERS and kind in _STARTERS):
+                chunks.append(_make_chunk(s[start:prev_end], kinds, texts, assigned, bound))
+                start = None
+        if start is None:
+            start = m.start()
+            kinds, texts, assigned, bound = [], [], set(), set()
+
+        if kind == "=" and assigned is not None:
+            lvalue = _lvalue_name(kinds, texts)
+            if lvalue is None:
+                assigned = None
+            elif lvalue[1]:
+                assigned.add(lvalue[0])
+            elif brackets[-1:] != [("(", True)] and not any(k == "{" and b for k, b in brackets):
+                # not a `new`'s initializer, nor in an object's body
+                bound.add(lvalue[0])
+        if kind in _OPEN:
+            depth += 1
+            if kind == "{":
+                brackets.append((kind, kinds[-1:] == [")"] and new_args))
+            else:
+                brackets.append((kind, kinds[-1:] == ["new"]))
+        elif kind in _CLOSE:
+            depth -= 1
+            new_args = bool(brackets) and brackets[-1] == ("(", True)
+            if brackets:
+                brackets.pop()
+        kinds.append(kind)
+        texts.append(m.group())
+        prev_end = end
+        pos = end
+    if start is not None:
+        chunks.append(_make_chunk(s[start:prev_end], kinds, texts, assigned, bound))
+    return chunks
+
+
+def split_statements(s: str) -> Optional[List[str]]:
+    chunks = scan_statements(s)
+    return [c.text for c in chunks] if chunks is not None else None
+
+
+# Parse chunks one at a time, yielding the statements of each as soon as it
+# is parsed. Raises if a chunk does not parse.
+def parse_chunks(chunks: List[str]) -> Iterator[List[AST]]:
+    parser = get_parser()
+    for c in chunks:
+        yield parser.string_to_ast(c).children
@@ -0,0 +1,92 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import hashlib
+import os
+import subprocess
+from typing import Any, Iterable, Optional, Tuple
+
+from .diskcache import DiskCache, default_cache_dir
+
+
+DEFAULT_VERDICT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+# Anything that changes whether the backend verifies a program must
+# invalidate its verdicts: the backend's library (every file under its
+# directory in src/backend), the version of its binary, and the command line
+# it is run with
+def backend_id(runtime: Any) -> str:
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(runtime.library):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            h.update(os.path.relpath(path, runtime.library).encode())
+            with open(path, "rb") as f:
+                h.update(f.read())
+    version = subprocess.run(runtime.version_command(), shell=True, stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, universal_newlines=True)
+    h.update(version.stdout.encode())
+    h.update(runtime.command("").encode())
+    return h.hexdigest()
+
+
+# An on-disk cache of the proof obligations a backend has verified, keyed by
+# the hash of the self-contained backend program each is written to on its
+# own (which includes the paths of the library files it uses) and of the
+# backend itself (see backend_id). It maps each verified obligation to the
+# output its check printed, if it was checked on its own. Failures are not
+# cached, so a failing obligation is always checked again.
+class VerdictCache(object):
+    def __init__(self, runtime: Any, path: Optional[str]=None, max_bytes: Optional[int]=None) -> None:
+        if path is None:
+            path = default_cache_dir()
+        if max_bytes is None:
+            max_bytes = DEFAULT_VERDICT_CACHE_BYTES
+        self.store = DiskCache(os.path.join(path, "verdicts.sqlite"), max_bytes)
+        self.runtime = runtime
+        self.version = None  # type: Optional[str]
+        self.hits = 0
+        self.misses = 0
+
+    # the key for the backend program text of an obligation
+    def key(self, text: str) -> str:
+        if self.version is None:
+            self.version = backend_id(self.runtime)
+        h = hashlib.sha256(self.version.encode())
+        h.update(text.encode())
+        return h.hexdigest()
+
+    # Return the output of checking the obligation with the given key, if it
+    # was verified before, or else None
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode()
+
+    # Record that the obligations with the given keys were verified, with the
+    # output of checking each
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        self.store.put_many((k, out.encode()) for k, out in items)
+
+    def stats(self) -> str:
+        entries, size = self.store.usage()
+        return "verdict cache: {} hits, {} misses; {} entries, {:.1f} of {:.1f} MB".format(
+            self.hits, self.misses, entries, size / 1024 / 1024, self.store.max_bytes / 1024 / 1024)
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,166 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import hashlib
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .ast import *
+from .analysis import defined_name
+from .parser import get_parser
+from .program import Program
+from .proof import AssertionProof, IndistinguishabilityProof
+from . import wire
+
+
+# Parses the chunks of a program (see Program._parse_chunks) like a
+# ParseCache, but in memory, reusing the statements of the chunks parsed last
+# time and forgetting the rest
+class _ParseMemo(object):
+    def __init__(self) -> None:
+        self.parsed = {}  # type: Dict[str, List[AST]]
+
+    def parse_chunks(self, chunks: List[str]) -> Iterator[List[AST]]:
+        parsed = {}  # type: Dict[str, List[AST]]
+        parser = get_parser()
+        for chunk in chunks:
+            stmts = self.parsed.get(chunk)
+            if stmts is None:
+                stmts = parser.string_to_ast(chunk).children
+            parsed[chunk] = stmts
+            yield stmts
+        self.parsed = parsed
+
+
+# An obligation's verdict is determined by its encoding: the context is
+# sliced to the definitions the obligation reads (see ContextSlicer), so
+# editing any other definition leaves it as it was
+def fingerprint(prf: Any) -> str:
+    return hashlib.sha256(wire.dumps(prf)).hexdigest()
+
+# The names of the top-level definitions an obligation reads
+def reads(prf: Any) -> List[str]:
+    if isinstance(prf, IndistinguishabilityProof):
+        context = prf.context
+    elif isinstance(prf, AssertionProof):
+        context = prf.program
+    else:
+        return []
+    stmts = context.exprs if isinstance(context, BlockNode) else [context]
+    return sorted(set(n for n in map(defined_name, stmts) if n is not None))
+
+
+# The outcome of an obligation in a round of Watcher.check
+class Row(object):
+    def __init__(self, prf: Any, success: bool, out: str, checked: bool) -> None:
+        self.prf = prf
+        self.success = success
+        self.out = out
+        # whether it was checked in this round, rather than unchanged since
+        # the last one
+        self.checked = checked
+
+
+# Checks a proof file each time it changes, keeping its parsed statements and
+# the verdict on each obligation in memory, so that after an edit only the
+# statements edited are parsed again, and only the obligations that read an
+# edited definition (or are new) are checked again. new_backend returns a
+# Runtime for a Program, set up as prove.py was asked to.
+class Watcher(object):
+    def __init__(self, path: str, new_backend: Callable[[Program], Any], jobs=1) -> None:
+        self.path = path
+        self.new_backend = new_backend
+        self.jobs = jobs
+        self.parser = _ParseMemo()
+        # the verdict on each obligation in the last round, by fingerprint
+        self.verdicts = {}  # type: Dict[str, Tuple[bool, str]]
+        # the statements defining each name in the last round
+        self.definitions = {}  # type: Dict[str, List[AST]]
+        self.mtime = None  # type: Optional[int]
+
+    # Check the file again, returning a row per obligation and the names
+    # whose definitions changed since the last round
+    def check(self) -> Tuple[List[Row], List[str]]:
+        with open(self.path) as f:
+            prog = Program(f.read(), self.parser)
+        backend = self.new_backend(prog)
+        keys = []  # type: List[str]
+        def units() -> Iterator[Tuple[Any, str, Optional[Tuple[bool, str]]]]:
+            for prf in prog.iter_proof_obligations():
+                key = fingerprint(prf)
+                keys.append(key)
+                if key in self.verdicts:
+                    yield prf, "", self.verdicts[key]
+                else:
+                    yield (prf,) + backend.unit(prf)
+        rows = []  # type: List[Row]
+        verdicts = {}  # type: Dict[str, Tuple[bool, str]]
+        for i, (prf, success, out, fname) in enumerate(backend.schedule(units(), self.jobs)):
+            rows.append(Row(prf, success, out, keys[i] not in self.verdicts))
+            verdicts[keys[i]] = (success, out)
+            if fname and backend.output_path is None:
+                os.remove(fname)
+        self.verdicts = verdicts
+
+        definitions = defaultdict(list)  # type: Dict[str, List[AST]]
+        for n in prog.ast.children:
+            name = defined_name(n)
+            if name is not None:
+                definitions[name].append(n)
+        changed = sorted(n for n in set(definitions) | set(self.definitions)
+                         if len(definitions.get(n, [])) != len(self.definitions.get(n, []))
+                         or any(a is not b for a, b in zip(definitions[n], self.definitions[n])))
+        self.definitions = dict(definitions)
+        return rows, changed
+
+    # Check the file again and print the failures found and a table of the
+    # verdicts on all the obligations
+    def report(self) -> bool:
+        start = time.perf_counter()
+        try:
+            rows, changed = self.check()
+        except Exception as e:
+            print("error: {}".format(e))
+            return False
+        elapsed = time.perf_counter() - start
+        for i, row in enumerate(rows):
+            if row.checked and not row.success:
+                print("obligation {} ({}) FAILED:".format(i + 1, type(row.prf).__name__))
+                print(row.out)
+        print("{:>4}  {:<20} {:<40} {}".format("#", "obligation", "reads", "verdict"))
+        for i, row in enumerate(rows):
+            names = ", ".join(reads(row.prf))
+            if len(names) > 40:
+                names = names[:37] + "..."
+            verdict = ("ok" if row.success else "FAILED") + (" *" if row.checked else "")
+            print("{:>4}  {:<20} {:<40} {}".format(i + 1, type(row.prf).__name__, names, verdict))
+        failed = sum(1 for r in rows if not r.success)
+        print("{} passed, {} failed; checked the {} marked * in {:.2f}s{}".format(
+            len(rows) - failed, failed, sum(1 for r in rows if r.checked), elapsed,
+            " (changed: {})".format(", ".join(changed)) if changed and len(changed) < len(self.definitions) else ""))
+        sys.stdout.flush()
+        return failed == 0
+
+    # Report on the file now and whenever it changes, polling every interval
+    # seconds, until interrupted
+    def watch(self, interval=0.2) -> None:
+        while True:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self.mtime:
+                self.mtime = mtime
+                print("--- {} ---".format(time.strftime("%H:%M:%S")))
+                self.report()
+            time.sleep(interval)
@@ -0,0 +1,309 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import struct
+import sys
+from array import array
+from itertools import islice
+from typing import Any, Dict, List, Set, Tuple
+
+from .ast import *
+from .proof import *
+
+# A compact binary encoding of ASTs, proof obligations, and plain values
+# (None, bools, ints, strings, lists and tuples) built from them, for moving
+# them between processes or storing them on disk without re-parsing source.
+#
+# An encoding is a header, a table of string offsets, a stream of 16-bit or
+# (if any word needs more) 32-bit little-endian words, and the UTF-8 text of
+# the strings:
+#
+#     magic "QVLB", version, word size, #strings, #nodes, #words, #string bytes
+#     offset of each string (and of the end of the last) in the text
+#     words: the nodes, each its class code and then its fields in
+#            constructor order; then the encoded value itself
+#     string text
+#
+# Each distinct node is encoded once, after its children, and referred to by
+# its index, so shared subtrees (which hash-consing makes common) are shared
+# in the encoding too, and decoding builds each node from already-built
+# children without recursion. Values are single words tagged in their low
+# bits, except lists, tuples and proof objects, whose word gives their length
+# or shape and is followed by their items. A list of nodes (such as the
+# statements of a BlockNode) is followed by just the nodes' indices. An
+# object's shape is its class and attribute names, given once, just after
+# the first object with that shape is tagged, and referred to by index after.
+#
+# loads reads the words and string offsets in place through a memoryview, so
+# decoding from an mmap'd file copies nothing but the strings themselves.
+
+MAGIC = b"QVLB"
+# Bump whenever the classes below, their fields, or the layout change
+VERSION = 1
+
+_HEADER = struct.Struct("<4s6I")
+
+# The node and proof classes that can be encoded, by class code. New
+# classes go at the end (and bump VERSION).
+_NODE_CLASSES = (
+    TopLevelNode, ProofNode, AssertNode, AssumeNode, IntNode, NilNode,
+    VarNode, ConstNode, TupleNode, SeqNode, BlockNode, CompoundVarNode,
+    InitNode, NewNode, MethodNode, AssignNode, CallNode, ITENode, NopNode,
+)  # type: Tuple[type, ...]
+_OBJECT_CLASSES = (
+    AssertionProof, EquivalenceProof, AdmitProof, RewriteProof, RunProof,
+    DefaultInvariant, TrueInvariant, FalseInvariant, EqualInvariant,
+    ValidInvariant, RefInvariant, IntInvariant, UniversalInvariant,
+)  # type: Tuple[type, ...]
+
+_NODE_CODES = {cls: i for i, cls in enumerate(_NODE_CLASSES)}
+_NODE_FIELDS = [cls.__slots__ for cls in _NODE_CLASSES]
+_OBJECT_CODES = {cls: i for i, cls in enumerate(_OBJECT_CLASSES)}
+
+_TAG_BITS = 3
+_TAG_MASK = (1 << _TAG_BITS) - 1
+_TAG_NODE, _TAG_STR, _TAG_INT, _TAG_CONST, _TAG_LIST, _TAG_TUPLE, _TAG_OBJECT, _TAG_NODES = range(8)
+# the payloads of _TAG_CONST; a big int is followed by the index of its
+# decimal string
+_CONSTS = (None, False, True)
+_CONST_BIGINT = len(_CONSTS)
+# ints in [-_INT_LIMIT, _INT_LIMIT) fit in one word, zigzag encoded so that
+# small negative ints are small words too
+_INT_LIMIT = 1 << (32 - _TAG_BITS - 1)
+_WORD_TYPES = {2: "H", 4: "I"}
+
+
+# Return the attributes of a proof object to encode, leaving out private
+# ones (such as an EquivalenceProof's object index), which it rebuilds from
+# the rest when needed
+def _attrs(obj: Any) -> Dict[str, Any]:
+    return {k: v for k, v in vars(obj).items() if not k.startswith("_")}
+
+
+# Return the nodes reachable from value, each after its children
+def _nodes_postorder(value: Any) -> List[AST]:
+    order = []  # type: List[AST]
+    seen = set()  # type: Set[int]
+    stack = [(value, False)]  # type: List[Tuple[Any, bool]]
+    while stack:
+        v, children_done = stack.pop()
+        if children_done:
+            order.append(v)
+            continue
+        if isinstance(v, AST):
+            if id(v) in seen:
+                continue
+            seen.add(id(v))
+            stack.append((v, True))
+            fields = [getattr(v, f) for f in type(v).__slots__]  # type: Any
+        elif type(v) is list or type(v) is tuple:
+            fields = v
+        elif type(v) in _OBJECT_CODES:
+            fields = list(_attrs(v).values())
+        else:
+            continue
+        stack.extend([(f, False) for f in reversed(fields)
+                      if not (f is None or type(f) is str or type(f) is int or id(f) in seen)])
+    return order
+
+
+# Encode an AST, proof obligation, or plain value built from them
+def dumps(value: Any) -> bytes:
+    words = array("I")
+    append = words.append
+    strings = {}  # type: Dict[str, int]
+    refs = {}  # type: Dict[int, int]
+    shapes = {}  # type: Dict[Tuple[Any, ...], int]
+
+    def string(s: str) -> int:
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    def add(v: Any) -> None:
+        if isinstance(v, AST):
+            append(refs[id(v)] << _TAG_BITS)
+        elif type(v) is str:
+            append(string(v) << _TAG_BITS | _TAG_STR)
+        elif type(v) is list:
+            # refs only holds the ids of live nodes, so any other item is
+            # missing from it
+            try:
+                indices = [refs[id(x)] for x in v]
+            except KeyError:
+                pass
+            else:
+                append(len(v) << _TAG_BITS | _TAG_NODES)
+                words.extend(indices)
+                return
+            append(len(v) << _TAG_BITS | _TAG_LIST)
+            for x in v:
+                add(x)
+        elif type(v) is tuple:
+            append(len(v) << _TAG_BITS | _TAG_TUPLE)
+            for x in v:
+                if isinstance(x, AST):
+                    append(refs[id(x)] << _TAG_BITS)
+                else:
+                    add(x)
+        elif v is None or v is False or v is True:
+            append(_CONSTS.index(v) << _TAG_BITS | _TAG_CONST)
+        elif type(v) is int:
+            if -_INT_LIMIT <= v < _INT_LIMIT:
+                append((2 * v if v >= 0 else -2 * v - 1) << _TAG_BITS | _TAG_INT)
+            else:
+                append(_CONST_BIGINT << _TAG_BITS | _TAG_CONST)
+                append(string(str(v)))
+        elif type(v) in _OBJECT_CODES:
+            attrs = _attrs(v)
+            shape = (type(v),) + tuple(attrs)
+            i = shapes.get(shape)
+            if i is None:
+                i = shapes[shape] = len(shapes)
+                append(i << _TAG_BITS | _TAG_OBJECT)
+                append(_OBJECT_CODES[type(v)])
+                append(len(attrs))
+                words.extend([string(name) for name in attrs])
+            else:
+                append(i << _TAG_BITS | _TAG_OBJECT)
+            for x in attrs.values():
+                if isinstance(x, AST):
+                    append(refs[id(x)] << _TAG_BITS)
+                else:
+                    add(x)
+        else:
+            raise Exception("cannot encode value of type {}".format(type(v).__name__))
+
+    for node in _nodes_postorder(value):
+        code = _NODE_CODES.get(type(node))
+        if code is None:
+            raise Exception("cannot encode {} nodes".format(type(node).__name__))
+        append(code)
+        for f in _NODE_FIELDS[code]:
+            add(getattr(node, f))
+        refs[id(node)] = len(refs)
+    add(value)
+
+    text = [s.encode("utf-8") for s in strings]
+    offsets = array("I", [0])
+    for t in text:
+        offsets.append(offsets[-1] + len(t))
+    if not words or max(words) < 1 << 16:
+        words = array("H", words)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        words.byteswap()
+    header = _HEADER.pack(MAGIC, VERSION, words.itemsize, len(text), len(refs), len(words), offsets[-1])
+    # pad the words to a multiple of four bytes
+    padding = b"\0" * (-len(words) * words.itemsize % 4)
+    return b"".join([header, offsets.tobytes(), words.tobytes(), padding] + text)
+
+
+# Decode the value in words, which are read in order
+def _decode(words: Any, strings: List[str], count: int) -> Any:
+    it = iter(words)
+    nxt = it.__next__
+    nodes = []  # type: List[AST]
+    shapes = []  # type: List[Tuple[type, List[str]]]
+
+    # decode the next n values
+    def items(n: int) -> List[Any]:
+        result = []  # type: List[Any]
+        for _ in range(n):
+            w = nxt()
+            result.append(nodes[w >> _TAG_BITS] if w & _TAG_MASK == _TAG_NODE else value(w))
+        return result
+
+    # decode the value whose first word is w
+    def value(w: int) -> Any:
+        tag = w & _TAG_MASK
+        payload = w >> _TAG_BITS
+        if tag == _TAG_NODE:
+            return nodes[payload]
+        elif tag == _TAG_STR:
+            return strings[payload]
+        elif tag == _TAG_NODES:
+            return [nodes[i] for i in islice(it, payload)]
+        elif tag == _TAG_LIST:
+            return [value(nxt()) for _ in range(payload)]
+        elif tag == _TAG_TUPLE:
+            return tuple(items(payload))
+        elif tag == _TAG_INT:
+            return payload >> 1 if not payload & 1 else -(payload >> 1) - 1
+        elif tag == _TAG_CONST:
+            return _CONSTS[payload] if payload != _CONST_BIGINT else int(strings[nxt()])
+        else:
+            if payload == len(shapes):
+                cls = _OBJECT_CLASSES[nxt()]
+                shapes.append((cls, [strings[i] for i in islice(it, nxt())]))
+            cls, names = shapes[payload]
+            # proof objects compute fields in their constructors, so restore
+            # the encoded fields directly
+            obj = object.__new__(cls)
+            obj.__dict__.update(zip(names, items(len(names))))
+            return obj
+
+    for _ in range(count):
+        code = nxt()
+        args = []  # type: List[Any]
+        for _ in _NODE_FIELDS[code]:
+            w = nxt()
+            tag = w & _TAG_MASK
+            if tag == _TAG_NODE:
+                args.append(nodes[w >> _TAG_BITS])
+            elif tag == _TAG_STR:
+                args.append(strings[w >> _TAG_BITS])
+            else:
+                args.append(value(w))
+        nodes.append(_NODE_CLASSES[code](*args))
+    return value(nxt())
+
+
+# Decode a value encoded by dumps from bytes, a memoryview, an mmap, or any
+# other object supporting the buffer protocol
+def loads(buf: Any) -> Any:
+    with memoryview(buf) as mv:
+        if mv.nbytes < _HEADER.size:
+            raise Exception("truncated encoding")
+        magic, version, width, nstrings, nnodes, nwords, nbytes = _HEADER.unpack_from(mv)
+        if magic != MAGIC:
+            raise Exception("not an encoded AST")
+        if version != VERSION:
+            raise Exception("encoded AST has version {}, expected {}".format(version, VERSION))
+        start = _HEADER.size
+        if width not in _WORD_TYPES:
+            raise Exception("encoded AST has invalid word size {}".format(width))
+        words_start = start + 4 * (nstrings + 1)
+        words_end = words_start + width * nwords
+        text_start = words_end + (-words_end % 4)
+        if mv.nbytes != text_start + nbytes:
+            raise Exception("truncated encoding")
+        raw = mv.cast("B")
+        views = [raw]
+        try:
+            offsets = raw[start:words_start].cast("I")  # type: Any
+            words = raw[words_start:words_end].cast(_WORD_TYPES[width])  # type: Any
+            text = raw[text_start:]
+            views += [offsets, words, text]
+            if sys.byteorder != "little":
+                offsets = array("I", offsets)
+                offsets.byteswap()
+                words = array(_WORD_TYPES[width], words)
+                words.byteswap()
+            strings = [str(text[offsets[i]:offsets[i + 1]], "utf-8") for i in range(nstrings)]
+            return _decode(words, strings, nnodes)
+        finally:
+            # release our views, so that the caller can close an mmap
+            for v in reversed(views):
+                v.release()
@@ -17,23 +17,137 @@ import sys
 from typing import Optional, Tuple
 
 from frontend.program import Program
-from frontend.dafny import DafnyRuntime
-from frontend.rosette import RosetteRuntime
+from frontend.runtime import BACKENDS, get_runtime
 
 
-def prove(prog: str, keep=False, path: Optional[str]=None, backend_cls=DafnyRuntime) -> Tuple[bool, str]:
-    p = Program(prog)
+def prove(prog: str, keep=False, path: Optional[str]=None, backend_cls: Optional[type]=None, parse_cache_dir: Optional[str]=None, stream=False, fuzz_budget=0, jobs=1,
+          verdict_cache_dir: Optional[str]=None, verdict_cache_bytes: Optional[int]=None, cache_stats=False, workers=False) -> Tuple[bool, str]:
+    if backend_cls is None:
+        backend_cls = get_runtime("dafny")
 
+    parse_cache = None
+    if parse_cache_dir is not None:
+        from frontend.parse_cache import ParseCache
+        parse_cache = ParseCache(parse_cache_dir or None)
+
+    p = Program(prog, parse_cache)
+
+    backend = new_backend(backend_cls, p, keep, path, fuzz_budget)
+    if verdict_cache_dir is not None:
+        from frontend.verdict_cache import VerdictCache
+        backend.cache = VerdictCache(backend, verdict_cache_dir or None, verdict_cache_bytes)
+    if workers:
+        backend.workers = backend.new_workers(jobs)
+
+    try:
+        if stream:
+            return prove_each(backend, jobs)
+        return prove_all(backend, jobs)
+    finally:
+        if backend.workers is not None:
+            backend.workers.close()
+        if backend.cache is not None:
+            if cache_stats:
+                print(backend.cache.stats())
+            backend.cache.close()
+
+
+# a backend of class backend_cls for the program p, set up to keep its
+# output files or not, search path for binaries, and fuzz each obligation
+def new_backend(backend_cls: type, p: Program, keep=False, path: Optional[str]=None, fuzz_budget=0):
     backend = backend_cls(p)
     backend.collapse_top_level_exprs = False
     backend.output_path = os.path.dirname(os.path.realpath(__file__)) if keep else None
     if path is not None:
         backend.add_path(path)
+    if fuzz_budget > 0:
+        from frontend.fuzz import Fuzzer
+        backend.fuzzer = Fuzzer(fuzz_budget, backend=backend.semantics, fuel=backend.fuel)
+    return backend
+
+
+# check the proof file at fname now and each time it changes, until
+# interrupted, re-checking only the obligations an edit may affect
+def watch(fname: str, backend_cls: type, keep=False, path: Optional[str]=None, fuzz_budget=0, jobs=1,
+          verdict_cache_dir: Optional[str]=None, verdict_cache_bytes: Optional[int]=None, cache_stats=False, workers=False) -> None:
+    from frontend.watch import Watcher
+    # the cache and workers outlive each run's backend
+    template = new_backend(backend_cls, Program(""), keep, path)
+    cache = None
+    if verdict_cache_dir is not None:
+        from frontend.verdict_cache import VerdictCache
+        cache = VerdictCache(template, verdict_cache_dir or None, verdict_cache_bytes)
+    pool = template.new_workers(jobs) if workers else None
+    def setup(p: Program):
+        backend = new_backend(backend_cls, p, keep, path, fuzz_budget)
+        backend.cache = cache
+        backend.workers = pool
+        return backend
+    try:
+        Watcher(fname, setup, jobs).watch()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.close()
+        if cache is not None:
+            if cache_stats:
+                print(cache.stats())
+            cache.close()
+
+
+# check the obligations in one backend run, or on up to jobs runs at a time
+def prove_all(backend, jobs: int) -> Tuple[bool, str]:
+    # the backend only checks the obligations the fuzzer found no
+    # counterexample to and that weren't verified before
+    backend.compile(False, split=jobs > 1)
+    for cex in backend.fuzz_failures:
+        print(cex)
+        print("")
+    for prf, out in backend.cache_hits:
+        sys.stdout.write(out)
+    if backend.cache_hits:
+        print("{} obligation(s) verified before, not checked again".format(len(backend.cache_hits)))
+    sys.stdout.flush()
+
+    if jobs > 1:
+        success, fname = prove_units(backend, jobs)
+    elif backend.cache is not None and not backend.cache_pending:
+        # nothing left to check
+        backend.program_file.discard()
+        success, fname = True, ""
+    else:
+        success, out, fname = backend.run(verbose=True)
 
-    backend.compile(False)
+    return success and not backend.fuzz_failures, fname
 
-    success, out, fname = backend.run(verbose=True)
 
+# check the obligations compile(split=True) emitted on up to jobs backend
+# processes at a time, printing their output in order, as one run would
+def prove_units(backend, jobs: int) -> Tuple[bool, str]:
+    success, fname = True, ""
+    for prf, succ, out, f in backend.run_units(jobs):
+        sys.stdout.write(out)
+        sys.stdout.flush()
+        if success:
+            fname = f  # the first failing script, or else the last one
+        success = success and succ
+    return success, fname
+
+
+# check each obligation separately, reporting each verdict as soon as it's known
+def prove_each(backend, jobs=1) -> Tuple[bool, str]:
+    success, fname = True, ""
+    for i, (prf, succ, out, f) in enumerate(backend.check_each(jobs=jobs)):
+        # obligations verified before have no script
+        verdict = ("ok" if f else "ok (cached)") if succ else "FAILED"
+        print("obligation {} ({}): {}".format(i + 1, type(prf).__name__, verdict))
+        sys.stdout.flush()
+        if not succ:
+            print(out)
+        if success:
+            fname = f  # the first failing script, or else the last one
+        success = success and succ
     return success, fname
 
 
@@ -42,11 +156,44 @@ def main():
     ap.add_argument("program", help="either (a) a path to a UC file, (b) a verbatim UC program, or (c) - to read from stdin")
     ap.add_argument("-k", "--keep-file", help="keep the dafny output file", action="store_true")
     ap.add_argument("-v", "--verbose", help="print backend output", action="store_true")
-    ap.add_argument("-b", "--backend", choices=["dafny", "rosette"], help="logical backend to use", default="dafny")
+    ap.add_argument("-b", "--backend", choices=BACKENDS, help="logical backend to use", default="dafny")
     ap.add_argument("--path", help="additional path to search for logical backend binaries (racket/dafny)")
+    ap.add_argument("--stream", help="check each obligation separately, reporting verdicts as soon as they are known", action="store_true")
+    ap.add_argument("-j", "--jobs", metavar="N", type=int, default=1, help="check each obligation in a backend run of its own, with up to N runs at a time (0 for one per CPU)")
+    ap.add_argument("--watch", help="check the program file again each time it changes, re-checking only the obligations that read an edited definition", action="store_true")
+    ap.add_argument("--workers", help="check obligations on up to N (see -j) persistent backend processes with the backend's library loaded, rather than a new process each (rosette only)", action="store_true")
+    ap.add_argument("--verify-library", help="first verify the backend library the proofs rely on, unless this version of it was verified before (dafny only)", action="store_true")
+    ap.add_argument("--fuzz-budget", metavar="N", type=int, default=0, help="method calls to try on each equivalence proof with the reference interpreter, following the backend's semantics, looking for a counterexample, before the backend checks it (default 0, to not fuzz)")
+    ap.add_argument("--parse-cache", metavar="DIR", nargs="?", const="", help="cache parsed statements on disk (in DIR, default ~/.cache/quivela)")
+    ap.add_argument("--no-cache", help="check every obligation, even those verified before", action="store_true")
+    ap.add_argument("--cache-size", metavar="MB", type=int, help="cap on the size of the cache of verified obligations in ~/.cache/quivela, evicting the least recently used first (default 64)")
+    ap.add_argument("--cache-stats", help="report verdict cache hits, misses, and size", action="store_true")
+    ap.add_argument("--startup-bench", help="report frontend start-up latency for the program instead of running the backend", action="store_true")
     args = ap.parse_args()
 
-    runtime = RosetteRuntime if args.backend == "rosette" else DafnyRuntime
+    runtime = get_runtime(args.backend)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    cache_dir = None if args.no_cache else ""
+    cache_bytes = args.cache_size and args.cache_size * 1024 * 1024
+
+    if args.workers and args.backend != "rosette":
+        ap.error("--workers needs the rosette backend")
+    if args.verify_library and args.backend != "dafny":
+        ap.error("--verify-library needs the dafny backend")
+
+    if args.verify_library:
+        succ, out = new_backend(runtime, Program(""), path=args.path).verify_library()
+        if not succ:
+            sys.stdout.write(out)
+            print("The Dafny backend library failed to verify")
+            sys.exit(1)
+
+    if args.watch:
+        if not os.path.exists(args.program):
+            ap.error("--watch needs a program file")
+        watch(args.program, runtime, keep=args.keep_file, path=args.path, fuzz_budget=args.fuzz_budget, jobs=jobs,
+              verdict_cache_dir=cache_dir, verdict_cache_bytes=cache_bytes, cache_stats=args.cache_stats, workers=args.workers)
+        sys.exit(0)
 
     if args.program == "-":
         sbl = sys.stdin.read()
@@ -56,18 +203,25 @@ def main():
             sbl = f.read()
     else:
         sbl = args.program
-    
-    succ, fname = prove(sbl, keep=args.keep_file, path=args.path, backend_cls=runtime)
+
+    if args.startup_bench:
+        from frontend.startup import print_startup_bench
+        print_startup_bench(sbl, args.backend)
+        sys.exit(0)
+
+    succ, fname = prove(sbl, keep=args.keep_file, path=args.path, backend_cls=runtime, parse_cache_dir=args.parse_cache, stream=args.stream, fuzz_budget=args.fuzz_budget, jobs=jobs,
+                        verdict_cache_dir=cache_dir, verdict_cache_bytes=cache_bytes,
+                        cache_stats=args.cache_stats, workers=args.workers)
 
     if succ:
         print("Success!")
     else:
         print("FAILED!")
     
-    if args.keep_file:
+    if args.keep_file and fname:
         print("  Script: " + fname)
     
-    if args.verbose:
+    if args.verbose and fname:
         with open(fname) as f:
             print("")
             print("Script:")
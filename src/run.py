@@ -17,12 +17,19 @@ import sys
 from typing import Optional, Tuple
 
 from frontend.program import Program
-from frontend.dafny import DafnyRuntime
-from frontend.rosette import RosetteRuntime
+from frontend.runtime import RUN_BACKENDS, get_runtime
         
 
-def run(prog: str, keep=False, init_ctx: Optional[Tuple[str,str]]=None, expect: Optional[str]=None, verbose=False, path:Optional[str]=None, backend_cls=DafnyRuntime):
-    p = Program(prog)
+def run(prog: str, keep=False, init_ctx: Optional[Tuple[str,str]]=None, expect: Optional[str]=None, verbose=False, path:Optional[str]=None, backend_cls: Optional[type]=None, parse_cache_dir: Optional[str]=None):
+    if backend_cls is None:
+        backend_cls = get_runtime("dafny")
+
+    parse_cache = None
+    if parse_cache_dir is not None:
+        from frontend.parse_cache import ParseCache
+        parse_cache = ParseCache(parse_cache_dir or None)
+
+    p = Program(prog, parse_cache)
     p.initial_context = init_ctx
     p.expected_return = expect
 
@@ -40,7 +47,7 @@ def run(prog: str, keep=False, init_ctx: Optional[Tuple[str,str]]=None, expect:
     
     print(out)
     
-    if verbose:
+    if verbose and fname is not None:
         with open(fname) as f:
             print("")
             print("Script:")
@@ -55,12 +62,12 @@ def main():
     ap.add_argument("-k", "--keep-file", help="keep the backend output file", action="store_true")
     ap.add_argument("-e", "--expect", help="expectation for the final result")
     ap.add_argument("-v", "--verbose", help="print backend output", action="store_true")
-    ap.add_argument("-b", "--backend", choices=["dafny", "rosette"], help="logical backend to use", default="dafny")
+    ap.add_argument("-b", "--backend", choices=RUN_BACKENDS, help="logical backend to use (python runs the program with the reference interpreter)", default="dafny")
     ap.add_argument("--path", help="additional path to search for logical backend binaries (racket/dafny)")
+    ap.add_argument("--parse-cache", metavar="DIR", nargs="?", const="", help="cache parsed statements on disk (in DIR, default ~/.cache/quivela)")
+    ap.add_argument("--startup-bench", help="report frontend start-up latency for the program instead of running the backend", action="store_true")
     args = ap.parse_args()
 
-    runtime = RosetteRuntime if args.backend == "rosette" else DafnyRuntime
-
     init_ctx = None
     if args.program == "-":
         sbl = sys.stdin.read()
@@ -70,10 +77,17 @@ def main():
             sbl = f.read()
     else:
         sbl = args.program
+
+    if args.startup_bench:
+        from frontend.startup import print_startup_bench
+        print_startup_bench(sbl, args.backend)
+        sys.exit(0)
+
+    runtime = get_runtime(args.backend)
     
-    succ, fname = run(sbl, keep=args.keep_file, expect=args.expect, verbose=args.verbose, path=args.path, backend_cls=runtime)
+    succ, fname = run(sbl, keep=args.keep_file, expect=args.expect, verbose=args.verbose, path=args.path, backend_cls=runtime, parse_cache_dir=args.parse_cache)
 
-    if args.keep_file:
+    if args.keep_file and fname is not None:
         print("  Dafny file: " + fname)
     
     sys.exit(0 if succ else 1)
@@ -0,0 +1,123 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import pickle
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import frontend.ast
+from frontend.analysis import GatherObjectInfo
+from frontend.ast import *
+from bench.membench import iter_nodes, synthetic_program
+from frontend.program import Program
+
+
+def _ast_classes():
+    for v in vars(frontend.ast).values():
+        if isinstance(v, type) and issubclass(v, AST):
+            yield v
+
+def test_nodes_have_no_dict():
+    for cls in _ast_classes():
+        assert "__slots__" in vars(cls), cls.__name__
+    ast = Program(synthetic_program(3)).ast
+    kinds = set()
+    for n in iter_nodes(ast):
+        assert not hasattr(n, "__dict__"), type(n).__name__
+        kinds.add(type(n))
+    assert {BlockNode, CallNode, CompoundVarNode, InitNode, NewNode, MethodNode, ITENode, TupleNode} <= kinds
+
+
+def test_structurally_equal_nodes_are_shared():
+    a = CallNode(ConstNil, "CpaC", [VarNode("e")])
+    b = CallNode(ConstNode(NilNode()), "Cpa" + "C", [VarNode("e")])
+    assert a is b and hash(a) == hash(b)
+    assert CallNode(ConstNil, "CpaC", [VarNode("f")]) is not a
+    assert InitNode("x", ConstNil, True) is not InitNode("x", ConstNil, False)
+    ast = Program("A() { new(k=0) { f() { k } } }\nA() ~ A()\nB() { new(k=0) { f() { k } } }").ast
+    assert ast.children[0].body is ast.children[2].body
+
+def test_transformer_does_not_modify_shared_nodes():
+    class Renamer(ASTTransformer):
+        def visit_VarNode(self, node):
+            return VarNode(node.name.upper()) if node.name == "x" else node
+    shared = SeqNode(VarNode("x"), VarNode("y"))
+    outer = SeqNode(shared, VarNode("z"))
+    new = Renamer().visit(outer)
+    assert str(shared) == "<SeqNode <VarNode 'x'> <VarNode 'y'>>"
+    assert new is SeqNode(SeqNode(VarNode("X"), VarNode("y")), VarNode("z"))
+    # unchanged subtrees are returned as they are
+    assert Renamer().visit(SeqNode(VarNode("a"), outer)).e2 is new
+    assert Renamer().visit(shared.e2) is shared.e2
+
+def test_pickled_nodes_are_shared():
+    ast = Program("A() { new(k=0) { f() { k } } }\nA() ~ A()").ast
+    assert pickle.loads(pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)) is ast
+
+def test_serialization_is_cached_and_rewritten_nodes_reserialize():
+    class Renamer(ASTTransformer):
+        def visit_VarNode(self, node):
+            return VarNode("y") if node.name == "x" else node
+    inner = CallNode(ConstNil, "f", [VarNode("x")])
+    outer = SeqNode(inner, VarNode("z"))
+    sexp, dafny = outer.to_sexp(), outer.to_dafny()
+    assert outer.to_sexp() is sexp and outer.to_dafny() is dafny
+    new = Renamer().visit(outer)
+    assert "'y" in new.to_sexp() and "'x" not in new.to_sexp()
+    assert '"y"' in new.to_dafny() and '"x"' not in new.to_dafny()
+    assert outer.to_sexp() is sexp
+    assert new.to_sexp() == "(ESeq (ECall (EConst (Nil)) 'f (list (EVar 'y))) (EVar 'z))"
+
+def test_transformer_visits_deep_chains():
+    class Renamer(ASTTransformer):
+        def visit_VarNode(self, node):
+            return VarNode("y") if node.name == "x" else node
+    chain = VarNode("x")
+    for i in range(50000):
+        chain = SeqNode(chain, VarNode("z"))
+    new = Renamer().visit(chain)
+    while isinstance(new, SeqNode):
+        assert new.e2 is VarNode("z")
+        new = new.e1
+    assert new is VarNode("y")
+
+def test_transformer_state_holds_ancestors():
+    class Ancestors(ASTTransformer):
+        def __init__(self):
+            super().__init__()
+            self.seen = {}
+        def visit_SurfaceAST(self, node):
+            self.state.append("surface")
+            return node
+        def visit_MethodNode(self, node):
+            self.state.append(node.name)
+            return node
+        def visit_VarNode(self, node):
+            self.seen[node.name] = list(self.state)
+            return node
+    ast = Program("f(a) { g(b) { c } & d } & e\nassert h").ast
+    v = Ancestors()
+    v.visit(ast)
+    # the top level and the assertion are both surface nodes
+    assert v.seen == {"a": ["surface", "f"], "b": ["surface", "f", "g"], "c": ["surface", "f", "g"],
+                      "d": ["surface", "f"], "e": ["surface"], "h": ["surface", "surface"]}
+    assert v.state == []
+    # object info is still gathered per (named or anonymous) object
+    info = GatherObjectInfo()
+    ast = Program("A() { new(x=0) { f() { new(y=1) { g() { y } } } } }").ast
+    info.visit(ast)
+    assert info.get_fields(CallNode(ConstNil, "A", [])) == ["x"]
+    assert sorted(info.get_methods(CallNode(ConstNil, "A", []))) == ["f"]
+    assert info.get_fields(CallNode(ConstNil, "f", [])) == ["y"]
+    assert sorted(info.get_methods(CallNode(ConstNil, "f", []))) == ["g"]
@@ -0,0 +1,76 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import io
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.ast import *
+from frontend.program import Program
+from frontend.dafny.emitter import DafnyEmitter
+from frontend.rosette.emitter import RosetteEmitter
+from frontend.rosette.runtime import RosetteRuntime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Sink(object):
+    def __init__(self):
+        self.writes = []
+    def write(self, text):
+        self.writes.append(text)
+
+def test_emitting_to_a_sink_matches_to_program():
+    with open(os.path.join(ROOT, "proofs", "rewrite.sbl")) as f:
+        src = f.read()
+    for cls in (DafnyEmitter, RosetteEmitter):
+        sink = _Sink()
+        streamed, batch = cls(out=sink), cls()
+        for p in Program(src).generate_proof_obligations():
+            streamed.emit_proof(p)
+            batch.emit_proof(p)
+        streamed.finish()
+        assert "".join(sink.writes) == batch.to_program()
+        # the context is written piece by piece, not as one string
+        assert max(len(w) for w in sink.writes) < len(src)
+
+def test_long_terms_serialize_without_recursion():
+    n = 20000
+    tup = TupleNode([ConstNode(IntNode(i)) for i in range(n)])
+    assert tup.to_dafny().endswith("Cons(EConst(Int(19999)), LNil" + ")" * (n + 1))
+    assert tup.to_sexp().startswith("(ETuple (list (EConst (Int 0)) (EConst (Int 1))")
+    seq = VarNode("x0")
+    for i in range(1, n):
+        seq = SeqNode(seq, VarNode("x{}".format(i)))
+    out = io.StringIO()
+    seq.write_sexp(out)
+    assert out.getvalue() == "(ESeq " * (n - 1) + "(EVar 'x0) " + ") ".join("(EVar 'x{})".format(i) for i in range(1, n)) + ")"
+    # writing a sequence doesn't cache a string for each prefix of it
+    assert not hasattr(seq, "_sexp") and not hasattr(seq.e1, "_sexp")
+    assert hasattr(seq.e2, "_sexp")
+    assert seq.to_dafny().startswith("ESeq(" * (n - 1) + 'EVar("x0"), EVar("x1"))')
+
+def test_run_writes_program_to_file(tmpdir):
+    src = "x = 1\nassert x == 1"
+    with tmpdir.as_cwd():
+        r = RosetteRuntime(Program(src))
+        r.output_path = str(tmpdir)
+        r.compile(True)
+        fname = r.finish_program()
+        e = RosetteEmitter()
+        for p in Program(src).generate_evaluate_obligations():
+            e.emit_proof(p)
+        with open(fname) as f:
+            assert f.read() == e.to_program()
+        assert os.listdir(str(tmpdir)) == [os.path.basename(fname)]
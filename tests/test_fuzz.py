@@ -0,0 +1,91 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.dafny.runtime import DafnyRuntime
+from frontend.fuzz import Fuzzer
+from frontend.program import Program
+from frontend.proof import EquivalenceProof
+from frontend.python.interpreter import DAFNY, ROSETTE
+from frontend.rosette.runtime import RosetteRuntime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_fuzzer_finds_broken_steps():
+    fuzzer = Fuzzer(1000)
+    prf, = Program(_read(os.path.join(ROOT, "proofs", "inc-fail.sbl"))).iter_proof_obligations()
+    cex = fuzzer.counterexample(prf)
+    assert cex is not None and cex.lhs_ret != cex.rhs_ret
+    assert str(cex).startswith("FAILED (found by fuzzing):")
+    # a step that only returns references can't be told apart this way
+    src = "new() { f() { new() { } } } ~ new() { f() { new() { }  new() { } } }"
+    prf, = Program(src).iter_proof_obligations()
+    assert fuzzer.counterexample(prf) is None
+    assert Fuzzer(0).counterexample(prf) is None
+
+def test_fuzzer_follows_the_backend():
+    # eval.rkt divides exactly, so this step holds in Rosette, but not with
+    # Lang.dfy's integer division
+    prf, = Program("new() { f(x) { (x / 2) * 2 } } ~ new() { f(x) { (x * 2) / 2 } }").iter_proof_obligations()
+    assert Fuzzer(1000, backend=ROSETTE).counterexample(prf) is None
+    assert Fuzzer(1000, backend=DAFNY).counterexample(prf) is not None
+    # a global function runs with the caller's `this` in eval.rkt only
+    src = "x = 1\nget() { x }\nnew(x=2) { f() { get() } } ~ new(x=2) { f() { 2 } }"
+    prf, = Program(src).iter_proof_obligations()
+    assert Fuzzer(1000, backend=ROSETTE).counterexample(prf) is None
+    assert Fuzzer(1000, backend=DAFNY).counterexample(prf) is not None
+
+def test_fuzzer_uses_the_backends_fuel():
+    # 12 nested additions take more than Dafny's 10 fuel, but not Rosette's 30
+    deep = lambda last: "1 + " * 11 + str(last)
+    prf, = Program("new() { f() { %s } } ~ new() { f() { 12 } }" % deep(1)).iter_proof_obligations()
+    assert Fuzzer(100, backend=ROSETTE, fuel=RosetteRuntime.fuel).counterexample(prf) is None
+    assert Fuzzer(100, backend=DAFNY, fuel=DafnyRuntime.fuel).counterexample(prf) is not None
+    # and Dafny runs out of fuel on both sides of this one
+    prf, = Program("new() { f() { %s } } ~ new() { f() { %s } }" % (deep(1), deep(2))).iter_proof_obligations()
+    assert Fuzzer(100, backend=ROSETTE, fuel=RosetteRuntime.fuel).counterexample(prf) is not None
+    assert Fuzzer(100, backend=DAFNY, fuel=DafnyRuntime.fuel).counterexample(prf) is None
+
+def test_fuzzer_passes_valid_proofs():
+    fuzzer = Fuzzer(200)
+    paths = sorted(glob.glob(os.path.join(ROOT, "proofs", "*.sbl"))) + [os.path.join(ROOT, "..", "proofs", "etm.sbl")]
+    for path in paths:
+        src = _read(path)
+        if "XFAIL" in src:
+            continue
+        for prf in Program(src).iter_proof_obligations():
+            if isinstance(prf, EquivalenceProof):
+                assert fuzzer.counterexample(prf) is None, path
+
+def test_runtime_skips_steps_the_fuzzer_breaks():
+    src = "new() { f() { 1 } } ~ new() { f() { 2 } } ~ new() { f() { 2 } }"
+    runtime = RosetteRuntime(Program(src))
+    runtime.fuzzer = Fuzzer(100)
+    kept = list(runtime.proof_obligations())
+    assert len(kept) == 1 and len(runtime.fuzz_failures) == 1
+    assert runtime.fuzz_failures[0].calls[0][0] == "f"
+    # check_each reports the failure without running the backend
+    runtime = RosetteRuntime(Program(src.rsplit(" ~ ", 1)[0]))
+    runtime.fuzzer = Fuzzer(100)
+    (prf, success, out, fname), = runtime.check_each()
+    assert not success and fname == "" and "LHS returns 1, RHS returns 2" in out
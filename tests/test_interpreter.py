@@ -0,0 +1,91 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import re
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.parser import string_to_ast
+from frontend.program import Program
+from frontend.python import PythonRuntime
+from frontend.python.interpreter import DAFNY, ROSETTE, Interpreter, value_to_string
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run(src, init_ctx=None, expect=None):
+    p = Program(src)
+    p.initial_context = init_ctx
+    p.expected_return = expect
+    runtime = PythonRuntime(p)
+    runtime.compile(True)
+    success, out, fname = runtime.run()
+    assert fname is None
+    return success, out
+
+
+def test_eval_corpus():
+    # the same checks conftest.py's UCEval makes
+    for path in sorted(glob.glob(os.path.join(ROOT, "eval", "*.sbl"))):
+        with open(path) as f:
+            src = f.read()
+        tags = dict(re.findall(r"//\s*([A-Z]+):\s*(.*)", src))
+        ctx = list(map(str.strip, tags["CONTEXT"].split("="))) if "CONTEXT" in tags else None
+        success, out = _run(src, ctx, tags["EXPECT"])
+        assert success == ("XFAIL" not in tags), (path, out)
+
+def test_output_matches_the_backends():
+    success, out = _run("x = new() { get(y) { y } }\nx.get(6)")
+    assert success
+    assert out == "x = new () { get(y) { y };  };  ==> Ref(1)\nx.get(6) ==> 6\n"
+    success, out = _run("m = 0\nm[<1, 2>] = 3\nt = <m, m[<1, 2>], m[4], 7 / -2>\nif 1 == 2 { 3 } else { 4 }")
+    assert out.splitlines() == [
+        "m = 0 ==> 0",
+        "m[<1, 2>] = 3 ==> 3",
+        "t = <m, m[<1, 2>], m[4], 7 / -2> ==> <{<1, 2>: 3}, 3, <error: invalid idx @ m[4]>, -7/2>",
+        "if 1 == 2 { 3 } else { 4 }  ==> 4",
+    ]
+
+def test_failures():
+    success, out = _run("x = 1\nassert x == 2\nx")
+    assert not success and out == "assert failed\n"
+    assert _run("5", expect="6") == (False, "5 ==> 5\nassert failed\n")
+    assert _run("5", expect="Error")[0] is False
+    assert _run("5 / 0", expect="Error")[0] is True
+    # running out of fuel is an error, not a Python RecursionError
+    assert _run("f() { f() }\nf()", expect="Error")[0] is True
+    success, out = _run("a = adversary()")
+    assert not success and "symbolic" in out
+
+def _eval(src, backend):
+    interp = Interpreter(backend=backend)
+    ret = None
+    for e in string_to_ast(src).children:
+        ret = interp.eval(e)
+    return value_to_string(ret)
+
+def test_backend_semantics():
+    # division is exact in eval.rkt, and Euclidean in Lang.dfy
+    assert _eval("(7 / -2) * -2", ROSETTE) == "7"
+    assert _eval("(7 / -2) * -2", DAFNY) == "6"
+    # a global function runs with the caller's `this` in eval.rkt, and with
+    # the globals in Lang.dfy
+    src = "x = 1\nget() { x }\no = new(x=2) { m() { get() } }\no.m()"
+    assert _eval(src, ROSETTE) == "2"
+    assert _eval(src, DAFNY) == "1"
+    # Lang.dfy assigns a field on the object as it was before the rhs
+    src = "o = new(x=0, y=0) { m() { x = (y = 5) } get() { <x, y> } }\no.m()\no.get()"
+    assert _eval(src, ROSETTE) == "<5, 5>"
+    assert _eval(src, DAFNY) == "<5, 0>"
@@ -0,0 +1,100 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.ast import *
+from frontend.parse_cache import ParseCache
+from frontend.statements import split_statements
+from frontend.parser import string_to_ast
+from frontend.program import Program
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _corpus():
+    paths = sorted(glob.glob(os.path.join(ROOT, "*", "*.sbl")))
+    paths.append(os.path.join(ROOT, "..", "proofs", "etm.sbl"))
+    for path in paths:
+        with open(path) as f:
+            yield path, f.read()
+
+def _parse_result(parse, src):
+    try:
+        return str(parse(src))
+    except Exception as e:
+        return "error: {}".format(e)
+
+
+def test_split_statements():
+    assert split_statements("x = 1; y = 2\nz = (3\n+ 4) w") == ["x = 1;", "y = 2", "z = (3\n+ 4)", "w"]
+    assert split_statements("if x { 1 } else { 2 } new() { f() { 1 } }") == \
+        ["if x { 1 } else { 2 }", "new() { f() { 1 } }"]
+    assert split_statements("A() ~ [Equal(x, y)] {{{ a { b } }}} B()  // c") == \
+        ["A() ~ [Equal(x, y)] {{{ a { b } }}} B()"]
+    assert split_statements("x = 1\r\n") is None
+
+
+def test_cached_parse_is_identical(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    for _ in range(2):  # cold, then warm
+        for path, src in _corpus():
+            assert _parse_result(cache.string_to_ast, src) == _parse_result(string_to_ast, src), path
+    assert cache.hits > 0
+
+def test_edited_statement_is_reparsed(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    with open(os.path.join(ROOT, "..", "proofs", "etm.sbl")) as f:
+        src = f.read()
+    cache.string_to_ast(src)
+    misses = cache.misses
+    edited = src.replace("tg[m] = mac.tag(m)", "tg[m] = mac.tag(m + 1)", 1)
+    assert edited != src
+    assert str(cache.string_to_ast(edited)) == str(string_to_ast(edited))
+    assert cache.misses == misses + 1
+    assert str(Program(edited, cache).ast) == str(Program(edited).ast)
+
+def test_errors_match_cold_parse(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    cache.string_to_ast("x = 1\ny = 2")
+    src = "x = 1\ny = 2\n\nz = )"
+    assert "line 4" in _parse_result(cache.string_to_ast, src)
+    assert _parse_result(cache.string_to_ast, src) == _parse_result(string_to_ast, src)
+
+def test_nil_identity(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    for _ in range(2):
+        ast = cache.string_to_ast("x = 1 f(x)")
+        assert ast.children[1].obj is ConstNil
+
+def test_eviction(tmpdir):
+    cache = ParseCache(str(tmpdir), max_bytes=2000)
+    for i in range(200):
+        cache.string_to_ast("x{} = new() {{ f() {{ {} }} }}".format(i, i))
+    count, size = cache.store.usage()
+    assert 0 < count < 200 and size <= 2000
+    # the most recently used statements survive
+    misses = cache.misses
+    cache.string_to_ast("x199 = new() { f() { 199 } }")
+    assert cache.misses == misses
+
+def test_grammar_change_invalidates(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    cache.string_to_ast("x = 1")
+    cache = ParseCache(str(tmpdir))
+    cache.version = "a different grammar"
+    cache.string_to_ast("x = 1")
+    assert cache.hits == 0 and cache.misses == 1
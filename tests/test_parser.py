@@ -0,0 +1,145 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.ast import *
+from frontend.parser import QuivelaParser, get_parser, string_to_ast
+
+
+def test_toplevel_order():
+    ast = string_to_ast("x = 1; y = 2 z = 3")
+    assert [c.lhs.name for c in ast.children] == ["x", "y", "z"]
+
+def test_method_body_order():
+    ast = string_to_ast("new(){foo(x,y){x=y 5 6; 7}}")
+    body = ast.children[0].body.body
+    assert str(body) == ("<BlockNode [<AssignNode <VarNode 'x'> <VarNode 'y'>>, <ConstNode <IntNode 5>>, "
+                         "<ConstNode <IntNode 6>>, <ConstNode <IntNode 7>>]>")
+    # nested blocks are spliced into one
+    assert block([body, NopNode(), body]).exprs == body.exprs + [NopNode()] + body.exprs
+
+def test_proof_chain_order():
+    ast = string_to_ast("A() ~ [Equal(_lhs.x, _rhs.x)] B() ~ C() ~ [Rewrite(x, y)] D()")
+    prf = ast.children[0]
+    assert [t.name for t in prf.terms] == ["A", "B", "C", "D"]
+    assert [h.name if h is not None else None for h in prf.hints] == ["Equal", None, "Rewrite", None]
+
+def test_trailers():
+    ast = string_to_ast("x.f[0] = y.g(1, 2)")
+    assert str(ast.children[0]) == ("<AssignNode <CompoundVarNode <VarNode 'x'> 'f' <ConstNode <IntNode 0>>> "
+                                    "<CallNode <VarNode 'y'> g [<ConstNode <IntNode 1>>, <ConstNode <IntNode 2>>]>>")
+
+def test_deep_nesting():
+    # left-nested binops are far deeper than the Python stack
+    n = 50000
+    ast = string_to_ast(" + ".join("1" for _ in range(n)))
+    depth = 0
+    e = ast.children[0]
+    while isinstance(e, CallNode):
+        depth += 1
+        e = e.args[0]
+    assert depth == n - 1
+
+
+def _time_parse(n):
+    prog = "\n".join("x{} = {}".format(i, i) for i in range(n))
+    start = time.perf_counter()
+    ast = string_to_ast(prog)
+    elapsed = time.perf_counter() - start
+    assert len(ast.children) == n
+    return elapsed
+
+def test_toplevel_scaling():
+    # 10x more statements should take roughly 10x longer;
+    # quadratic list building would take 100x longer
+    small = _time_parse(10000)
+    large = _time_parse(100000)
+    assert large / small < 30
+
+
+def _parse_result(src):
+    try:
+        return str(string_to_ast(src))
+    except Exception as e:
+        return "error: {}".format(e)
+
+def test_parser_instances_are_independent():
+    p1 = QuivelaParser()
+    p2 = QuivelaParser()
+    assert p1.lexer is not p2.lexer and p1.parser is not p2.parser
+    assert get_parser() is get_parser()
+    # state from a failed parse must not leak into the next one
+    for p in (p1, p2):
+        for _ in range(2):
+            try:
+                p.string_to_ast("x = 1\ny = (")
+                assert False
+            except Exception as e:
+                assert "unexpected EOF" in str(e)
+            try:
+                p.string_to_ast("x = 1\n\ny = )")
+                assert False
+            except Exception as e:
+                assert "line 3" in str(e)
+
+def test_threaded_parsing():
+    root = os.path.dirname(os.path.abspath(__file__))
+    programs = []
+    for path in sorted(glob.glob(os.path.join(root, "*", "*.sbl"))):
+        with open(path) as f:
+            programs.append(f.read())
+    programs.append("x = 1\n\ny = )")  # a syntax error, to check error positions too
+    expected = [_parse_result(p) for p in programs]
+
+    nthreads = 32
+    barrier = threading.Barrier(nthreads)
+    failures = []
+    def worker(seed):
+        order = list(range(len(programs)))
+        random.Random(seed).shuffle(order)
+        barrier.wait()
+        for _ in range(3):
+            for i in order:
+                got = _parse_result(programs[i])
+                if got != expected[i]:
+                    failures.append((i, got))
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert failures == []
+
+
+def test_lazy_startup():
+    # importing the frontend must not build the parser or load any backend
+    code = "\n".join([
+        "import sys",
+        "sys.path.insert(0, sys.argv[1])",
+        "import prove, run",
+        "import frontend.parser",
+        "assert frontend.parser._prototypes is None",
+        "assert 'frontend.dafny' not in sys.modules and 'frontend.rosette' not in sys.modules",
+        "frontend.parser.string_to_ast('5 + 6')",
+        "assert frontend.parser._prototypes is not None",
+    ])
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+    subprocess.check_call([sys.executable, "-c", code, src])
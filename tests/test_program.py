@@ -0,0 +1,231 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.ast import *
+from frontend.proof import *
+from frontend.parser import string_to_ast
+from frontend.program import Program
+from frontend.dafny.runtime import DafnyRuntime
+from frontend.rosette.emitter import RosetteEmitter
+from frontend.rosette.runtime import RosetteRuntime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _corpus():
+    paths = sorted(glob.glob(os.path.join(ROOT, "*", "*.sbl")))
+    paths.append(os.path.join(ROOT, "..", "proofs", "etm.sbl"))
+    for path in paths:
+        with open(path) as f:
+            yield path, f.read()
+
+def _emit(proofs):
+    e = RosetteEmitter()
+    for p in proofs:
+        e.emit_proof(p)
+    return e.to_program()
+
+
+def test_streamed_program_matches_batch():
+    for path, src in _corpus():
+        try:
+            expected = str(Program(src).annotate_ast(string_to_ast(src)))
+        except Exception as e:
+            expected = "error: {}".format(e)
+        try:
+            got = str(Program(src).ast)
+        except Exception as e:
+            got = "error: {}".format(e)
+        assert got == expected, path
+
+def test_streamed_obligations_match_batch():
+    for path, src in _corpus():
+        if "/eval/" in path:
+            continue
+        # emitting while obligations are still being produced must not change them
+        streamed = RosetteEmitter()
+        for p in Program(src).iter_proof_obligations():
+            streamed.emit_proof(p)
+        assert streamed.to_program() == _emit(Program(src).generate_proof_obligations()), path
+
+def test_first_obligation_before_parse_completes():
+    src = "A() { new() { f() { 1 } } }\nA() ~ A()\n\nx = )"
+    obligations = Program(src).iter_proof_obligations()
+    assert isinstance(next(obligations), EquivalenceProof)
+    try:
+        next(obligations)
+        assert False
+    except Exception as e:
+        assert "line 4" in str(e)
+
+def test_later_mutation_holds_back_statement():
+    # the assignment to y.f makes f mutable in A, so A's proof must wait for it
+    src = "A() { new(f=1) { get() { f } } }\nA() ~ A()\ny = A()\ny.f = 2"
+    prf = next(Program(src).iter_proof_obligations())
+    assert "(Init 'f (EConst (Int 1)) #f)" in prf.context.to_sexp()
+    src = "A() { new(f=1) { get() { f } } }\nA() ~ A()\ny = A()\ny.g = 2"
+    prf = next(Program(src).iter_proof_obligations())
+    assert "(Init 'f (EConst (Int 1)) #t)" in prf.context.to_sexp()
+
+def _immutable(src):
+    # the immutability of each field, by object (as the name of its first method)
+    ast = Program(src).ast
+    assert str(ast) == str(Program(src).annotate_ast(string_to_ast(src)))
+    result = {}
+    class Gather(ASTTransformer):
+        def visit_NewNode(self, node):
+            name = node.body.name if isinstance(node.body, MethodNode) else node.body.exprs[0].name
+            result[name] = {l.name: l.immutable for l in node.locals}
+            return node
+    Gather().visit(ast)
+    return result
+
+def test_assignments_resolve_to_their_objects():
+    # writing d in A's method leaves B's d alone
+    src = "A() { new(d=0) { w(c) { d[c] = 1 } } }\nB() { new(d=0) { r(c) { d[c] } } }\nA() ~ B()"
+    assert _immutable(src) == {"w": {"d": False}, "r": {"d": True}}
+    # but a.f = 1 may assign the f of any object
+    src = "A() { new(f=0) { g() { f } } }\nB() { new() { m(a) { a.f = 1 } } }\nA() ~ A()"
+    assert _immutable(src)["g"] == {"f": False}
+
+def test_function_assignments_mutate_callers():
+    # set runs with the `this` of the object calling it, so x may be
+    # assigned on any object
+    src = "set(v) { x = v }\nA() { new(x=0) { m() { set(1) } } }\nB() { new(x=0) { n() { x } } }\nA() ~ A()"
+    assert _immutable(src) == {"m": {"x": False}, "n": {"x": False}}
+    # but assigning a global at the top level doesn't
+    src = "x = 1\nA() { new(x=0) { m() { x } } }\nA() ~ A()"
+    assert _immutable(src) == {"m": {"x": True}}
+    # a function defined later holds back the proof
+    src = "A() { new(x=0) { m() { set(1) } } }\nA() ~ A()\nset(v) { x = v }"
+    prf = next(Program(src).iter_proof_obligations())
+    assert "(Init 'x (EConst (Int 0)) #f)" in prf.context.to_sexp()
+
+def test_context_is_sliced_to_what_the_proof_reaches():
+    defs = "Inner() { new() { get() { 1 } } }\nA() { new(n=Inner()) { get() { n.get() } } }\nB() { new() { get() { 2 } } }\n"
+    prf = next(Program(defs + "u = 1 + 2\nA() ~ A()").iter_proof_obligations())
+    # B and the unused global are not needed, Inner is needed through A
+    assert [m.name for m in prf.context.exprs] == ["Inner", "A"]
+    # an object is kept even if the proof never names it: a havoced field or
+    # argument may refer to it, and it shifts the addresses of later objects
+    src = "x = new() { get() { 5 } }\nnew(a=0) { m() { a.get() } } ~ new(a=0) { m() { a.other() } }"
+    prf = next(Program(src).iter_proof_obligations())
+    assert isinstance(prf.context, AssignNode) and prf.context.lhs is VarNode("x")
+    prf = next(Program(defs + "u = adversary()\nA() ~ A()").iter_proof_obligations())
+    assert [type(s).__name__ for s in prf.context.exprs] == ["MethodNode", "MethodNode", "AssignNode"]
+    # a call may assign anything, so it is always kept along with what it calls
+    prf = next(Program(defs + "B()\nA() ~ A()").iter_proof_obligations())
+    assert len(prf.context.exprs) == 4
+    # as is everything when the proof has verbatim text
+    prf = next(Program(defs + "A() ~ [Default()] {{{ assert true; }}} A()").iter_proof_obligations())
+    assert len(prf.context.exprs) == 3
+
+def test_context_is_one_flat_block():
+    n = 5000
+    src = "".join("x{} = {}\n".format(i, i) for i in range(n)) + "assert x0 == 0\nassert x1 == 1"
+    first, second = Program(src).iter_proof_obligations()
+    assert isinstance(first.program, BlockNode) and len(first.program.exprs) == n
+    assert all(isinstance(e, AssignNode) for e in first.program.exprs)
+    # no statements between the assertions, so they share one context
+    assert second.program is first.program
+    assert first.program.to_sexp().startswith("(EBlock (list (EAssign (EVar 'x0) (EConst (Int 0))) ")
+    assert [type(p.program) for p in Program("assert 1\nx = 1\nassert x").iter_proof_obligations()] == [NopNode, AssignNode]
+
+
+class _ExitRuntime(RosetteRuntime):
+    # "checks" a program by failing if it mentions bad
+    def command(self, fname: str) -> str:
+        code = "import sys; sys.exit('bad' in open(sys.argv[1]).read())"
+        return '"{}" -c "{}" "{}"'.format(sys.executable, code, fname)
+
+def test_check_each():
+    src = "A() { 1 } B() { 1 }\nA() ~ B()\nA() ~ [Equal(bad, bad)] B() ~ A()\nassert 1"
+    results = list(_ExitRuntime(Program(src)).check_each())
+    assert [type(p).__name__ for p, _, _, _ in results] == \
+        ["EquivalenceProof", "EquivalenceProof", "EquivalenceProof", "AssertionProof"]
+    assert [s for _, s, _, _ in results] == [True, False, True, True]
+    for _, _, _, fname in results:
+        os.remove(fname)
+
+class _SlowRuntime(RosetteRuntime):
+    # "checks" a program by waiting longer the earlier its proof is, and then
+    # failing if it mentions bad
+    def command(self, fname: str) -> str:
+        code = "import sys, time; s = open(sys.argv[1]).read(); time.sleep(0.4 if 'slow' in s else 0); sys.exit('bad' in s)"
+        return '"{}" -c "{}" "{}"'.format(sys.executable, code, fname)
+
+def test_units_run_on_a_pool_and_report_in_order():
+    src = "A() { 1 } B() { 1 }\n" + "".join("A() ~ [Equal(slow{}, slow)] B()\n".format(i) for i in range(4)) + \
+          "A() ~ [Equal(bad, bad)] B()\nassert 1"
+    runtime = _SlowRuntime(Program(src))
+    runtime.compile(False, split=True)
+    assert len(runtime.units) == 6
+    start = time.perf_counter()
+    results = list(runtime.run_units(jobs=4))
+    # the four slow runs overlap
+    assert time.perf_counter() - start < 1.2
+    assert [p for p, _, _, _ in results] == [p for p, _ in runtime.units]
+    assert [s for _, s, _, _ in results] == [True, True, True, True, False, True]
+    assert results == list(runtime.run_units(jobs=1))
+    streamed = list(_SlowRuntime(Program(src)).check_each(jobs=3))
+    assert [s for _, s, _, _ in streamed] == [True, True, True, True, False, True]
+    for _, _, _, fname in results + streamed:
+        os.remove(fname)
+
+class _LibraryRuntime(DafnyRuntime):
+    # "verifies" the library by logging it to a file and failing if asked
+    # to, and "checks" a program by failing if it mentions bad
+    log = ""
+    library_ok = True
+    version = "1"
+    def executable(self) -> str:
+        return '"{}"'.format(sys.executable)
+    def version_command(self) -> str:
+        return '"{}" -c "print({})"'.format(sys.executable, self.version)
+    def library_command(self) -> str:
+        code = "import sys; open(sys.argv[1], 'a').write('verified'); sys.exit(sys.argv[2] != 'True')"
+        return '"{}" -c "{}" "{}" {}'.format(sys.executable, code, self.log, self.library_ok)
+    def command(self, fname: str) -> str:
+        code = "import sys; sys.exit('bad' in open(sys.argv[1]).read())"
+        return '"{}" -c "{}" "{}"'.format(sys.executable, code, fname)
+
+def test_dafny_library_is_verified_once(tmpdir):
+    _LibraryRuntime.stamp_dir = str(tmpdir)
+    _LibraryRuntime.log = str(tmpdir.join("log"))
+    def verify():
+        success, _ = _LibraryRuntime(Program("")).verify_library()
+        return success, open(_LibraryRuntime.log).read().count("verified")
+    assert verify() == (True, 1)
+    assert verify() == (True, 1)
+    # a new version of dafny verifies it again
+    _LibraryRuntime.version = "2"
+    assert verify() == (True, 2)
+    assert verify() == (True, 2)
+    # a failing library isn't stamped
+    _LibraryRuntime.version = "3"
+    _LibraryRuntime.library_ok = False
+    assert verify() == (False, 3)
+    assert verify() == (False, 4)
+    # proofs don't wait for the library
+    src = "A() { 1 } B() { 1 }\nA() ~ B()\nA() ~ [Equal(bad, bad)] B()"
+    results = list(_LibraryRuntime(Program(src)).check_each(jobs=2))
+    for _, _, _, fname in results:
+        os.remove(fname)
+    assert [s for _, s, _, _ in results] == [True, False]
+    assert open(_LibraryRuntime.log).read().count("verified") == 4
@@ -0,0 +1,133 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import os
+import pickle
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.analysis import GatherObjectInfo, ObjectIndex
+from frontend.ast import *
+from frontend.dafny.emitter import DafnyEmitter
+from frontend.parser import string_to_ast
+from frontend.program import Program
+from frontend.proof import EquivalenceProof
+from frontend.rosette.emitter import RosetteEmitter
+from frontend import wire
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _unchanged(src):
+    return [p.unchanged_methods() for p in Program(src).generate_proof_obligations()]
+
+def _emit(cls, src):
+    e = cls()
+    for p in Program(src).generate_proof_obligations():
+        e.emit_proof(p)
+    return e.to_program()
+
+
+DEFS = """
+A() { new (d=0, k=1) { dec(c) { t = d[c] & <t, c> } enc(m) { d[m] = 1 } key() { k } } }
+B() { new (d=0, k=2) { dec(c) { t = d[c] & <t, c> } enc(m) { d[m] = 2 } key() { k } } }
+"""
+
+def test_identical_methods_on_equal_fields_are_unchanged():
+    assert _unchanged(DEFS + "A() ~ B()") == [["dec", "key"]]
+    # only d is kept equal, so key may differ
+    assert _unchanged(DEFS + "A() ~ [Equal(_lhs.d, _rhs.d)] B()") == [["dec"]]
+    assert _unchanged(DEFS + "A() ~ [true] B()") == [[]]
+
+def test_methods_that_may_differ_are_checked():
+    # reads a global, which the two sides may not agree on
+    assert _unchanged("g = 1\nA() { new (d=0) { f() { d + g } } }\nB() { new (d=0) { f() { d + g } } }\nA() ~ B()") == [[]]
+    # calls other objects and builtins that are not functions of their arguments
+    assert _unchanged("A(e) { new (e) { f() { e.f() } g() { adversary() } } }\nA(1) ~ A(2)") == [[]]
+    # writes a field under an invariant it may break
+    src = "A() { new (d=0) { f(m) { d = m } } }\nA() ~ [invariant() { d == 0 }] A()"
+    assert _unchanged(src) == [[]]
+    # the constructor is defined twice, so we can't tell which one is used
+    assert _unchanged("A() { new (d=0) { f() { d } } }\nA() { new (d=0) { f() { 1 } } }\nA() ~ A()") == [[]]
+
+def test_unchanged_methods_are_recorded_in_output():
+    rosette = _emit(RosetteEmitter, DEFS + "A() ~ [Equal(_lhs.d, _rhs.d)] B()")
+    assert "(check-proof (Equivalent ctx0 lhs0 rhs0 invariants #:unchanged '(dec)" \
+           " #:framed (list (list 'key (list equal_invariant0 'd 'd)))))" in rosette
+    dafny = _emit(DafnyEmitter, DEFS + "A() ~ [Equal(_lhs.d, _rhs.d)] B()")
+    assert "// Equivalence proof for method `dec` (unchanged, not verified)" in dafny
+    assert "lemma {:verify false} equivalent0_dec(" in dafny
+    assert "lemma equivalent0_enc(" in dafny and "lemma equivalent0_key(" in dafny
+
+WIDE = """
+A() { new (a=0, b=0, c=0) { inc() { a = a + 1 } get() { b } sum() { c = add(c) } peek() { o.get(b) } } }
+B() { new (a=0, b=0, c=0) { inc() { a = 1 + a } get() { b + 0 } sum() { c = add(c) + 0 } peek() { o.get(b) + 0 } } }
+add(x) { x + a }
+"""
+
+def _framed(src):
+    return [p.framed_invariants() for p in Program(src).generate_proof_obligations()]
+
+def test_methods_frame_the_fields_they_do_not_touch():
+    # add runs with its caller's `this`, so sum reads a; o may be nil, so o.get
+    # counts as a call to get
+    assert _framed(WIDE + "A() ~ B()") == [{"inc": [1, 2], "get": [0, 2], "sum": [1], "peek": [0, 2]}]
+    assert _framed(WIDE + "A() ~ [Equal(_lhs.b, _rhs.b) & invariant() { c }] B()") == [{"inc": [0], "sum": [0]}]
+    # a function defined twice may be either
+    assert _framed(WIDE + "add(x) { x }\nA() ~ B()") == [{"inc": [1, 2], "get": [0, 2], "peek": [0, 2]}]
+    # methods that create objects may do anything
+    assert _framed("A() { new (a=0, b=0) { f() { new () { } } } }\nA() ~ [Equal(_lhs.a, _rhs.a)] A()") == [{}]
+
+def test_framed_invariants_are_passed_to_the_backend():
+    rosette = _emit(RosetteEmitter, WIDE + "A() ~ [Equal(_lhs.a, _rhs.a) & Equal(_lhs.b, _rhs.b)] B()")
+    assert "#:framed (list (list 'get (list equal_invariant0 'a 'a)) (list 'inc (list equal_invariant1 'b 'b))" \
+           " (list 'peek (list equal_invariant0 'a 'a)) (list 'sum (list equal_invariant1 'b 'b))))" in rosette
+
+
+def test_object_index_matches_walking_the_context():
+    paths = sorted(glob.glob(os.path.join(ROOT, "*", "*.sbl")))
+    paths.append(os.path.join(ROOT, "..", "proofs", "etm.sbl"))
+    for path in paths:
+        with open(path) as f:
+            proofs = Program(f.read()).generate_proof_obligations()
+        for prf in proofs:
+            if not isinstance(prf, EquivalenceProof):
+                continue
+            v = GatherObjectInfo()
+            for t in (prf.context, prf.lhs, prf.rhs):
+                v.visit(t)
+            for side in (prf.lhs, prf.rhs):
+                assert prf.objects.get_methods(side) == v.get_methods(side), path
+                assert prf.objects.get_fields(side) == v.get_fields(side), path
+
+def test_object_index_snapshots_and_layers():
+    index = ObjectIndex()
+    for n in string_to_ast("A() { new (x=0, y=1) { f() { x } } }\ng = A()").children:
+        index.add(n)
+    a = CallNode(ConstNil, "A", [])
+    before = index.snapshot()
+    layer = before.layer(*string_to_ast("A() { new (x=0, y=1) { g(v) { y = v } } }").children)
+    index.add(string_to_ast("h = 1").children[0])
+    assert sorted(layer.get_methods(a)) == ["f", "g"]
+    assert sorted(before.get_methods(a)) == ["f"] and layer.get_mutable_fields(a) == ["y"]
+    assert before.get_mutable_fields(a) == [] and before.definition_count("A") == 1
+    assert layer.definition_count("A") == 2
+    assert index.is_global("h") and not before.is_global("h") and layer.is_global("g")
+
+def test_object_index_is_not_encoded():
+    prf = Program(DEFS + "A() ~ B()").generate_proof_obligations()[0]
+    assert prf.objects is not None
+    for decoded in (pickle.loads(pickle.dumps(prf)), wire.loads(wire.dumps(prf))):
+        assert "_objects" not in vars(decoded) or decoded._objects is None
+        assert decoded.unchanged_methods() == prf.unchanged_methods() == ["dec", "key"]
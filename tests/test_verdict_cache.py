@@ -0,0 +1,83 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.program import Program
+from frontend.rosette.runtime import RosetteRuntime
+from frontend.verdict_cache import VerdictCache
+from prove import prove
+
+SRC = "A() { 1 } B() { 1 }\nA() ~ B()\nA() ~ [Equal(bad, bad)] B()\nassert 1"
+
+
+class _CountingRuntime(RosetteRuntime):
+    runs = 0
+    flags = ""
+
+    # "checks" a program by failing if it mentions bad, counting the runs
+    def command(self, fname: str) -> str:
+        code = "import sys; sys.exit('bad' in open(sys.argv[1]).read())"
+        return '"{}" -c "{}" {} "{}"'.format(sys.executable, code, self.flags, fname)
+
+    def version_command(self) -> str:
+        return '"{}" --version'.format(sys.executable)
+
+    def start(self, fname, verbose=False):
+        _CountingRuntime.runs += 1
+        return super().start(fname, verbose)
+
+def _check_each(tmpdir, cls=_CountingRuntime):
+    runtime = cls(Program(SRC))
+    runtime.cache = VerdictCache(runtime, str(tmpdir))
+    _CountingRuntime.runs = 0
+    results = [(s, f) for _, s, _, f in runtime.check_each()]
+    for _, fname in results:
+        if fname:
+            os.remove(fname)
+    return [s for s, _ in results], [bool(f) for _, f in results], _CountingRuntime.runs
+
+def test_verified_obligations_are_not_checked_again(tmpdir):
+    assert _check_each(tmpdir) == ([True, False, True], [True, True, True], 3)
+    # the failure is checked again
+    assert _check_each(tmpdir) == ([True, False, True], [False, True, False], 1)
+
+def test_backend_flags_are_part_of_the_key(tmpdir):
+    class Flagged(_CountingRuntime):
+        flags = "--flag"
+    _check_each(tmpdir)
+    assert _check_each(tmpdir, Flagged)[2] == 3
+
+def test_prove_reuses_verdicts_of_one_run(tmpdir):
+    src = "A() { 1 } B() { 1 }\nA() ~ B()\nassert 1"
+    for jobs, runs in ((1, 1), (1, 0), (2, 0)):
+        _CountingRuntime.runs = 0
+        assert prove(src, backend_cls=_CountingRuntime, jobs=jobs, verdict_cache_dir=str(tmpdir))[0]
+        assert _CountingRuntime.runs == runs
+    # a new obligation is checked on its own
+    _CountingRuntime.runs = 0
+    assert prove(src + "\nassert 2", backend_cls=_CountingRuntime, verdict_cache_dir=str(tmpdir))[0]
+    assert _CountingRuntime.runs == 1
+
+def test_eviction(tmpdir):
+    runtime = _CountingRuntime(Program(""))
+    cache = VerdictCache(runtime, str(tmpdir), max_bytes=2000)
+    cache.put_many(("k{}".format(i), "x" * 150) for i in range(10))
+    cache.get("k0")
+    cache.put_many(("k{}".format(i), "x" * 150) for i in range(10, 20))
+    count, size = cache.store.usage()
+    assert 0 < count < 20 and size <= 2000
+    # the least recently used go first
+    assert cache.get("k0") is not None and all(cache.get("k{}".format(i)) is not None for i in range(10, 20))
@@ -0,0 +1,53 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.rosette.runtime import RosetteRuntime
+from frontend.watch import Watcher, reads
+
+SRC = """
+A() { new (x=0) { f() { x } } }
+B() { new (x=0) { f() { x + 0 } } }
+C() { new () { g() { %s } } }
+D() { new () { g() { 1 } } }
+A() ~ B()
+C() ~ D()
+assert 1
+"""
+
+
+class _ExitRuntime(RosetteRuntime):
+    # "checks" a program by failing if it mentions bad
+    def command(self, fname: str) -> str:
+        code = "import sys; sys.exit('bad' in open(sys.argv[1]).read())"
+        return '"{}" -c "{}" "{}"'.format(sys.executable, code, fname)
+
+def test_only_obligations_reading_an_edit_are_checked_again(tmpdir):
+    path = str(tmpdir.join("proof.sbl"))
+    watcher = Watcher(path, _ExitRuntime)
+    def check(body):
+        with open(path, "w") as f:
+            f.write(SRC % body)
+        rows, changed = watcher.check()
+        return [(r.success, r.checked) for r in rows], changed
+    results, _ = check("1")
+    assert results == [(True, True), (True, True), (True, True)]
+    # assertions are not sliced, so they read every definition
+    assert [reads(r.prf) for r in watcher.check()[0]] == [["A", "B"], ["C", "D"], ["A", "B", "C", "D"]]
+    assert check("1") == ([(True, False), (True, False), (True, False)], [])
+    assert check("bad") == ([(True, False), (False, True), (False, True)], ["C"])
+    # failures are remembered too
+    assert check("bad") == ([(True, False), (False, False), (False, False)], [])
@@ -0,0 +1,102 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import glob
+import mmap
+import os
+import pickle
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import frontend.ast
+from frontend.ast import *
+from frontend.proof import *
+from frontend.program import Program
+from frontend.rosette.emitter import RosetteEmitter
+from frontend import wire
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _emit(proofs):
+    e = RosetteEmitter()
+    for p in proofs:
+        e.emit_proof(p)
+    return e.to_program()
+
+
+def test_every_node_class_is_encodable():
+    classes = set(v for v in vars(frontend.ast).values()
+                  if isinstance(v, type) and issubclass(v, AST) and v not in (AST, SurfaceAST, Value))
+    assert classes <= set(wire._NODE_CLASSES)
+
+def test_values_round_trip():
+    values = [None, True, False, 0, -1, 7, 2**28 - 1, -2**28, 2**28, -10**30, "", "xé",
+              [], (), [None, "a", [1, (2, 3)]], ConstNil, [VarNode("x"), VarNode("x")]]
+    for v in values:
+        assert wire.loads(wire.dumps(v)) == v
+    assert wire.loads(wire.dumps(ConstNil)) is ConstNil
+
+def test_programs_round_trip():
+    paths = sorted(glob.glob(os.path.join(ROOT, "proofs", "*.sbl")))
+    paths.append(os.path.join(ROOT, "..", "proofs", "etm.sbl"))
+    for path in paths:
+        with open(path) as f:
+            src = f.read()
+        prog = Program(src)
+        data = wire.dumps(prog.ast)
+        # hash-consing makes the decoded AST the very same nodes
+        assert wire.loads(data) is prog.ast, path
+        proofs = prog.generate_proof_obligations()
+        decoded = wire.loads(wire.dumps(proofs))
+        assert [type(p) for p in decoded] == [type(p) for p in proofs], path
+        assert _emit(decoded) == _emit(proofs), path
+
+def test_shared_subtrees_are_encoded_once():
+    stmt = AssignNode(VarNode("x"), CallNode(ConstNil, "+", [VarNode("x"), ConstNode(IntNode(1))]))
+    one = wire.dumps(BlockNode([stmt, VarNode("y")]))
+    many = wire.dumps(BlockNode([stmt] * 1000 + [VarNode("y")]))
+    # each repeat costs just one reference
+    assert len(many) - len(one) <= 2 * 1000 + 4
+    assert len(many) < len(pickle.dumps(BlockNode([stmt] * 1000 + [VarNode("y")]), pickle.HIGHEST_PROTOCOL))
+
+def test_deep_asts_round_trip():
+    chain = VarNode("x0")  # type: AST
+    for i in range(1, 20000):
+        chain = SeqNode(chain, VarNode("x{}".format(i)))
+    assert wire.loads(wire.dumps(chain)) is chain
+
+def test_decode_from_mmap(tmpdir):
+    src = "A() { new(x=1) { f() { x } } }\nA() ~ A()"
+    proofs = Program(src).generate_proof_obligations()
+    path = str(tmpdir.join("proofs.qvlb"))
+    with open(path, "wb") as f:
+        f.write(wire.dumps(proofs))
+    with open(path, "rb") as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        decoded = wire.loads(m)
+        m.close()  # loads must not hold on to the buffer
+    assert decoded[0].context is proofs[0].context
+    assert _emit(decoded) == _emit(proofs)
+
+def test_rejects_other_versions():
+    data = bytearray(wire.dumps(VarNode("x")))
+    assert wire.loads(memoryview(data)) is VarNode("x")
+    for bad, message in ((b"XXXX" + data[4:], "not an encoded AST"),
+                         (data[:4] + b"\x63" + data[5:], "version 99"),
+                         (data[:-1], "truncated")):
+        try:
+            wire.loads(bytes(bad))
+            assert False
+        except Exception as e:
+            assert message in str(e)
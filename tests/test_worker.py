@@ -0,0 +1,103 @@
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from frontend.program import Program
+from frontend.rosette.runtime import RosetteRuntime
+from frontend.rosette.worker import WorkerPool
+
+# speaks worker.rkt's protocol: a program fails if it mentions bad, kills the
+# worker if it mentions crash, reports a lot of memory if it mentions leak,
+# never finishes if it mentions hang, and writes a lot to stderr if it
+# mentions chatty
+WORKER = r"""
+import os, sys, time
+checked = 0
+while True:
+    header = sys.stdin.buffer.readline()
+    if not header:
+        break
+    text = sys.stdin.buffer.read(int(header)).decode()
+    if "crash" in text:
+        sys.stderr.write("lost\n")
+        sys.exit(3)
+    if "hang" in text:
+        time.sleep(60)
+    if "chatty" in text:
+        sys.stderr.write("x" * (1 << 20))
+        sys.stderr.flush()
+    checked += 1
+    out = "{} checked {}\n".format(os.getpid(), checked).encode()
+    memory = 1 << 40 if "leak" in text else 1000
+    sys.stdout.buffer.write(b"%d %d %d\n" % ("bad" in text, len(out), memory) + out)
+    sys.stdout.buffer.flush()
+"""
+
+def _pool(tmpdir, size, **kwargs):
+    script = tmpdir.join("worker.py")
+    script.write(WORKER)
+    return WorkerPool('"{}" "{}"'.format(sys.executable, script), size, **kwargs)
+
+def test_workers_check_many_programs(tmpdir):
+    pool = _pool(tmpdir, 2)
+    with ThreadPoolExecutor(max_workers=4) as threads:
+        results = list(threads.map(pool.check, ["ok {}".format(i) if i % 3 else "bad" for i in range(12)]))
+    pool.close()
+    assert [s for s, _ in results] == [i % 3 != 0 for i in range(12)]
+    # two processes did all the work
+    assert len(set(out.split()[0] for _, out in results)) == 2 and pool.restarts == 0
+
+def test_workers_are_replaced(tmpdir):
+    pool = _pool(tmpdir, 1, max_uses=3)
+    pids = [pool.check("ok")[1].split()[0] for _ in range(4)]
+    assert pids[0] == pids[1] == pids[2] != pids[3]
+    pool.check("leak")
+    # a crash is retried once on a new worker, then reported
+    success, out = pool.check("crash")
+    assert not success and "died: lost" in out
+    success, out = pool.check("ok")
+    assert success and out.endswith(" checked 1\n")
+    # after 3 uses, a leak, and two crashes
+    assert pool.restarts == 4
+    pool.close()
+
+def test_workers_time_out(tmpdir):
+    pool = _pool(tmpdir, 1, timeout=1)
+    # more than a pipe holds, which no one reads
+    assert pool.check("chatty")[0]
+    # a program that never finishes isn't retried
+    success, out = pool.check("hang")
+    assert not success and "timed out" in out and pool.restarts == 1
+    success, out = pool.check("ok")
+    assert success and out.endswith(" checked 1\n")
+    pool.close()
+
+class _WorkerRuntime(RosetteRuntime):
+    def new_workers(self, size):
+        return _pool(self.tmpdir, size)
+
+def test_units_are_checked_on_workers(tmpdir):
+    src = "A() { 1 } B() { 1 }\nA() ~ B()\nA() ~ [Equal(bad, bad)] B()\nassert 1"
+    runtime = _WorkerRuntime(Program(src))
+    runtime.tmpdir = tmpdir
+    runtime.workers = runtime.new_workers(2)
+    results = list(runtime.check_each(jobs=2))
+    runtime.workers.close()
+    assert [s for _, s, _, _ in results] == [True, False, True]
+    assert all("checked" in out for _, _, out, _ in results)
+    for _, _, _, fname in results:
+        os.remove(fname)